@@ -0,0 +1,78 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+"""
+Time parsing and validating the ArtifactResponse fixtures in tests/resources, and parsing an ISO-8601
+timestamp with dateutil and with the strict parser the validation uses.
+
+    $ python -m benchmarks.bench_artifact_response
+"""
+import glob
+import logging
+import timeit
+
+from datetime import datetime, timedelta
+
+import dateutil.parser
+
+from lxml import etree
+
+from inge6.saml import ArtifactResponse
+from inge6.saml.constants import NAMESPACES
+from inge6.saml.provider import Provider as SAMLProvider
+from inge6.saml.utils import parse_iso8601
+
+NUMBER = 500
+TIMESTAMP = '2021-06-05T16:31:33.123Z'
+
+
+def _with_current_times(xml_response):
+    root = etree.fromstring(xml_response)
+    now = datetime.utcnow()
+    for attribute, delta_s in (('IssueInstant', 0), ('NotBefore', -120), ('NotOnOrAfter', 120)):
+        for elem in root.findall(f'.//*[@{attribute}]'):
+            elem.attrib[attribute] = (now + timedelta(seconds=delta_s)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    for elem in root.findall('.//saml:AuthnStatement', NAMESPACES):
+        elem.attrib['AuthnInstant'] = now.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return etree.tostring(root)
+
+
+def _bench(name, func, number=NUMBER):
+    duration_s = timeit.timeit(func, number=number)
+    print("{:<48} {:>12.1f} {:>12.0f}".format(name, duration_s / number * 1e6, number / duration_s))
+
+
+def main():
+    # Responses failing validation log their errors
+    logging.disable(logging.ERROR)
+    provider = SAMLProvider()
+
+    print("{:<48} {:>12} {:>12}".format('', 'time (us)', 'per second'))
+    _bench('timestamp, dateutil', lambda: dateutil.parser.parse(TIMESTAMP, ignoretz=True), number=20000)
+    _bench('timestamp, strict', lambda: parse_iso8601(TIMESTAMP), number=20000)
+
+    for path in sorted(glob.glob('tests/resources/artifact_re*.xml')):
+        with open(path, 'rb') as response_file:
+            xml_response = _with_current_times(response_file.read())
+
+        def validate(xml_response=xml_response):
+            ArtifactResponse.from_string(xml_response, provider, insecure=True)
+
+        try:
+            validate()
+        except Exception as error: # pylint: disable=broad-except
+            print("{:<48} skipped: {}".format(path.split('/')[-1], error))
+            continue
+        _bench(path.split('/')[-1] + ', validate', validate)
+
+    with open('tests/resources/artifact_response.xml', 'rb') as response_file:
+        signed_response = response_file.read()
+    _bench('artifact_response.xml, verify and validate',
+           lambda: ArtifactResponse.from_string(signed_response, provider, is_test_instance=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+"""
+Compare generating the RelayState token locally with generating it using ACL GENPASS on the configured
+redis-server, counting the commands the redis-server processed for each.
+
+    $ python -m benchmarks.bench_gen_token
+"""
+import timeit
+
+from redis.exceptions import RedisError
+
+from inge6.cache import get_redis_client, redis_cache
+
+NUMBER = 2000
+
+
+def _processed_commands() -> int:
+    return int(get_redis_client().info('stats')['total_commands_processed'])
+
+
+def _bench(name, token_generator):
+    redis_cache.TOKEN_GENERATOR = token_generator
+    # Every INFO call is processed as a command as well.
+    before = _processed_commands()
+    duration_s = timeit.timeit(redis_cache.gen_token, number=NUMBER)
+    commands = _processed_commands() - before - 1
+    print("{:<10} {:>12.2f} {:>20.2f}".format(name, duration_s / NUMBER * 1e6, commands / NUMBER))
+
+
+def main():
+    print("{:<10} {:>12} {:>20}".format('generator', 'time (us)', 'redis cmds / token'))
+    try:
+        _bench('local', 'local')
+        _bench('redis', 'redis')
+    except RedisError as redis_error:
+        redis_cache.TOKEN_GENERATOR = 'local'
+        duration_s = timeit.timeit(redis_cache.gen_token, number=NUMBER)
+        print("{:<10} {:>12.2f} {:>20}".format('local', duration_s / NUMBER * 1e6, 0))
+        print("redis-server not reachable, skipping the redis generator: {}".format(redis_error))
+
+
+if __name__ == "__main__":
+    main()
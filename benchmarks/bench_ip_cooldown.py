@@ -0,0 +1,70 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+"""
+Compare the redis memory used per million ip addresses by the ip cooldown backends. Requires the configured
+redis-server, all keys written are prefixed by bench: and removed afterwards.
+
+    $ python -m benchmarks.bench_ip_cooldown [number of ip addresses]
+"""
+import sys
+import ipaddress
+
+from redis.exceptions import RedisError
+
+from inge6.cache import get_redis_client
+from inge6.ratelimit import KeyPerIpCooldown, BitmapIpCooldown
+
+KEY_PREFIX = 'bench:'
+BATCH_SIZE = 1000
+
+
+def _used_memory() -> int:
+    return int(get_redis_client().info('memory')['used_memory'])
+
+
+def _clear():
+    keys = list(get_redis_client().scan_iter(KEY_PREFIX + '*'))
+    for i in range(0, len(keys), BATCH_SIZE):
+        get_redis_client().delete(*keys[i:i + BATCH_SIZE])
+
+
+def _bench(name, ip_cooldown, num_ips):
+    script = get_redis_client().register_script(ip_cooldown.SCRIPT + "return {0, 0, -1}")
+    first_ip = ipaddress.IPv4Address('10.0.0.0')
+
+    _clear()
+    before = _used_memory()
+    with get_redis_client().pipeline(transaction=False) as pipe:
+        for i in range(num_ips):
+            keys, args = ip_cooldown.keys_and_args(str(first_ip + i))
+            script(keys=['', ''] + keys, args=[ip_cooldown.ip_expire_s, 0, 0] + args, client=pipe)
+            if i % BATCH_SIZE == BATCH_SIZE - 1:
+                pipe.execute()
+        pipe.execute()
+    used = _used_memory() - before
+    _clear()
+
+    print("{:<10} {:>10} {:>22.1f}".format(name, num_ips, used / num_ips * 1e6 / 2**20))
+
+
+def main():
+    num_ips = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    bitmap_ip_cooldown = BitmapIpCooldown(ip_expire_s=10, bits=24, hash_key=b'bench', key_prefix=KEY_PREFIX)
+
+    print("{:<10} {:>10} {:>22}".format('backend', 'ips', 'MiB per million ips'))
+    try:
+        _bench('keys', KeyPerIpCooldown(ip_expire_s=10, key_prefix=KEY_PREFIX), num_ips)
+        _bench('bitmap', bitmap_ip_cooldown, num_ips)
+    except RedisError as redis_error:
+        print("redis-server not reachable: {}".format(redis_error))
+
+    bound = (bitmap_ip_cooldown.ip_expire_s + 1) * 2 ** bitmap_ip_cooldown.bits / 8
+    print("bitmap memory is bounded by {:.1f} MiB, regardless of the number of ip addresses".format(bound / 2**20))
+
+
+if __name__ == "__main__":
+    main()
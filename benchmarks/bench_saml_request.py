@@ -0,0 +1,56 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+"""
+Compare building a signed AuthnRequest and ArtifactResolve request from the precompiled templates with
+parsing the template and reading the certificate for every request, and signing with the key from the
+registry with loading the signing key for every request, as was done before.
+
+    $ python -m benchmarks.bench_saml_request
+"""
+import timeit
+
+from inge6.saml import AuthNRequest, ArtifactResolveRequest
+from inge6.saml import saml_request
+from inge6.saml.key_registry import key_registry
+
+NUMBER = 2000
+
+
+def _uncached():
+    saml_request._compiled_template.cache_clear() # pylint: disable=protected-access
+    saml_request._load_cert_data.cache_clear() # pylint: disable=protected-access
+    key_registry.clear()
+
+
+def _bench(name, build, setup=None):
+    def run():
+        if setup:
+            setup()
+        build()
+
+    duration_s = timeit.timeit(run, number=NUMBER)
+    print("{:<36} {:>12.1f} {:>12.0f}".format(name, duration_s / NUMBER * 1e6, NUMBER / duration_s))
+
+
+def main():
+    def authn_request():
+        AuthNRequest('https://digid.example/sso', 'test_id')
+
+    def artifact_resolve_request():
+        ArtifactResolveRequest('some_artifact_code', 'https://digid.example/sso', 'test_id')
+
+    print("{:<36} {:>12} {:>12}".format('request', 'time (us)', 'requests/s'))
+    _bench('AuthnRequest, parse per request', authn_request, _uncached)
+    _bench('AuthnRequest, key per request', authn_request, key_registry.clear)
+    _bench('AuthnRequest, precompiled', authn_request)
+    _bench('ArtifactResolve, parse per request', artifact_resolve_request, _uncached)
+    _bench('ArtifactResolve, key per request', artifact_resolve_request, key_registry.clear)
+    _bench('ArtifactResolve, precompiled', artifact_resolve_request)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+"""
+Compare the bytes stored per login flow, and the encode/decode time, of the cache serializers.
+
+    $ python -m benchmarks.bench_serializers
+"""
+import timeit
+
+from oic.oic.message import AuthorizationRequest as OICAuthRequest
+
+from inge6.cache.serializers import get_serializer
+from inge6.oidc.authorize import auth_req_fields
+
+NUMBER = 20000
+
+
+def _flow_values(auth_req):
+    # The values written to redis during a single login flow.
+    return [
+        {
+            'auth_req': auth_req,
+            'code_challenge': '_1f8tFjAtu6D1Df-GOyDPoMjCJdEvaSWsnqR6SLpzsw',
+            'code_challenge_method': 'S256'
+        },
+        'a3a6b5f4-8c3b-4c9b-a1b0-6f0d7d1c8b59',
+        {
+            'code_challenge': '_1f8tFjAtu6D1Df-GOyDPoMjCJdEvaSWsnqR6SLpzsw',
+            'code_challenge_method': 'S256'
+        },
+        b'eyJwYXlsb2FkIjogIkRtZlZXY2tJWm1ZOTV5OTVGMnBvVXc9PSIsICJub25jZSI6ICJ2MXh4VmZ3Z2x5aDZ5In0='
+    ]
+
+
+def _bench(name, serializer, values):
+    serialized_values = [serializer.dumps(value) for value in values]
+    flow_bytes = sum(len(serialized_value) for serialized_value in serialized_values)
+
+    encode_s = timeit.timeit(lambda: [serializer.dumps(value) for value in values], number=NUMBER)
+    decode_s = timeit.timeit(lambda: [serializer.loads(serialized_value) for serialized_value in serialized_values], number=NUMBER)
+
+    print("{:<30} {:>8} {:>12.2f} {:>12.2f}".format(name, flow_bytes, encode_s / NUMBER * 1e6, decode_s / NUMBER * 1e6))
+
+
+def main():
+    auth_req = OICAuthRequest().deserialize(
+        'client_id=test_client&redirect_uri=https%3A%2F%2Fexample.com%2Fcallback&response_type=code&nonce=some_nonce'
+        '&scope=openid&state=some_state&code_challenge=_1f8tFjAtu6D1Df-GOyDPoMjCJdEvaSWsnqR6SLpzsw&code_challenge_method=S256',
+        'urlencoded'
+    )
+
+    print("{:<30} {:>8} {:>12} {:>12}".format('serializer', 'bytes', 'encode (us)', 'decode (us)'))
+    _bench('pickle, OICAuthRequest', get_serializer('pickle'), _flow_values(auth_req))
+    _bench('pickle, fields only', get_serializer('pickle'), _flow_values(auth_req_fields(auth_req)))
+    _bench('compact, fields only', get_serializer('compact'), _flow_values(auth_req_fields(auth_req)))
+
+
+if __name__ == "__main__":
+    main()
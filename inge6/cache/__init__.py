@@ -4,32 +4,101 @@
 #
 # SPDX-License-Identifier: EUPL-1.2
 #
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from redis import StrictRedis
+from redis.cluster import RedisCluster
+from redis.commands.core import Script
+from redis.sentinel import Sentinel
 from ..config import settings
 
+RedisClient = Union[StrictRedis, RedisCluster]
+
+REDIS_MODE: str = settings.redis.mode
+
 # pylint: disable=global-statement
-_REDIS_CLIENT: Optional[StrictRedis] = None
+_REDIS_CLIENT: Optional[RedisClient] = None
+
+def _parse_hosts(hosts: str) -> List[Tuple[str, int]]:
+    """
+    :param hosts: comma separated list of host:port pairs
+    :returns: list of (host, port) tuples
+    """
+    parsed_hosts = []
+    for host in hosts.split(','):
+        hostname, port = host.strip().rsplit(':', 1)
+        parsed_hosts.append((hostname, int(port)))
+    return parsed_hosts
+
+def _connection_kwargs() -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {
+        'max_connections': int(settings.redis.max_connections),
+        'socket_timeout': float(settings.redis.socket_timeout_s),
+        'socket_connect_timeout': float(settings.redis.socket_timeout_s),
+    }
+
+    if settings.redis.ssl.lower() == 'true':
+        kwargs.update(
+            ssl=True,
+            ssl_keyfile=settings.redis.key, ssl_certfile=settings.redis.cert,
+            ssl_ca_certs=settings.redis.cafile
+        )
+    return kwargs
+
+def hash_tag(key: str) -> str:
+    """
+    In cluster mode, wrap the key in a hash tag. Only the part between the braces determines the hash slot
+    of a key, this makes all keys sharing the tag land on the same shard. This allows multi-key commands,
+    pipelines and scripts on those keys.
+
+    :param key: the key, or part of a key, determining the hash slot
+    :returns: the key, wrapped in a hash tag in cluster mode
+    """
+    if REDIS_MODE == 'cluster':
+        return '{' + key + '}'
+    return key
+
+def hash_tag_prefix(tag: str) -> str:
+    """
+    In cluster mode, a hash tag to prefix keys with, such that all keys sharing the prefix land on the same shard.
+
+    :param tag: the part of the keys determining the hash slot
+    :returns: the tag wrapped in a hash tag in cluster mode, otherwise an empty prefix leaving the keys unchanged
+    """
+    if REDIS_MODE == 'cluster':
+        return '{' + tag + '}'
+    return ''
+
+def register_script(redis_client: RedisClient, script: str) -> Script:
+    """
+    Register a lua script, see `redis.StrictRedis.register_script`. In cluster mode all keys passed to the script
+    need to be on a single shard.
+
+    :param redis_client: the client to run the script with
+    :param script: the lua script
+    :returns: callable running the script, by its sha1 digest
+    """
+    # The cluster client runs scripts as well, its type stubs do not declare this.
+    return redis_client.register_script(script)  # type: ignore[union-attr]
 
-def get_redis_client() -> StrictRedis:
+def get_redis_client() -> RedisClient:
     """
-    Global function to retrieve the connection with the redis-server.
+    Global function to retrieve the connection with the redis-server. Depending on the configured mode this is
+    a client for a single redis-server (standalone), for the primary monitored by redis sentinels (sentinel) or
+    for a redis cluster (cluster). All share a connection pool of at most max_connections connections.
 
-    :returns: StrictRedis object having a connection with the configured redis server.
+    :returns: client having a connection with the configured redis server.
     """
     global _REDIS_CLIENT
     if _REDIS_CLIENT is None:
-        use_ssl = settings.redis.ssl.lower() == 'true'
-
-        if use_ssl:
-            _REDIS_CLIENT = StrictRedis(
-                                host=settings.redis.host, port=settings.redis.port, db=0,
-                                ssl=True,
-                                ssl_keyfile=settings.redis.key, ssl_certfile=settings.redis.cert,
-                                ssl_ca_certs=settings.redis.cafile
-                            )
+        if REDIS_MODE == 'sentinel':
+            sentinel = Sentinel(_parse_hosts(settings.redis.sentinel_hosts), socket_timeout=float(settings.redis.socket_timeout_s))
+            _REDIS_CLIENT = sentinel.master_for(settings.redis.sentinel_service_name, redis_class=StrictRedis, db=0, **_connection_kwargs())
+        elif REDIS_MODE == 'cluster':
+            _REDIS_CLIENT = RedisCluster(host=settings.redis.host, port=int(settings.redis.port), **_connection_kwargs())
+        elif REDIS_MODE == 'standalone':
+            _REDIS_CLIENT = StrictRedis(host=settings.redis.host, port=settings.redis.port, db=0, **_connection_kwargs())
         else:
-            _REDIS_CLIENT = StrictRedis(host=settings.redis.host, port=settings.redis.port, db=0)
+            raise ValueError("Unknown redis mode {}, choose from standalone, sentinel or cluster".format(REDIS_MODE))
 
     return _REDIS_CLIENT
@@ -4,23 +4,56 @@
 #
 # SPDX-License-Identifier: EUPL-1.2
 #
-from typing import Any, Text, Optional
-import pickle
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Text, Optional
+from contextlib import contextmanager, nullcontext
+import secrets
 
-from . import get_redis_client
+from redis.client import Pipeline
+
+from . import get_redis_client, hash_tag, register_script
+from .serializers import get_serializer
 from ..config import settings
 
 KEY_PREFIX: str = settings.redis.default_cache_namespace
 EXPIRES_IN_S: int = int(settings.redis.object_ttl)
+SERIALIZER = get_serializer(settings.redis.serializer)
+
+TOKEN_GENERATOR: str = settings.redis.token_generator
+TOKEN_NBYTES: int = int(settings.redis.token_nbytes)
+TOKEN_ENCODERS: Dict[str, Callable[[int], str]] = {
+    'hex': secrets.token_hex,
+    'urlsafe': secrets.token_urlsafe,
+}
+TOKEN_ENCODER = TOKEN_ENCODERS[settings.redis.token_encoding]
+
+_ROUND_TRIP: Callable[[], ContextManager] = nullcontext
+
+# KEYS: the namespace, ARGV: the key and the serialized value
+# Returns: 1 when the value was set, 0 when the key was set already or the namespace does not exist (anymore)
+HSETNX_EXISTING_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+return redis.call('HSETNX', KEYS[1], ARGV[1], ARGV[2])
+"""
+
+def measure_round_trips(round_trip: Callable[[], ContextManager]) -> None:
+    """
+    Make every round trip of the cache to the redis-server within a context manager, e.g. to record its latency.
+
+    :param round_trip: returns the context manager a round trip is made in
+    """
+    global _ROUND_TRIP # pylint: disable=global-statement
+    _ROUND_TRIP = round_trip
 
 def _serialize(value: Any) -> bytes:
     """
     Function that specifies how the data should be serialized into the redis-server.
 
     :param value: Any value that should be storen in a redis database
-    :returns: Serialized value, a pickle dump.
+    :returns: Serialized value, in the format of the configured serializer.
     """
-    return pickle.dumps(value)
+    return SERIALIZER.dumps(value)
 
 def _deserialize(serialized_value: Optional[Any]) -> Any:
     """
@@ -30,29 +63,32 @@ def _deserialize(serialized_value: Optional[Any]) -> Any:
     :param serialized_value: value retrieved from our redis-server connection
     :returns: deserialized version of the object stored in redis.
     """
-    return pickle.loads(serialized_value) if serialized_value else None
+    return SERIALIZER.loads(serialized_value) if serialized_value else None
 
 def _get_namespace(namespace: str) -> str:
     """
     As the server connecting to might be used by other clients, we need to specify a namespace for our keys. Such that
-    there is no conflict of keys possible.
+    there is no conflict of keys possible. In cluster mode the key is wrapped in a hash tag, such that the prefix does
+    not determine the shard a key lands on.
 
     :param namespace: The key that needs to be prefixed
     :returns: the namespaces key.
     """
-    return KEY_PREFIX + namespace
+    return KEY_PREFIX + hash_tag(namespace)
 
 # pylint: disable=redefined-builtin
-def set(key: str, value: Any) -> None:
+def set(key: str, value: Any, expires_in_s: int = EXPIRES_IN_S) -> None:
     """
     Store a value in the redis database using the specified key.
 
     :param key: key used to link with the value
     :param value: value we want to store
+    :param expires_in_s: the time to live of the value
     """
     key = _get_namespace(key)
     serialized_value = _serialize(value)
-    get_redis_client().set(key, serialized_value, ex=EXPIRES_IN_S)
+    with _ROUND_TRIP():
+        get_redis_client().set(key, serialized_value, ex=expires_in_s)
 
 # pylint: disable=redefined-builtin
 def get(key: str) -> Any:
@@ -64,7 +100,8 @@ def get(key: str) -> Any:
     :returns: the value belonging to the specified key
     """
     key = _get_namespace(key)
-    value = get_redis_client().get(key)
+    with _ROUND_TRIP():
+        value = get_redis_client().get(key)
     deserialized_value = _deserialize(value)
     return deserialized_value
 
@@ -78,10 +115,8 @@ def hset(namespace: str, key: str, value: Any) -> None:
     :param key: the key to store with your value
     :param value: the value to store in the redis database
     """
-    serialized_value = _serialize(value)
-    namespace = _get_namespace(namespace)
-    get_redis_client().hset(namespace, key, serialized_value)
-    get_redis_client().expire(name=namespace, time=EXPIRES_IN_S)
+    with pipeline() as pipe:
+        pipe.hset(namespace, key, value)
 
 def hget(namespace, key) -> Any:
     """
@@ -90,12 +125,119 @@ def hget(namespace, key) -> Any:
     to retrieve keys without clashing with other clients.
     """
     namespace = _get_namespace(namespace)
-    value = get_redis_client().hget(namespace, key)
+    with _ROUND_TRIP():
+        value = get_redis_client().hget(namespace, key)
     deserialized_value = _deserialize(value)
     return deserialized_value
 
+def hsetnx(namespace: str, key: str, value: Any) -> bool:
+    """
+    Set a value within an existing namespace, see `hset`, unless the key is set already. An expired namespace is
+    not created again, as it would be without an expiry.
+
+    :returns: whether the value was set
+    """
+    namespace = _get_namespace(namespace)
+    with _ROUND_TRIP():
+        hsetnx_existing = register_script(get_redis_client(), HSETNX_EXISTING_SCRIPT)
+        return bool(hsetnx_existing(keys=[namespace], args=[key, _serialize(value)]))
+
+def hdel(namespace: str, *keys: str) -> None:
+    """
+    Delete keys within a namespace, see `hset`.
+    """
+    namespace = _get_namespace(namespace)
+    with _ROUND_TRIP():
+        get_redis_client().hdel(namespace, *keys)
+
+class CachePipeline:
+    """
+    Batches cache commands such that they are sent to the redis-server in a single round trip. Writes are
+    queued as is, reads are queued and their deserialized results are returned by `execute`, in the order in
+    which they were queued.
+    """
+
+    def __init__(self, redis_pipeline: Pipeline) -> None:
+        self._pipeline = redis_pipeline
+        self._decoders: List[Optional[Callable[[Any], Any]]] = []
+
+    def _queue(self, decoder: Optional[Callable[[Any], Any]] = None) -> None:
+        self._decoders.append(decoder)
+
+    # pylint: disable=redefined-builtin
+    def set(self, key: str, value: Any) -> None:
+        """
+        Queue storing a value using the specified key, see `set`.
+        """
+        self._pipeline.set(_get_namespace(key), _serialize(value), ex=EXPIRES_IN_S)
+        self._queue()
+
+    # pylint: disable=redefined-builtin
+    def get(self, key: str) -> None:
+        """
+        Queue retrieving the value belonging to the specified key, see `get`.
+        """
+        self._pipeline.get(_get_namespace(key))
+        self._queue(_deserialize)
+
+    def hset(self, namespace: str, key: str, value: Any) -> None:
+        """
+        Queue setting a value within a namespace and refreshing the expiry of that namespace, see `hset`.
+        """
+        namespace = _get_namespace(namespace)
+        self._pipeline.hset(namespace, key, _serialize(value))
+        self._queue()
+        self._pipeline.expire(name=namespace, time=EXPIRES_IN_S)
+        self._queue()
+
+    def hget(self, namespace: str, key: str) -> None:
+        """
+        Queue retrieving a value within a namespace, see `hget`.
+        """
+        self._pipeline.hget(_get_namespace(namespace), key)
+        self._queue(_deserialize)
+
+    def execute(self) -> List[Any]:
+        """
+        Send all queued commands to the redis-server in a single round trip.
+
+        :returns: the deserialized results of the queued reads, in the order they were queued.
+        """
+        if not self._decoders:
+            return []
+
+        decoders, self._decoders = self._decoders, []
+        with _ROUND_TRIP():
+            results = self._pipeline.execute()
+        return [decoder(result) for decoder, result in zip(decoders, results) if decoder is not None]
+
+@contextmanager
+def pipeline(transaction: bool = False) -> Iterator[CachePipeline]:
+    """
+    Context manager batching cache commands into a single round trip to the redis-server. Commands still
+    queued when leaving the context are executed on exit, explicitly call `execute` to obtain the results of
+    queued reads.
+
+        with redis_cache.pipeline() as pipe:
+            pipe.hget(code, 'arti')
+            pipe.hget(code, 'cc_cm')
+            artifact, cc_cm = pipe.execute()
+
+    :param transaction: wrap the commands in a MULTI/EXEC block, making them atomic. Not supported in cluster mode.
+    """
+    with get_redis_client().pipeline(transaction=transaction) as redis_pipeline:
+        cache_pipeline = CachePipeline(redis_pipeline)
+        yield cache_pipeline
+        cache_pipeline.execute()
+
 def gen_token() -> Text:
     """
     Generate a random string, useful to generate unique keys that should be stored in the redis database.
+
+    By default the token is generated locally using a CSPRNG. When the token_generator setting equals 'redis'
+    the redis-server generates it, which costs a round trip.
     """
-    return get_redis_client().acl_genpass()
+    if TOKEN_GENERATOR == 'redis':
+        with _ROUND_TRIP():
+            return get_redis_client().acl_genpass(bits=TOKEN_NBYTES * 8)
+    return TOKEN_ENCODER(TOKEN_NBYTES)
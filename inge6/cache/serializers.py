@@ -0,0 +1,89 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Type
+import pickle
+import threading
+
+import msgpack
+
+PICKLE_PROTOCOL_MARKER = 0x80
+COMPACT_V1 = 0x01
+COMPACT_V1_PREFIX = bytes([COMPACT_V1])
+
+
+class Serializer(ABC):
+    """
+    Specifies how values are serialized into, and deserialized from, the redis-server. Serializers with
+    serializes_objects set to False only serialize plain values.
+    """
+    serializes_objects = True
+
+    @abstractmethod
+    def dumps(self, value: Any) -> bytes:
+        pass
+
+    def loads(self, serialized_value: bytes) -> Any:
+        """
+        Deserialize a value written by any of the serializers. The first byte of a serialized value
+        identifies its format, this allows changing the serializer in a rolling upgrade once all nodes
+        read both formats.
+        """
+        if serialized_value[0] == COMPACT_V1:
+            return msgpack.unpackb(memoryview(serialized_value)[1:], raw=False)
+
+        if serialized_value[0] == PICKLE_PROTOCOL_MARKER:
+            return pickle.loads(serialized_value)
+
+        raise ValueError("Unknown serialization format {}".format(serialized_value[0]))
+
+
+class PickleSerializer(Serializer):
+    """
+    Serializes any python object, at the cost of CPU and memory.
+    """
+
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value)
+
+
+class CompactSerializer(Serializer):
+    """
+    Serializes plain values, i.e. dicts, lists, strings, bytes and numbers, into a compact binary
+    format (msgpack) prefixed by a version byte.
+    """
+    serializes_objects = False
+
+    def __init__(self) -> None:
+        # A packer holds an internal buffer, and therefore cannot be shared between threads.
+        self._local = threading.local()
+
+    @property
+    def _packer(self) -> msgpack.Packer:
+        if not hasattr(self._local, 'packer'):
+            self._local.packer = msgpack.Packer(use_bin_type=True)
+        return self._local.packer
+
+    def dumps(self, value: Any) -> bytes:
+        return COMPACT_V1_PREFIX + self._packer.pack(value)
+
+
+SERIALIZERS: Dict[str, Type[Serializer]] = {
+    'pickle': PickleSerializer,
+    'compact': CompactSerializer,
+}
+
+
+def get_serializer(name: str) -> Serializer:
+    """
+    :param name: the name of the serializer, as configured in the redis section of the settings
+    :returns: an instance of the requested serializer
+    """
+    try:
+        return SERIALIZERS[name]()
+    except KeyError as key_error:
+        raise ValueError("Unknown serializer {}, choose from {}".format(name, ', '.join(SERIALIZERS))) from key_error
@@ -0,0 +1,78 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+from typing import Callable, NamedTuple, Optional
+
+from redis.exceptions import LockError
+
+from . import get_redis_client, hash_tag, redis_cache
+
+POLL_INTERVAL_S = 0.05
+
+
+class FlightResult(NamedTuple):
+    status_code: int
+    body: bytes
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent and repeated calls for the same key onto a single call, across all workers. The
+    first call takes a lock on the key and stores its result for result_ttl_s seconds, calls arriving
+    meanwhile wait for that result rather than making the call again.
+
+    Results are stored per fingerprint of the call, e.g. a digest of the request, such that a result is only
+    handed to calls identical to the one that produced it. Server errors, status 500 and up, are not stored.
+    """
+
+    def __init__(self, lock_ttl_s: int, result_ttl_s: int, wait_s: float) -> None:
+        """
+        :param lock_ttl_s: the time after which the lock expires, this should exceed the duration of a call
+        :param result_ttl_s: the time a result is stored
+        :param wait_s: the time a call waits for the result of the call holding the lock
+        """
+        self.lock_ttl_s = lock_ttl_s
+        self.result_ttl_s = result_ttl_s
+        self.wait_s = wait_s
+
+    @staticmethod
+    def _result_key(key: str, fingerprint: str) -> str:
+        return f'single_flight:{key}:{fingerprint}'
+
+    def _stored_result(self, key: str, fingerprint: str) -> Optional[FlightResult]:
+        stored = redis_cache.get(self._result_key(key, fingerprint))
+        return FlightResult(*stored) if stored is not None else None
+
+    def do(self, key: str, fingerprint: str, call: Callable[[], FlightResult]) -> Optional[FlightResult]:
+        """
+        :returns: the result of the call, or of an identical call made before. None when the call holding the
+            lock did not produce a result for this fingerprint within wait_s.
+        """
+        result = self._stored_result(key, fingerprint)
+        if result is not None:
+            return result
+
+        lock_key = redis_cache.KEY_PREFIX + hash_tag(key) + ':lock'
+        lock = get_redis_client().lock(lock_key, timeout=self.lock_ttl_s, sleep=POLL_INTERVAL_S, blocking_timeout=self.wait_s)
+        if not lock.acquire(blocking=True):
+            return self._stored_result(key, fingerprint)
+
+        try:
+            # A call holding the lock before may have stored the result meanwhile.
+            result = self._stored_result(key, fingerprint)
+            if result is not None:
+                return result
+
+            result = call()
+            if result.status_code < 500:
+                redis_cache.set(self._result_key(key, fingerprint), list(result), expires_in_s=self.result_ttl_s)
+            return result
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # The lock expired, and may have been taken by another call since.
+                pass
@@ -0,0 +1,32 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+# pylint: disable=unused-import
+from typing import Optional
+
+from .client import CryptoClient, RemoteEncrypt
+from ..config import settings
+
+CRYPTO_SERVICE_ENABLED: bool = settings.crypto_service.enabled.lower() == 'true'
+
+# pylint: disable=global-statement
+_CRYPTO_CLIENT: Optional[CryptoClient] = None
+
+def get_crypto_client() -> Optional[CryptoClient]:
+    """
+    Global function to retrieve the client of the crypto service, a local process owning the SAML and bsn keys,
+    see `inge6.crypto_service.server`. Run it with `python -m inge6.crypto_service`.
+
+    :returns: the client, None when the crypto service is not enabled and the keys are used in-process.
+    """
+    global _CRYPTO_CLIENT
+    if _CRYPTO_CLIENT is None and CRYPTO_SERVICE_ENABLED:
+        _CRYPTO_CLIENT = CryptoClient(
+            socket_path=settings.crypto_service.socket_path,
+            timeout_s=float(settings.crypto_service.timeout_s),
+            max_batch=int(settings.crypto_service.max_batch)
+        )
+    return _CRYPTO_CLIENT
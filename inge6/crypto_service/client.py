@@ -0,0 +1,158 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import itertools
+import os
+import queue
+import socket
+import threading
+
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional, Tuple
+
+from .protocol import pack_frame, read_frame
+from ..exceptions import CryptoServiceError
+
+
+class CryptoClient:
+    """
+    Client of the crypto service, shared by all threads of a process. Calls are sent over a single connection:
+    a sender thread takes the calls waiting to be sent, up to max_batch, and sends them as one batch, a receiver
+    thread hands each response to the call awaiting it. Under load, many calls share a round trip.
+    """
+
+    def __init__(self, socket_path: str, timeout_s: float, max_batch: int) -> None:
+        """
+        :param timeout_s: the time a call awaits its response
+        :param max_batch: the maximum number of calls sent in one batch
+        """
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self.max_batch = max_batch
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._futures: Dict[int, Future] = {}
+        # The connection each call awaiting its response was sent over.
+        self._sent: Dict[int, socket.socket] = {}
+        self._queue: 'queue.Queue[List[Any]]' = queue.Queue()
+        self._sock: Optional[socket.socket] = None
+        self._pid: Optional[int] = None
+
+    def call(self, operation: str, *args: Any) -> Any:
+        """
+        :raises CryptoServiceError: when the operation failed, or no response arrived in time.
+        """
+        future: Future = Future()
+        with self._lock:
+            self._start()
+            request_id = next(self._ids)
+            self._futures[request_id] = future
+        self._queue.put([request_id, operation, list(args)])
+
+        try:
+            ok, result = future.result(timeout=self.timeout_s)
+        except FutureTimeout as timeout_error:
+            with self._lock:
+                self._futures.pop(request_id, None)
+                self._sent.pop(request_id, None)
+            raise CryptoServiceError("No response from the crypto service in time") from timeout_error
+
+        if not ok:
+            raise CryptoServiceError(result)
+        return result
+
+    def _start(self) -> None:
+        # Threads do not survive a fork, start them in the process making the calls.
+        if self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        self._futures.clear()
+        self._sent.clear()
+        self._queue = queue.Queue()
+        self._sock = None
+        threading.Thread(target=self._send, args=(self._queue,), daemon=True).start()
+
+    def _connect(self) -> socket.socket:
+        with self._lock:
+            if self._sock is None:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.settimeout(self.timeout_s)
+                sock.connect(self.socket_path)
+                sock.settimeout(None)
+                threading.Thread(target=self._receive, args=(sock,), daemon=True).start()
+                self._sock = sock
+            return self._sock
+
+    def _send(self, requests: 'queue.Queue[List[Any]]') -> None:
+        while True:
+            batch = [requests.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            sock = None
+            try:
+                sock = self._connect()
+                with self._lock:
+                    for request_id, _, _ in batch:
+                        if request_id in self._futures:
+                            self._sent[request_id] = sock
+                sock.sendall(pack_frame(batch))
+            except OSError as error:
+                self._fail([request_id for request_id, _, _ in batch], "Crypto service unavailable: {}".format(error))
+                if sock is not None:
+                    self._disconnect(sock, "Crypto service connection failed: {}".format(error))
+
+    def _receive(self, sock: socket.socket) -> None:
+        rfile = sock.makefile('rb')
+        try:
+            while True:
+                for request_id, ok, result in read_frame(rfile):
+                    self._resolve(request_id, (ok, result))
+        except (OSError, EOFError, ValueError) as error:
+            self._disconnect(sock, "Crypto service connection lost: {}".format(error))
+        finally:
+            rfile.close()
+
+    def _resolve(self, request_id: int, result: Tuple[bool, Any]) -> None:
+        with self._lock:
+            future = self._futures.pop(request_id, None)
+            self._sent.pop(request_id, None)
+        if future is not None:
+            future.set_result(result)
+
+    def _fail(self, request_ids: List[int], message: str) -> None:
+        for request_id in request_ids:
+            self._resolve(request_id, (False, message))
+
+    def _disconnect(self, sock: socket.socket, message: str) -> None:
+        with self._lock:
+            if self._sock is not sock:
+                return
+            self._sock = None
+            # The responses to calls sent over this connection are lost, calls still queued are sent over the next.
+            request_ids = [request_id for request_id, sent_over in self._sent.items() if sent_over is sock]
+        sock.close()
+        self._fail(request_ids, message)
+
+
+class RemoteEncrypt:
+    """
+    Stands in for `inge6.encrypt.Encrypt`, having the crypto service encrypt the bsn with the keys it owns.
+    """
+
+    def __init__(self, crypto_client: CryptoClient) -> None:
+        self.crypto_client = crypto_client
+
+    def symm_encrypt(self, plaintext: str) -> bytes:
+        return self.crypto_client.call('bsn_symm_encrypt', plaintext)
+
+    def from_symm_to_pub(self, payload: Dict[Any, Any]) -> bytes:
+        return self.crypto_client.call('bsn_from_symm_to_pub', payload)
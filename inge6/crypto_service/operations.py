@@ -0,0 +1,65 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+# pylint: disable=c-extension-no-member
+from typing import Any, Dict, List
+
+import xmlsec
+
+from lxml import etree
+from onelogin.saml2.utils import OneLogin_Saml2_Utils
+
+from ..config import settings
+from ..encrypt import Encrypt
+from ..saml.saml_request import sign_with_key
+from ..saml.xml_parser import parse_xml
+
+class CryptoOperations:
+    """
+    The operations of the crypto service, performed with the keys it owns: the SAML SP key and the bsn keys.
+    """
+
+    OPERATIONS = ('saml_sign', 'saml_decrypt_key', 'bsn_symm_encrypt', 'bsn_from_symm_to_pub')
+
+    def __init__(self, saml_key_path: str, bsn_encrypt: Encrypt) -> None:
+        self.saml_key_path = saml_key_path
+        with open(saml_key_path, 'r') as key_file:
+            self.saml_priv_key = key_file.read()
+        self.bsn_encrypt = bsn_encrypt
+
+    @classmethod
+    def from_settings(cls) -> 'CryptoOperations':
+        return cls(
+            saml_key_path=settings.saml.key_path,
+            bsn_encrypt=Encrypt(
+                raw_sign_key=settings.bsn.sign_key,
+                raw_enc_key=settings.bsn.encrypt_key,
+                raw_local_enc_key=settings.bsn.local_symm_key
+            )
+        )
+
+    def execute(self, operation: str, args: List[Any]) -> Any:
+        if operation not in self.OPERATIONS:
+            raise ValueError("Unknown operation {}".format(operation))
+        return getattr(self, operation)(*args)
+
+    def saml_sign(self, xml: bytes) -> bytes:
+        """
+        :param xml: the element to sign, containing a signature template
+        :returns: the signature node
+        """
+        root = parse_xml(xml)
+        sign_with_key(root, self.saml_key_path)
+        return etree.tostring(xmlsec.tree.find_node(root, xmlsec.constants.NodeSignature), with_tail=False)
+
+    def saml_decrypt_key(self, encrypted_key: bytes) -> bytes:
+        return OneLogin_Saml2_Utils.decrypt_element(parse_xml(encrypted_key), self.saml_priv_key, debug=True)
+
+    def bsn_symm_encrypt(self, plaintext: str) -> bytes:
+        return self.bsn_encrypt.symm_encrypt(plaintext)
+
+    def bsn_from_symm_to_pub(self, payload: Dict[Any, Any]) -> bytes:
+        return self.bsn_encrypt.from_symm_to_pub(payload)
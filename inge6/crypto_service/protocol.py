@@ -0,0 +1,43 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+"""
+Frames exchanged with the crypto service: a 4 byte big-endian length followed by a msgpack encoded value. A
+request frame holds a batch of [request_id, operation, args] requests, a response frame a batch of
+[request_id, ok, result] responses, the result being an error message when not ok.
+"""
+import struct
+
+from typing import IO, Any
+
+import msgpack
+
+HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+def pack_frame(value: Any) -> bytes:
+    payload = msgpack.packb(value, use_bin_type=True)
+    return HEADER.pack(len(payload)) + payload
+
+
+def read_frame(rfile: IO[bytes]) -> Any:
+    """
+    :raises EOFError: when the connection was closed.
+    :raises ValueError: when the frame exceeds MAX_FRAME_SIZE.
+    """
+    header = rfile.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise EOFError("Connection closed")
+
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError("Frame of {} bytes exceeds the maximum frame size".format(size))
+
+    payload = rfile.read(size)
+    if len(payload) < size:
+        raise EOFError("Connection closed")
+    return msgpack.unpackb(payload, raw=False)
@@ -0,0 +1,105 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import logging
+import os
+import signal
+import socketserver
+import threading
+
+from typing import IO, Any, List, cast
+
+from .operations import CryptoOperations
+from .protocol import pack_frame, read_frame
+from ..config import settings
+
+
+class CryptoRequestHandler(socketserver.StreamRequestHandler):
+    server: 'CryptoServer'
+
+    def handle(self) -> None:
+        # The stubs type rfile as its base class, it is the buffered reader of the connection.
+        rfile = cast(IO[bytes], self.rfile)
+        while True:
+            try:
+                batch = read_frame(rfile)
+            except EOFError:
+                return
+            except ValueError as error:
+                logging.getLogger().warning("Crypto service dropped a connection: %s", str(error))
+                return
+
+            self.server.record_batch(len(batch))
+            responses = [self.server.execute(request_id, operation, args) for request_id, operation, args in batch]
+            self.wfile.write(pack_frame(responses))
+
+
+class CryptoServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves the crypto operations over a unix socket, each connection, one per process of the server, in a
+    thread of its own. A batch of requests is answered with a single batch of responses.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, operations: CryptoOperations) -> None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, CryptoRequestHandler)
+        os.chmod(socket_path, 0o660)
+
+        self.operations = operations
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._max_batch = 0
+
+    def record_batch(self, size: int) -> None:
+        with self._lock:
+            self._batches += 1
+            self._requests += size
+            self._max_batch = max(self._max_batch, size)
+
+    def execute(self, request_id: int, operation: str, args: List[Any]) -> List[Any]:
+        try:
+            return [request_id, True, self.operations.execute(operation, args)]
+        except Exception as error: # pylint: disable=broad-except
+            logging.getLogger().warning("Crypto operation %s failed: %s", operation, str(error))
+            return [request_id, False, "{} failed: {}".format(operation, type(error).__name__)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'batches': self._batches, 'requests': self._requests, 'max_batch': self._max_batch}
+
+
+def _terminate(*_) -> None:
+    raise SystemExit(0)
+
+
+def main() -> None:
+    """
+    Run the crypto service with crypto_service.workers processes, all accepting connections on the same socket.
+    """
+    socket_path = settings.crypto_service.socket_path
+    server = CryptoServer(socket_path, CryptoOperations.from_settings())
+
+    is_parent = True
+    children: List[int] = []
+    for _ in range(int(settings.crypto_service.workers) - 1):
+        pid = os.fork()
+        if pid == 0:
+            is_parent = False
+            break
+        children.append(pid)
+
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        server.serve_forever()
+    finally:
+        if is_parent:
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+            os.unlink(socket_path)
@@ -5,15 +5,22 @@
 # SPDX-License-Identifier: EUPL-1.2
 #
 import base64
+import binascii
 import json
+import time
 
 from typing import Dict, Any
 
+import msgpack
+
 import nacl.utils
+from nacl.exceptions import CryptoError
 from nacl.secret import SecretBox
 from nacl.public import PrivateKey, Box, PublicKey
 from nacl.encoding import Base64Encoder
 
+from .exceptions import InvalidSealedToken
+
 class Encrypt:
 
     def __init__(self, raw_sign_key: bytes, raw_enc_key: bytes, raw_local_enc_key: str) -> None:
@@ -45,3 +52,42 @@ class Encrypt:
     def from_symm_to_pub(self, payload: Dict[Any, Any]) -> bytes:
         plaintext = self.symm_decrypt(payload)
         return self.pub_encrypt(plaintext)
+
+
+class Sealer:
+    """
+    Seals values into url-safe tokens that are encrypted, authenticated and expire, such that
+    state can be handed to a client rather than being stored server-side.
+    """
+
+    def __init__(self, raw_symm_key: str, expires_in_s: int, prefix: str = '') -> None:
+        self.secret_box = SecretBox(bytes.fromhex(raw_symm_key))
+        self.expires_in_s = expires_in_s
+        self.prefix = prefix
+
+    def is_sealed(self, token: str) -> bool:
+        return token.startswith(self.prefix)
+
+    def seal(self, value: Any) -> str:
+        plaintext = msgpack.packb([int(time.time()) + self.expires_in_s, value], use_bin_type=True)
+        encrypted_msg = self.secret_box.encrypt(plaintext, nonce=nacl.utils.random(SecretBox.NONCE_SIZE))
+        return self.prefix + base64.urlsafe_b64encode(encrypted_msg).rstrip(b'=').decode()
+
+    def unseal(self, token: str) -> Any:
+        """
+        :raises InvalidSealedToken: when the token was not sealed by this sealer, was tampered with or has expired.
+        """
+        if not self.is_sealed(token):
+            raise InvalidSealedToken("Token is not sealed")
+
+        encoded = token[len(self.prefix):]
+        try:
+            encrypted_msg = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            expires_at, value = msgpack.unpackb(self.secret_box.decrypt(encrypted_msg), raw=False)
+        except (binascii.Error, CryptoError, ValueError) as decrypt_error:
+            raise InvalidSealedToken("Token could not be opened") from decrypt_error
+
+        if time.time() > expires_at:
+            raise InvalidSealedToken("Token has expired")
+
+        return value
@@ -13,6 +13,15 @@ class TooBusyError(RuntimeError):
 class TooManyRequestsFromOrigin(RuntimeError):
     pass
 
+class InvalidSealedToken(RuntimeError):
+    pass
+
+class CryptoServiceError(RuntimeError):
+    pass
+
+class ExecutorSaturated(RuntimeError):
+    pass
+
 # pylint: disable=too-many-ancestors
 class TokenSAMLErrorResponse(TokenErrorResponse):
     c_allowed_values = TokenErrorResponse.c_allowed_values.copy()
@@ -20,6 +29,7 @@ class TokenSAMLErrorResponse(TokenErrorResponse):
     {
         "error": [
             "saml_authn_failed",
+            "temporarily_unavailable",
         ]
     }
 )
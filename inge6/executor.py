@@ -0,0 +1,48 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import asyncio
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from .exceptions import ExecutorSaturated
+
+T = TypeVar('T')
+
+
+class BoundedExecutor:
+    """
+    Runs blocking calls made from the event loop on a dedicated pool of threads, such that they neither stall
+    the event loop nor take more than max_workers threads. Calls beyond that wait for a thread, at most max_pending
+    of them, further calls are refused.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, thread_name_prefix: str = '') -> None:
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        # Released once a call finished, also when the caller stopped waiting for it
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        :raises ExecutorSaturated: when max_workers calls are running and max_pending calls are waiting already
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorSaturated("All threads are busy and the queue is full")
+
+        try:
+            future = self._pool.submit(func, *args, **kwargs)
+        except RuntimeError:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
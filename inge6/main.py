@@ -9,10 +9,10 @@ import logging
 
 import uvicorn
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 
 from .config import settings
-from .router import router
+from .router import router, ADMISSION_LANES
 from .provider import get_provider
 
 app = FastAPI()
@@ -20,6 +20,25 @@ app = FastAPI()
 app.include_router(router)
 
 
+@app.middleware('http')
+async def admission_lanes(request: Request, call_next):
+    lane = ADMISSION_LANES.get(request.url.path)
+    if lane is None:
+        return await call_next(request)
+
+    lanes = get_provider().admission_lanes
+    if lanes is None:
+        return await call_next(request)
+
+    if not await lanes.acquire(lane):
+        return get_provider().shed_response(request, lane)
+
+    try:
+        return await call_next(request)
+    finally:
+        await lanes.release()
+
+
 def validate_startup():
     if not os.path.isfile(settings.saml.cert_path):
         raise FileNotFoundError("File {} not found. Required for startup".format(settings.saml.cert_path))
@@ -4,7 +4,7 @@
 #
 # SPDX-License-Identifier: EUPL-1.2
 #
-from typing import Tuple, Dict, List, Text
+from typing import Any, Tuple, Dict, List, Text
 from urllib.parse import parse_qs
 
 import nacl.hash
@@ -15,7 +15,11 @@ import jwt
 from fastapi import  Request, HTTPException
 from fastapi.security.utils import get_authorization_scheme_param
 
-from ..cache import redis_cache
+from oic.oic.message import AuthorizationRequest as OICAuthRequest
+
+# The fields of the authentication request read when authorizing at /acs, and when handling the token request
+# at /accesstoken.
+AUTH_REQ_FIELDS = ('client_id', 'redirect_uri', 'response_type', 'scope', 'state', 'nonce', 'claims')
 
 def _compute_code_challenge(code_verifier: str):
     """
@@ -31,6 +35,13 @@ def _compute_code_challenge(code_verifier: str):
     verifier_hash = nacl.hash.sha256(code_verifier.encode('ISO_8859_1'), encoder=URLSafeBase64Encoder)
     return verifier_hash.decode().replace('=', '')
 
+def auth_req_fields(auth_req: OICAuthRequest) -> Dict[str, Any]:
+    """
+    :param auth_req: the parsed authentication request
+    :returns: the fields of the authentication request needed to complete the flow, as plain values
+    """
+    return {field: value for field, value in auth_req.to_dict().items() if field in AUTH_REQ_FIELDS}
+
 def verify_code_verifier(cc_cm: Dict[str ,str], code_verifier: str) -> bool:
     """
     Verify that the given code_verifier complies with the initially supplied code_challenge.
@@ -96,15 +107,13 @@ def _is_valid_at_request_body(request_body: bytes):
 
     return parsed_request_body
 
-def accesstoken(provider, request_body, headers):
+def verify_token_request(request_body, cc_cm):
     """
-    An access token is requested through this function. It validates whether the body contains the expected parameters and verifies the
-    supplied code_verifier.
+    Validates whether the body of a token request contains the expected parameters and verifies the supplied code_verifier,
+    without using the code.
 
-    :param provider: the provider that is eventually allow to handle the token request once the validations have been performed
     :param request_body: the body containing, among others, the code and code_verifier parameter
-    :param headers: the headers needed for the token request
-    :returns: an accesstoken is returned on success. This means that the code_verifier was verified correctly, and the parameters contain what was expected
+    :param cc_cm: the code challenge and code challenge method stored for the supplied code, None if it has expired
     :raises HTTPException: raises a 400 exception when the request is invalid
     """
     try:
@@ -112,16 +121,26 @@ def accesstoken(provider, request_body, headers):
     except ValueError as parse_error:
         raise HTTPException(400, detail=str(parse_error)) from parse_error
 
-    code = parsed_request_body['code'][0]
     code_verifier = parsed_request_body['code_verifier'][0]
 
-    cc_cm = redis_cache.hget(code, 'cc_cm')
-
     if cc_cm is None:
         raise HTTPException(400, detail='Code challenge has expired. Please retry authorization.')
 
     if not verify_code_verifier(cc_cm, code_verifier):
         raise HTTPException(400, detail='Bad request. code verifier not recognized')
 
+def accesstoken(provider, request_body, headers, cc_cm):
+    """
+    An access token is requested through this function. It validates whether the body contains the expected parameters and verifies the
+    supplied code_verifier, see `verify_token_request`.
+
+    :param provider: the provider that is eventually allow to handle the token request once the validations have been performed
+    :param request_body: the body containing, among others, the code and code_verifier parameter
+    :param headers: the headers needed for the token request
+    :param cc_cm: the code challenge and code challenge method stored for the supplied code, None if it has expired
+    :returns: an accesstoken is returned on success. This means that the code_verifier was verified correctly, and the parameters contain what was expected
+    :raises HTTPException: raises a 400 exception when the request is invalid
+    """
+    verify_token_request(request_body, cc_cm)
     token_response = provider.handle_token_request(request_body.decode('utf-8'), headers)
     return token_response
@@ -5,16 +5,16 @@
 # SPDX-License-Identifier: EUPL-1.2
 #
 import base64
+import hashlib
 import json
 import logging
 
-from urllib.parse import parse_qs, urlencode
-from typing import Optional, Text, List
-from datetime import datetime
+from contextlib import nullcontext
+from urllib.parse import parse_qs, urlencode, quote
+from typing import ContextManager, Optional, Text, List, Tuple, Type, Union
 
-import requests
+from redis import RedisError
 
-import nacl.hash
 from starlette.datastructures import Headers
 
 from fastapi import FastAPI, Request, Response, HTTPException
@@ -32,87 +32,75 @@ from pyop.exceptions import (
 
 from .config import settings
 from .cache import get_redis_client, redis_cache
-from .utils import create_post_autosubmit_form, create_page_too_busy
-from .encrypt import Encrypt
+from .cache.single_flight import FlightResult, SingleFlight
+from .utils import create_post_autosubmit_form, create_page_too_busy, create_page_waiting_room
+from .encrypt import Encrypt, Sealer
+from .crypto_service import get_crypto_client, RemoteEncrypt
 from .models import AuthorizeRequest
-from .exceptions import TooBusyError, TokenSAMLErrorResponse, TooManyRequestsFromOrigin
+from .exceptions import (
+    TooBusyError, TokenSAMLErrorResponse, TooManyRequestsFromOrigin, InvalidSealedToken, CryptoServiceError
+)
+from .ratelimit import WaitingRoom, ControllerConfig, UserLimitController, AdmissionLanes, Lane
+from .ratelimit.factory import create_rate_limiter, LIMITER_KEY_PREFIX
 
-from .saml.exceptions import UserNotAuthenticated
+from .saml.exceptions import UserNotAuthenticated, BackChannelUnavailable, ResponsePoolUnavailable
 from .saml.provider import Provider as SAMLProvider
 from .saml import (
-    AuthNRequest, ArtifactResolveRequest, ArtifactResponse
+    AuthNRequest, ArtifactResolveRequest, ArtifactResponse, SpeculativeArtifactResolver, PresignedRequestPool,
+    ArtifactResponsePool
 )
+from .saml.artifact_resolution import PENDING_FIELD as RESOLUTION_PENDING_FIELD
 
 from .oidc.provider import Provider as OIDCProvider
 from .oidc.authorize import (
     is_authorized,
     validate_jwt_token,
-    accesstoken,
+    verify_token_request,
+    auth_req_fields,
 )
 
 _PROVIDER = None
 
-def _create_authn_post_context(relay_state: str, url: str, issuer_id) -> dict:
-    saml_request = AuthNRequest(url, issuer_id)
+SEALED_RELAY_STATE_PREFIX = 's1.'
+WAITING_ROOM_TICKET_PREFIX = 'q1.'
+
+def _create_authn_post_context(relay_state: str, url: str, issuer_id, request_pool: Optional[PresignedRequestPool] = None) -> dict:
+    saml_request = request_pool.take(url) if request_pool is not None else None
+    if saml_request is None:
+        saml_request = AuthNRequest(url, issuer_id).get_base64_string().decode()
     return {
         'sso_url': url,
-        'saml_request': saml_request.get_base64_string().decode(),
+        'saml_request': saml_request,
         'relay_state': relay_state
     }
 
-def _cache_auth_req(randstate: str, auth_req: OICAuthRequest, authorization_request: AuthorizeRequest) -> None:
-    value = {
-        'auth_req': auth_req,
+def _auth_req_value(auth_req: OICAuthRequest, authorization_request: AuthorizeRequest, as_fields: bool) -> dict:
+    return {
+        'auth_req': auth_req_fields(auth_req) if as_fields else auth_req,
         'code_challenge': authorization_request.code_challenge,
         'code_challenge_method': authorization_request.code_challenge_method
     }
+
+def _cache_auth_req(randstate: str, auth_req: OICAuthRequest, authorization_request: AuthorizeRequest) -> None:
+    value = _auth_req_value(auth_req, authorization_request, not redis_cache.SERIALIZER.serializes_objects)
     redis_cache.hset(randstate, 'auth_req', value)
 
-def _store_code_challenge(code: str, code_challenge: str, code_challenge_method: str) -> None:
+def _store_code_challenge(pipe: redis_cache.CachePipeline, code: str, code_challenge: str, code_challenge_method: str) -> None:
     value = {
         'code_challenge': code_challenge,
         'code_challenge_method': code_challenge_method
     }
-    redis_cache.hset(code, 'cc_cm', value)
+    pipe.hset(code, 'cc_cm', value)
+
+def _token_request_fingerprint(body: bytes, headers: Headers) -> str:
+    digest = hashlib.sha256(body)
+    digest.update(headers.get('authorization', '').encode())
+    return digest.hexdigest()
 
 def _create_redis_bsn_key(key: str, id_token: str, audience: List[Text]) -> str:
     jwt = validate_jwt_token(key, id_token, audience)
     return jwt['at_hash']
 
-def _rate_limit_test(ip_address: str, user_limit_key: str, ip_expire_s: int) -> None:
-    """
-    Test is we have passed the user limit defined in the redis-store. The rate limit
-    defines the number of users per second which we allow.
-
-    if no user_limit is found in the redis store, this check is treated as 'disabled'.
-
-    :param user_limit_key: the key in the redis store that defines the number of allowed users per 10th of a second
-    :raises: TooBusyError when the number of users exceeds the allowed number.
-    """
-    ip_hash = nacl.hash.sha256(ip_address.encode()).decode()
-    ip_key = "tvs:ipv4:" + ip_hash
-    if get_redis_client().get(ip_key) is not None:
-        raise TooManyRequestsFromOrigin(f"Too many requests from the same ip_address during the last {ip_expire_s} seconds.")
-
-    get_redis_client().set(ip_key, "exists", ex=ip_expire_s)
-
-    user_limit = get_redis_client().get(user_limit_key)
-
-    if user_limit is None:
-        return
-
-    user_limit = int(user_limit)
-    timeslot = int(datetime.utcnow().timestamp() * 10)
-
-    timeslot_key = "tvs:limiter:" + str(timeslot)
-    num_users = get_redis_client().incr(timeslot_key)
-
-    if num_users == 1:
-        get_redis_client().expire(timeslot_key, 2)
-    elif num_users >= user_limit:
-        raise TooBusyError("Servers are too busy at this point, please try again later")
-
-
 def _get_too_busy_redirect_error_uri(redirect_uri, state):
     """
     Given the redirect uri and state, return an error to the client desribing the service
@@ -129,19 +117,117 @@ def _get_too_busy_redirect_error_uri(redirect_uri, state):
     return redirect_uri + f"?error={error}&error_description={error_desc}&state={state}"
 
 class Provider(OIDCProvider, SAMLProvider):
-    BSN_SIGN_KEY = settings.bsn.sign_key
-    BSN_ENCRYPT_KEY = settings.bsn.encrypt_key
-    BSN_LOCAL_SYMM_KEY = settings.bsn.local_symm_key
-
     def __init__(self, app: FastAPI) -> None:
         OIDCProvider.__init__(self, app)
         SAMLProvider.__init__(self)
 
-        self.bsn_encrypt = Encrypt(
-            raw_sign_key=self.BSN_SIGN_KEY,
-            raw_enc_key=self.BSN_ENCRYPT_KEY,
-            raw_local_enc_key=self.BSN_LOCAL_SYMM_KEY
-        )
+        crypto_client = get_crypto_client()
+        self.bsn_encrypt: Union[Encrypt, RemoteEncrypt]
+        if crypto_client is not None:
+            # The bsn keys are only read by the crypto service
+            self.bsn_encrypt = RemoteEncrypt(crypto_client)
+        else:
+            self.bsn_encrypt = Encrypt(
+                raw_sign_key=settings.bsn.sign_key,
+                raw_enc_key=settings.bsn.encrypt_key,
+                raw_local_enc_key=settings.bsn.local_symm_key
+            )
+
+        self.relay_state_sealer: Optional[Sealer] = None
+        if settings.saml.stateless_relay_state.lower() == 'true':
+            self.relay_state_sealer = Sealer(
+                raw_symm_key=settings.saml.relay_state_symm_key,
+                expires_in_s=int(settings.saml.relay_state_expires_in_s),
+                prefix=SEALED_RELAY_STATE_PREFIX
+            )
+
+        self.rate_limiter = create_rate_limiter()
+
+        self.waiting_room: Optional[WaitingRoom] = None
+        if self.rate_limiter.queueing:
+            self.waiting_room = WaitingRoom(
+                get_redis_client(),
+                self.rate_limiter,
+                Sealer(
+                    raw_symm_key=settings.ratelimit.waiting_room_symm_key,
+                    expires_in_s=int(settings.ratelimit.waiting_room_ticket_expires_in_s),
+                    prefix=WAITING_ROOM_TICKET_PREFIX
+                )
+            )
+            with open(settings.ratelimit.waiting_room_page, 'r') as waiting_room_file:
+                self.waiting_room_page_template = waiting_room_file.read()
+
+        self.user_limit_controller: Optional[UserLimitController] = None
+        if settings.ratelimit.user_limit_controller.lower() == 'true':
+            self.user_limit_controller = UserLimitController(
+                get_redis_client(),
+                user_limit_key=self.rate_limiter.user_limit_key,
+                channel=settings.ratelimit.user_limit_channel,
+                config=ControllerConfig(
+                    min_user_limit=int(settings.ratelimit.user_limit_min),
+                    max_user_limit=int(settings.ratelimit.user_limit_max),
+                    increase=int(settings.ratelimit.user_limit_increase),
+                    decrease_factor=float(settings.ratelimit.user_limit_decrease_factor),
+                    latency_targets_s={
+                        'artifact': int(settings.ratelimit.artifact_latency_target_ms) / 1000,
+                        'redis': int(settings.ratelimit.redis_latency_target_ms) / 1000
+                    },
+                    max_slow_ratio=float(settings.ratelimit.user_limit_max_slow_ratio),
+                    max_error_ratio=float(settings.ratelimit.user_limit_max_error_ratio)
+                ),
+                interval_s=int(settings.ratelimit.user_limit_controller_interval_s),
+                key_prefix=LIMITER_KEY_PREFIX
+            )
+            self.user_limit_controller.start()
+            self.rate_limiter.measure_round_trips(lambda: self._measure('redis', (RedisError,)))
+            redis_cache.measure_round_trips(lambda: self._measure('redis', (RedisError,)))
+
+        self.admission_lanes: Optional[AdmissionLanes] = None
+        if settings.ratelimit.admission_lanes.lower() == 'true':
+            self.admission_lanes = AdmissionLanes(
+                capacity=int(settings.ratelimit.admission_lanes_capacity),
+                reserved=int(settings.ratelimit.admission_lanes_reserved),
+                wait_timeout_s=int(settings.ratelimit.admission_lanes_wait_ms) / 1000,
+                max_waiting=int(settings.ratelimit.admission_lanes_max_waiting)
+            )
+
+        self.artifact_resolver: Optional[SpeculativeArtifactResolver] = None
+        if settings.saml.speculative_artifact_resolution.lower() == 'true':
+            self.artifact_resolver = SpeculativeArtifactResolver(
+                self._resolve_artifact,
+                max_workers=int(settings.saml.speculative_resolution_workers),
+                max_pending=int(settings.saml.speculative_resolution_max_pending),
+                wait_s=float(settings.saml.speculative_resolution_wait_s)
+            )
+
+        self.token_single_flight: Optional[SingleFlight] = None
+        if settings.oidc.token_single_flight.lower() == 'true':
+            self.token_single_flight = SingleFlight(
+                lock_ttl_s=int(settings.oidc.token_single_flight_lock_ttl_s),
+                result_ttl_s=int(settings.oidc.token_single_flight_result_ttl_s),
+                wait_s=float(settings.oidc.token_single_flight_wait_s)
+            )
+
+        self.authn_request_pool: Optional[PresignedRequestPool] = None
+        if settings.saml.authn_request_pool.lower() == 'true':
+            issuer_id = self.sp_metadata.issuer_id
+            self.authn_request_pool = PresignedRequestPool(
+                lambda destination: AuthNRequest(destination, issuer_id).get_base64_string().decode(),
+                size=int(settings.saml.authn_request_pool_size),
+                max_age_s=int(settings.saml.authn_request_pool_max_age_s),
+                refill_interval_s=int(settings.saml.authn_request_pool_refill_interval_ms) / 1000
+            )
+            self.authn_request_pool.start()
+
+        self.artifact_response_pool: Optional[ArtifactResponsePool] = None
+        if settings.saml.artifact_response_pool.lower() == 'true':
+            self.artifact_response_pool = ArtifactResponsePool(
+                SAMLProvider,
+                max_workers=int(settings.saml.artifact_response_pool_workers),
+                max_pending=int(settings.saml.artifact_response_pool_max_pending),
+                timeout_s=float(settings.saml.artifact_response_pool_timeout_s)
+            )
+            self.artifact_response_pool.start()
 
         with open(settings.ratelimit.sorry_too_busy_page, 'r') as too_busy_file:
             self.too_busy_page_template = too_busy_file.read()
@@ -151,13 +237,63 @@ class Provider(OIDCProvider, SAMLProvider):
 
     def authorize_endpoint(self, authorize_request: AuthorizeRequest, headers: Headers, ip_address: str) -> Response:
         try:
-            _rate_limit_test(ip_address, settings.ratelimit.user_limit_key, int(settings.ratelimit.ip_expire_in_s))
-        except (TooBusyError, TooManyRequestsFromOrigin) as rate_limit_error:
-            logging.getLogger().warning("Rate-limit: Service denied someone access, cancelling authorization flow. Reason: %s", str(rate_limit_error))
-            redirect_uri = _get_too_busy_redirect_error_uri(authorize_request.redirect_uri, authorize_request.state)
-            too_busy_page = create_page_too_busy(self.too_busy_page_template, redirect_uri)
-            return HTMLResponse(content=too_busy_page)
+            self.rate_limiter.enforce(ip_address)
+        except TooBusyError as too_busy_error:
+            if self.user_limit_controller is not None:
+                self.user_limit_controller.record_rejection()
+
+            if self.waiting_room is None:
+                return self._too_busy(authorize_request, too_busy_error)
+
+            ticket = self.waiting_room.enqueue(authorize_request.dict())
+            return self.waiting_room_endpoint(ticket, headers)
+        except TooManyRequestsFromOrigin as too_many_requests:
+            return self._too_busy(authorize_request, too_many_requests)
 
+        return self._start_authorization(authorize_request, headers)
+
+    def waiting_room_endpoint(self, ticket: str, headers: Headers) -> Response:
+        if self.waiting_room is None:
+            raise HTTPException(status_code=404, detail='Not Found')
+
+        try:
+            queue_status = self.waiting_room.poll(ticket)
+        except InvalidSealedToken as invalid_ticket:
+            logging.getLogger().debug('received invalid waiting room ticket', exc_info=True)
+            raise HTTPException(status_code=400, detail='Invalid or expired ticket') from invalid_ticket
+
+        if queue_status.admitted:
+            return self._start_authorization(AuthorizeRequest(**queue_status.request_params), headers)
+
+        poll_interval_s = int(settings.ratelimit.waiting_room_poll_interval_s)
+        waiting_room_page = create_page_waiting_room(
+            self.waiting_room_page_template,
+            poll_uri=f'/waiting-room?ticket={quote(ticket)}',
+            poll_interval_s=poll_interval_s,
+            users_ahead=queue_status.users_ahead,
+            estimated_wait_s=queue_status.estimated_wait_s
+        )
+        return HTMLResponse(content=waiting_room_page, headers={'Retry-After': str(poll_interval_s)})
+
+    def _too_busy(self, authorize_request: AuthorizeRequest, rate_limit_error: Exception) -> Response:
+        logging.getLogger().warning("Rate-limit: Service denied someone access, cancelling authorization flow. Reason: %s", str(rate_limit_error))
+        redirect_uri = _get_too_busy_redirect_error_uri(authorize_request.redirect_uri, authorize_request.state)
+        too_busy_page = create_page_too_busy(self.too_busy_page_template, redirect_uri)
+        return HTMLResponse(content=too_busy_page)
+
+    def shed_response(self, request: Request, lane: Lane) -> Response:
+        logging.getLogger().warning("Admission lanes: Service shed a %s request to %s", lane.value, request.url.path)
+        if lane == Lane.NEW_FLOW and 'redirect_uri' in request.query_params:
+            redirect_uri = _get_too_busy_redirect_error_uri(request.query_params['redirect_uri'], request.query_params.get('state', ''))
+            return HTMLResponse(content=create_page_too_busy(self.too_busy_page_template, redirect_uri))
+
+        return JSONResponse(
+            content={'detail': 'Servers are too busy at this point, please try again later'},
+            status_code=503,
+            headers={'Retry-After': '1'}
+        )
+
+    def _start_authorization(self, authorize_request: AuthorizeRequest, headers: Headers) -> Response:
         try:
             auth_req = self.parse_authentication_request(urlencode(authorize_request.dict()), headers)
         except InvalidAuthenticationRequest as invalid_auth_req:
@@ -168,17 +304,45 @@ class Provider(OIDCProvider, SAMLProvider):
 
             return Response(content='Something went wrong: {}'.format(str(invalid_auth_req)), status_code=400)
 
-        randstate = redis_cache.gen_token()
-        _cache_auth_req(randstate, auth_req, authorize_request)
+        if self.relay_state_sealer is not None:
+            randstate = self.relay_state_sealer.seal(_auth_req_value(auth_req, authorize_request, True))
+        else:
+            randstate = redis_cache.gen_token()
+            _cache_auth_req(randstate, auth_req, authorize_request)
         return HTMLResponse(content=self._login(randstate))
 
-    def token_endpoint(self, body: bytes, headers: Headers) -> JSONResponse:
+    def token_endpoint(self, body: bytes, headers: Headers) -> Response:
+        if self.token_single_flight is None:
+            return self._token_endpoint(body, headers)
+
+        def exchange_code() -> FlightResult:
+            response = self._token_endpoint(body, headers)
+            return FlightResult(response.status_code, bytes(response.body))
+
+        code = parse_qs(body.decode())['code'][0]
+        result = self.token_single_flight.do(code, _token_request_fingerprint(body, headers), exchange_code)
+        if result is None:
+            error_resp = TokenSAMLErrorResponse(error='temporarily_unavailable', error_description='A token request for this code is in progress').to_json()
+            return JSONResponse(jsonable_encoder(error_resp), status_code=503, headers={'Retry-After': '1'})
+
+        retry_headers = {'Retry-After': '1'} if result.status_code == 503 else None
+        return Response(content=result.body, status_code=result.status_code, media_type='application/json', headers=retry_headers)
+
+    def _token_endpoint(self, body: bytes, headers: Headers) -> JSONResponse:
         code = parse_qs(body.decode())['code'][0]
-        artifact = redis_cache.hget(code, 'arti')
+        with redis_cache.pipeline() as pipe:
+            pipe.hget(code, 'arti')
+            pipe.hget(code, 'cc_cm')
+            pipe.hget(code, 'mock')
+            pipe.hget(code, RESOLUTION_PENDING_FIELD)
+            artifact, cc_cm, is_digid_mock, resolution_pending = pipe.execute()
 
         try:
-            token_response = accesstoken(self, body, headers)
-            encrypted_bsn = self._resolve_artifact(artifact)
+            # The artifact is resolved before the code is used, such that the client can retry the token request
+            # when the resolution is unavailable.
+            verify_token_request(body, cc_cm)
+            encrypted_bsn = self._resolve_artifact_of_code(code, artifact, is_digid_mock is not None, resolution_pending is not None)
+            token_response = self.handle_token_request(body.decode('utf-8'), headers)
 
             access_key = _create_redis_bsn_key(self.key, token_response['id_token'].encode(), self.audience)
             redis_cache.set(access_key, encrypted_bsn)
@@ -188,6 +352,10 @@ class Provider(OIDCProvider, SAMLProvider):
         except UserNotAuthenticated as user_not_authenticated:
             logging.getLogger().debug('invalid client authentication at token endpoint', exc_info=True)
             error_resp = TokenSAMLErrorResponse(error=user_not_authenticated.oauth_error, error_description=str(user_not_authenticated)).to_json()
+        except (BackChannelUnavailable, ResponsePoolUnavailable, CryptoServiceError) as unavailable:
+            logging.getLogger().warning('artifact resolution unavailable: %s', str(unavailable))
+            error_resp = TokenSAMLErrorResponse(error='temporarily_unavailable', error_description=str(unavailable)).to_json()
+            return JSONResponse(jsonable_encoder(error_resp), status_code=503, headers={'Retry-After': '1'})
         except InvalidClientAuthentication as invalid_client_auth:
             logging.getLogger().debug('invalid client authentication at token endpoint', exc_info=True)
             error_resp = TokenErrorResponse(error='invalid_client', error_description=str(invalid_client_auth)).to_json()
@@ -205,7 +373,7 @@ class Provider(OIDCProvider, SAMLProvider):
             authn_post_ctx = _create_authn_post_context(relay_state=randstate, url=f'/digid-mock?state={randstate}', issuer_id=issuer_id)
         else:
             sso_url = self.idp_metadata.get_sso()['location']
-            authn_post_ctx = _create_authn_post_context(relay_state=randstate, url=sso_url, issuer_id=issuer_id)
+            authn_post_ctx = _create_authn_post_context(relay_state=randstate, url=sso_url, issuer_id=issuer_id, request_pool=self.authn_request_pool)
 
         return create_post_autosubmit_form(authn_post_ctx)
 
@@ -213,23 +381,63 @@ class Provider(OIDCProvider, SAMLProvider):
         state = request.query_params['RelayState']
         artifact = request.query_params['SAMLart']
 
-        if 'mocking' in request.query_params:
-            redis_cache.set('DIGID_MOCK' + artifact, 'true')
-
-        auth_req_dict = redis_cache.hget(state, 'auth_req')
+        auth_req_dict = self._load_auth_req(state)
         auth_req = auth_req_dict['auth_req']
+        if isinstance(auth_req, dict):
+            # Stored as its fields by the compact serializer, or sealed in the RelayState
+            auth_req = OICAuthRequest().from_dict(auth_req)
 
         authn_response = self.authorize(auth_req, 'test_client')
         response_url = authn_response.request(auth_req['redirect_uri'], False)
         code = authn_response['code']
 
-        redis_cache.hset(code, 'arti', artifact)
-        _store_code_challenge(code, auth_req_dict['code_challenge'], auth_req_dict['code_challenge_method'])
+        with redis_cache.pipeline() as pipe:
+            if 'mocking' in request.query_params:
+                pipe.hset(code, 'mock', 'true')
+
+            pipe.hset(code, 'arti', artifact)
+            _store_code_challenge(pipe, code, auth_req_dict['code_challenge'], auth_req_dict['code_challenge_method'])
+            if self.artifact_resolver is not None:
+                self.artifact_resolver.mark_pending(pipe, code)
+
+        if self.artifact_resolver is not None:
+            self.artifact_resolver.submit(code, artifact, 'mocking' in request.query_params)
         return RedirectResponse(response_url, status_code=303)
 
-    def _resolve_artifact(self, artifact: str) -> bytes:
-        is_digid_mock = redis_cache.get('DIGID_MOCK' + artifact)
-        if settings.mock_digid.lower() == "true" and is_digid_mock is not None:
+    def _load_auth_req(self, state: str) -> dict:
+        if self.relay_state_sealer is None or not self.relay_state_sealer.is_sealed(state):
+            return redis_cache.hget(state, 'auth_req')
+
+        try:
+            return self.relay_state_sealer.unseal(state)
+        except InvalidSealedToken as invalid_relay_state:
+            logging.getLogger().debug('received invalid RelayState', exc_info=True)
+            raise HTTPException(status_code=400, detail='Invalid or expired RelayState') from invalid_relay_state
+
+    def _measure(self, backend: str, errors: Tuple[Type[BaseException], ...]) -> ContextManager:
+        if self.user_limit_controller is None:
+            return nullcontext()
+        return self.user_limit_controller.measure(backend, errors)
+
+    def _resolve_artifact_of_code(self, code: str, artifact: str, is_digid_mock: bool, resolution_pending: bool) -> bytes:
+        if not resolution_pending or self.artifact_resolver is None:
+            return self._resolve_artifact(artifact, is_digid_mock)
+
+        resolution = self.artifact_resolver.await_result(code)
+        # An artifact can be resolved only once.
+        if resolution is None and not self.artifact_resolver.claim(code):
+            raise BackChannelUnavailable("Artifact resolution in progress")
+
+        try:
+            if resolution is not None:
+                return SpeculativeArtifactResolver.unpack(resolution)
+            return self._resolve_artifact(artifact, is_digid_mock)
+        except (BackChannelUnavailable, ResponsePoolUnavailable, CryptoServiceError):
+            self.artifact_resolver.release(code)
+            raise
+
+    def _resolve_artifact(self, artifact: str, is_digid_mock: bool = False) -> bytes:
+        if settings.mock_digid.lower() == "true" and is_digid_mock:
             return self.bsn_encrypt.symm_encrypt(artifact)
 
         sso_url = self.idp_metadata.get_sso()['location']
@@ -240,11 +448,16 @@ class Provider(OIDCProvider, SAMLProvider):
             'SOAPAction' : '"https://artifact-pp2.toegang.overheid.nl/kvs/rd/resolve_artifact"',
             'content-type': 'text/xml'
         }
-        resolved_artifact = requests.post(url, headers=headers, data=resolve_artifact_req, cert=(settings.saml.cert_path, settings.saml.key_path))
-        artifact_response = ArtifactResponse.from_string(resolved_artifact.text, self)
-        artifact_response.raise_for_status()
+        with self._measure('artifact', (BackChannelUnavailable,)):
+            # Parsed while received, unless the response is handed to a worker process.
+            resolved_artifact = self.back_channel.post(url, headers=headers, data=resolve_artifact_req, parse=self.artifact_response_pool is None)
+        if self.artifact_response_pool is not None:
+            bsn = self.artifact_response_pool.get_bsn(resolved_artifact.text)
+        else:
+            artifact_response = ArtifactResponse.parse(resolved_artifact.root, self)
+            artifact_response.raise_for_status()
+            bsn = artifact_response.get_bsn()
 
-        bsn = artifact_response.get_bsn()
         encrypted_bsn = self.bsn_encrypt.symm_encrypt(bsn)
         return encrypted_bsn
 
@@ -259,7 +472,12 @@ class Provider(OIDCProvider, SAMLProvider):
 
         decoded_json = base64.b64decode(attributes).decode()
         bsn_dict = json.loads(decoded_json)
-        encrypted_bsn = self.bsn_encrypt.from_symm_to_pub(bsn_dict)
+        try:
+            encrypted_bsn = self.bsn_encrypt.from_symm_to_pub(bsn_dict)
+        except CryptoServiceError as crypto_service_error:
+            logging.getLogger().warning('crypto service unavailable: %s', str(crypto_service_error))
+            raise HTTPException(status_code=503, detail="Service temporarily unavailable, please try again later",
+                                headers={'Retry-After': '1'}) from crypto_service_error
         return Response(content=encrypted_bsn, status_code=200)
 
     def metadata(self) -> Response:
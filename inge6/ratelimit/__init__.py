@@ -0,0 +1,17 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+# pylint: disable=unused-import
+
+from .verdict import Admission, Verdict
+from .limiter import RateLimiter
+from .slot_counter import ShardedSlotCounter
+from .ip_cooldown import IpCooldown, KeyPerIpCooldown, BitmapIpCooldown
+from .prefilter import CountMinSketch, PreFilter
+from .user_limit_cache import UserLimitCache
+from .waiting_room import QueueStatus, WaitingRoom
+from .controller import BackendStats, ControllerConfig, UserLimitController, next_user_limit
+from .lanes import AdmissionLanes, Lane
@@ -0,0 +1,206 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import logging
+import math
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, NamedTuple, Optional, Tuple, Type
+
+from ..cache import RedisClient
+
+STATS_KEY_PREFIX = "tvs:limiter:ctl:stats:"
+DECIDED_KEY_PREFIX = "tvs:limiter:ctl:decided:"
+
+# The fraction of slow or failed calls to a backend is only considered with at least this many calls.
+MIN_SAMPLES = 20
+
+REJECTIONS = 'rejections'
+
+
+class ControllerConfig(NamedTuple):
+    min_user_limit: int
+    max_user_limit: int
+    increase: int
+    decrease_factor: float
+    latency_targets_s: Dict[str, float]
+    max_slow_ratio: float
+    max_error_ratio: float
+
+
+class BackendStats(NamedTuple):
+    calls: int = 0
+    slow: int = 0
+    errors: int = 0
+
+
+def next_user_limit(user_limit: int, stats: Dict[str, BackendStats], rejections: int, config: ControllerConfig) -> int:
+    """
+    Additive increase, multiplicative decrease of the user limit, based on the calls to the backends during
+    an interval.
+
+    The user limit is decreased when too many calls to any of the backends were slow or failed. It is
+    increased when the backends kept up and users have been rejected, the limit is not raised while
+    it is not reached. The result lies within the bounds of the configuration.
+
+    :param user_limit: the current user limit
+    :param stats: the calls per backend during the interval
+    :param rejections: the number of users rejected during the interval as the service was too busy
+    :param config: the configuration of the controller
+    :returns: the user limit for the next interval
+    """
+    overloaded = any(
+        backend.calls >= MIN_SAMPLES and (
+            backend.slow > config.max_slow_ratio * backend.calls or
+            backend.errors > config.max_error_ratio * backend.calls
+        )
+        for backend in stats.values()
+    )
+
+    if overloaded:
+        user_limit = math.floor(user_limit * config.decrease_factor)
+    elif rejections > 0:
+        user_limit = user_limit + config.increase
+
+    return max(config.min_user_limit, min(config.max_user_limit, user_limit))
+
+
+class UserLimitController:
+    """
+    Adjusts the user limit to the measured latency and errors of the backends, artifact resolution and
+    redis, such that the service runs near its capacity.
+
+    Every worker records the calls to the backends. At the end of every interval it adds the counts recorded
+    during the interval to the statistics of that interval in redis. Allowing settle_s for the other workers
+    to do the same, the first worker to claim the interval decides on its statistics. The new user limit, see
+    `next_user_limit`, is published on the user limit channel. The limit is not adjusted while no user limit
+    is set, i.e. while rate limiting is disabled.
+    """
+
+    def __init__(self, redis_client: RedisClient, user_limit_key: str, channel: str, config: ControllerConfig,
+                 interval_s: int, key_prefix: str = '', settle_s: float = 1.0,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.redis_client = redis_client
+        self.user_limit_key = user_limit_key
+        self.channel = channel
+        self.config = config
+        self.interval_s = interval_s
+        self.key_prefix = key_prefix
+        self.settle_s = settle_s
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, backend: str, latency_s: float, error: bool = False) -> None:
+        slow = latency_s > self.config.latency_targets_s.get(backend, math.inf)
+        with self._lock:
+            self._counts[backend + ':calls'] += 1
+            self._counts[backend + ':slow'] += slow
+            self._counts[backend + ':errors'] += error
+
+    def record_rejection(self) -> None:
+        with self._lock:
+            self._counts[REJECTIONS] += 1
+
+    @contextmanager
+    def measure(self, backend: str, errors: Tuple[Type[BaseException], ...] = (Exception,)) -> Iterator[None]:
+        """
+        Record the latency of the call to the backend made in the with block, and whether it raised one of
+        the given errors.
+        """
+        start = time.monotonic()
+        error = False
+        try:
+            yield
+        except errors:
+            error = True
+            raise
+        finally:
+            self.record(backend, time.monotonic() - start, error)
+
+    def stats_key(self, interval: int) -> str:
+        return self.key_prefix + STATS_KEY_PREFIX + str(interval)
+
+    def flush(self, interval: int) -> None:
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+
+        if not counts:
+            return
+
+        stats_key = self.stats_key(interval)
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            for field, count in counts.items():
+                pipe.hincrby(stats_key, field, count)
+            pipe.expire(stats_key, 3 * self.interval_s)
+            pipe.execute()
+
+    def decide(self, interval: int) -> Optional[int]:
+        """
+        Decide on the user limit after the given interval, unless another worker did.
+
+        :returns: the new user limit, None when the user limit was not adjusted
+        """
+        if not self.redis_client.set(self.key_prefix + DECIDED_KEY_PREFIX + str(interval), 1, nx=True, ex=3 * self.interval_s):
+            return None
+
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.get(self.user_limit_key)
+            pipe.hgetall(self.stats_key(interval))
+            raw_user_limit, raw_counts = pipe.execute()
+
+        if raw_user_limit is None or int(raw_user_limit) < 0:
+            return None
+
+        user_limit = int(raw_user_limit)
+        counts = {field.decode(): int(count) for field, count in raw_counts.items()}
+        stats = {
+            backend: BackendStats(*(counts.get(f'{backend}:{stat}', 0) for stat in BackendStats._fields))
+            for backend in {field.split(':')[0] for field in counts if field != REJECTIONS}
+        }
+        new_user_limit = next_user_limit(user_limit, stats, counts.get(REJECTIONS, 0), self.config)
+        if new_user_limit == user_limit:
+            return None
+
+        logging.getLogger().info("Adjusting the user limit from %d to %d, stats: %s", user_limit, new_user_limit, stats)
+        self.redis_client.set(self.user_limit_key, new_user_limit)
+        self.redis_client.publish(self.channel, str(new_user_limit))
+        return new_user_limit
+
+    def tick(self) -> None:
+        """
+        Called at the end of an interval: flush the counts recorded during the interval that just ended, and
+        decide on it once the other workers had the time to flush theirs.
+        """
+        # Rounded, as the end of the interval may be observed a bit early
+        interval = round(self._clock() / self.interval_s) - 1
+        self.flush(interval)
+        if not self._stop.wait(self.settle_s):
+            self.decide(interval)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s - self._clock() % self.interval_s):
+            try:
+                self.tick()
+            except Exception as error: # pylint: disable=broad-except
+                logging.getLogger().warning("User limit controller failed: %s", str(error))
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,76 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+from typing import Optional
+
+from .ip_cooldown import IpCooldown, BitmapIpCooldown
+from .limiter import RateLimiter, TIMESLOT_EXPIRE_S
+from .prefilter import PreFilter
+from .slot_counter import ShardedSlotCounter
+from .user_limit_cache import UserLimitCache
+from ..cache import get_redis_client, hash_tag_prefix
+from ..config import settings
+
+# Prefix of all rate limit keys. In cluster mode this is a hash tag putting the keys on a single shard, otherwise
+# the keys are not prefixed.
+LIMITER_KEY_PREFIX: str = hash_tag_prefix('tvs:limiter')
+
+def create_rate_limiter() -> RateLimiter:
+    """
+    Create the rate limiter, and the optional parts of it, as configured in the ratelimit section of the settings.
+
+    :returns: the configured rate limiter, the listener of the user limit cache is started when it is enabled.
+    """
+    slot_counter: Optional[ShardedSlotCounter] = None
+    if settings.ratelimit.slot_counter == 'sharded':
+        slot_counter = ShardedSlotCounter(
+            get_redis_client(),
+            num_shards=int(settings.ratelimit.slot_counter_shards),
+            flush_interval_s=int(settings.ratelimit.slot_counter_flush_interval_ms) / 1000,
+            slot_expire_s=TIMESLOT_EXPIRE_S
+        )
+
+    ip_cooldown: Optional[IpCooldown] = None
+    if settings.ratelimit.ip_cooldown == 'bitmap':
+        ip_cooldown = BitmapIpCooldown(
+            ip_expire_s=int(settings.ratelimit.ip_expire_in_s),
+            bits=int(settings.ratelimit.ip_cooldown_bitmap_bits),
+            hash_key=bytes.fromhex(settings.ratelimit.ip_cooldown_hash_key),
+            key_prefix=LIMITER_KEY_PREFIX
+        )
+
+    prefilter: Optional[PreFilter] = None
+    if settings.ratelimit.prefilter.lower() == 'true':
+        prefilter = PreFilter(
+            ip_expire_s=int(settings.ratelimit.ip_expire_in_s),
+            num_workers=int(settings.ratelimit.prefilter_workers),
+            headroom=float(settings.ratelimit.prefilter_headroom),
+            expected_ips=int(settings.ratelimit.prefilter_expected_ips),
+            false_positive_rate=float(settings.ratelimit.prefilter_false_positive_rate),
+            sketch_depth=int(settings.ratelimit.prefilter_sketch_depth)
+        )
+
+    user_limit_cache: Optional[UserLimitCache] = None
+    if settings.ratelimit.user_limit_cache.lower() == 'true':
+        user_limit_cache = UserLimitCache(
+            get_redis_client(),
+            user_limit_key=LIMITER_KEY_PREFIX + settings.ratelimit.user_limit_key,
+            ttl_s=float(settings.ratelimit.user_limit_cache_ttl_s),
+            channel=settings.ratelimit.user_limit_channel
+        )
+        user_limit_cache.start_listener()
+
+    return RateLimiter(
+        get_redis_client(),
+        user_limit_key=settings.ratelimit.user_limit_key,
+        ip_expire_s=int(settings.ratelimit.ip_expire_in_s),
+        key_prefix=LIMITER_KEY_PREFIX,
+        slot_counter=slot_counter,
+        ip_cooldown=ip_cooldown,
+        prefilter=prefilter,
+        user_limit_cache=user_limit_cache,
+        queueing=settings.ratelimit.waiting_room.lower() == 'true'
+    )
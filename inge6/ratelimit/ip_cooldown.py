@@ -0,0 +1,94 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import hashlib
+import time
+
+from abc import ABC, abstractmethod
+from typing import List, Tuple
+
+import nacl.hash
+
+
+class IpCooldown(ABC):
+    """
+    Backend for the per ip cooldown of the rate limiter. A backend supplies the lua snippet the rate limit
+    script starts with, and the keys and arguments that snippet needs. The snippet returns {1, 0, -1} when
+    the ip address is in its cooldown period, and marks it as seen otherwise.
+
+    The snippet may use KEYS[5] and further, ARGV[1] (the cooldown in seconds) and ARGV[6] and further.
+    """
+    SCRIPT: str
+
+    def __init__(self, ip_expire_s: int, key_prefix: str = '') -> None:
+        self.ip_expire_s = ip_expire_s
+        self.key_prefix = key_prefix
+
+    @abstractmethod
+    def keys_and_args(self, ip_address: str) -> Tuple[List[str], List[int]]:
+        pass
+
+
+class KeyPerIpCooldown(IpCooldown):
+    """
+    Stores a key per ip address, expiring after the cooldown period.
+    """
+    KEY_PREFIX = "tvs:ipv4:"
+
+    SCRIPT = """
+if not redis.call('SET', KEYS[5], 'exists', 'NX', 'EX', ARGV[1]) then
+    return {1, 0, -1}
+end
+"""
+
+    def keys_and_args(self, ip_address: str) -> Tuple[List[str], List[int]]:
+        ip_hash = nacl.hash.sha256(ip_address.encode()).decode()
+        return [self.key_prefix + self.KEY_PREFIX + ip_hash], []
+
+
+class BitmapIpCooldown(IpCooldown):
+    """
+    Stores the ip addresses seen per second in a bitmap, setting the bit at the offset given by a truncated,
+    keyed hash of the ip address. An ip address is in its cooldown period when its bit is set in the bitmap
+    of the current second or of any of the seconds before that, within the cooldown period.
+
+    The memory used is bounded by (ip_expire_s + 1) * 2^bits / 8 bytes, regardless of the number of ip
+    addresses. Addresses sharing a bit collide, the chance an address is falsely in its cooldown period is
+    about ip_expire_s * (addresses per second) / 2^bits. The hash is keyed with a secret so the colliding
+    addresses cannot be computed by others, an empty key is rejected.
+    """
+    KEY_PREFIX = "tvs:ipcd:"
+
+    SCRIPT = """
+for i = 6, #KEYS do
+    if redis.call('GETBIT', KEYS[i], ARGV[6]) == 1 then
+        return {1, 0, -1}
+    end
+end
+if redis.call('SETBIT', KEYS[5], ARGV[6], 1) == 1 then
+    return {1, 0, -1}
+end
+redis.call('EXPIRE', KEYS[5], ARGV[1] + 1)
+"""
+
+    def __init__(self, ip_expire_s: int, bits: int, hash_key: bytes, key_prefix: str = '') -> None:
+        if not hash_key:
+            raise ValueError("The bitmap ip cooldown requires a hash key")
+        super().__init__(ip_expire_s, key_prefix)
+        self.bits = bits
+        self.hash_key = hash_key
+
+    def bit_offset(self, ip_address: str) -> int:
+        digest = hashlib.blake2b(ip_address.encode(), digest_size=8, key=self.hash_key).digest()
+        return int.from_bytes(digest, 'big') >> (64 - self.bits)
+
+    def bucket_key(self, second: int) -> str:
+        return self.key_prefix + self.KEY_PREFIX + str(second)
+
+    def keys_and_args(self, ip_address: str) -> Tuple[List[str], List[int]]:
+        now = int(time.time())
+        keys = [self.bucket_key(second) for second in range(now, now - self.ip_expire_s, -1)]
+        return keys, [self.bit_offset(ip_address)]
@@ -0,0 +1,86 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import asyncio
+
+from enum import Enum
+from typing import Optional
+
+
+class Lane(str, Enum):
+    NEW_FLOW = 'new_flow'
+    IN_FLOW = 'in_flow'
+
+
+class AdmissionLanes:
+    """
+    Per worker budget of concurrent requests, with part of it reserved for the requests of flows that have
+    been admitted already. Requests starting a new flow are shed as soon as the unreserved part is in use,
+    requests of a flow in progress wait at most wait_timeout_s for room in the whole budget. At most max_waiting
+    requests wait, further requests are shed. While requests are waiting, room that comes free is handed to
+    them in order of arrival, rather than to requests that just came in.
+
+    Meant to be used from the event loop of the worker, it is not thread-safe.
+    """
+
+    def __init__(self, capacity: int, reserved: int, wait_timeout_s: float, max_waiting: int) -> None:
+        if not 0 <= reserved < capacity:
+            raise ValueError("The reserved capacity should be less than the capacity")
+
+        self.capacity = capacity
+        self.reserved = reserved
+        self.wait_timeout_s = wait_timeout_s
+        self.max_waiting = max_waiting
+        self.in_use = 0
+        self.waiting = 0
+        # Created on first use, binding it to the running event loop.
+        self._room: Optional[asyncio.Condition] = None
+
+    def try_acquire_new_flow(self) -> bool:
+        if self.waiting > 0 or self.in_use >= self.capacity - self.reserved:
+            return False
+        self.in_use += 1
+        return True
+
+    async def acquire_in_flow(self) -> bool:
+        if self.waiting == 0 and self.in_use < self.capacity:
+            self.in_use += 1
+            return True
+
+        if self.waiting >= self.max_waiting:
+            return False
+
+        if self._room is None:
+            self._room = asyncio.Condition()
+
+        self.waiting += 1
+        try:
+            async with self._room:
+                try:
+                    await asyncio.wait_for(self._room.wait_for(lambda: self.in_use < self.capacity), self.wait_timeout_s)
+                except asyncio.TimeoutError:
+                    # Pass on the notification this request may have taken
+                    if self.in_use < self.capacity:
+                        self._room.notify()
+                    return False
+                self.in_use += 1
+                return True
+        finally:
+            self.waiting -= 1
+
+    async def acquire(self, lane: Lane) -> bool:
+        """
+        :returns: whether the request may be handled, `release` has to be called when it has been.
+        """
+        if lane == Lane.NEW_FLOW:
+            return self.try_acquire_new_flow()
+        return await self.acquire_in_flow()
+
+    async def release(self) -> None:
+        self.in_use -= 1
+        if self._room is not None:
+            async with self._room:
+                self._room.notify()
@@ -0,0 +1,176 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable, ContextManager, Optional
+
+from .ip_cooldown import IpCooldown, KeyPerIpCooldown
+from .prefilter import PreFilter
+from .user_limit_cache import UserLimitCache
+from .verdict import Admission, Verdict
+from .slot_counter import ShardedSlotCounter
+from ..cache import RedisClient, register_script
+from ..exceptions import TooBusyError, TooManyRequestsFromOrigin
+
+TIMESLOT_KEY_PREFIX = "tvs:limiter:"
+TIMESLOT_EXPIRE_S = 2
+
+QUEUE_HEAD_KEY = "tvs:limiter:queue:head"
+QUEUE_TAIL_KEY = "tvs:limiter:queue:tail"
+
+# The rate limit script starts with the lua snippet of the ip cooldown backend.
+# KEYS: user limit key, timeslot key, queue head key, queue tail key, followed by the keys of the ip cooldown backend
+# ARGV: ip expiry in seconds, timeslot expiry in seconds, whether to count the user in the timeslot key (1 or 0),
+#       the cached user limit (-1 when disabled, empty to read the user limit key), whether users queued in
+#       the waiting room go first (1 or 0), followed by the arguments of the ip cooldown backend
+# Returns: {admission code, number of users in the timeslot, user limit or -1 when disabled}
+ADMISSION_SCRIPT = """
+local user_limit
+if ARGV[4] == '' then
+    user_limit = tonumber(redis.call('GET', KEYS[1]))
+else
+    user_limit = tonumber(ARGV[4])
+end
+
+if user_limit == nil or user_limit < 0 then
+    return {0, 0, -1}
+end
+
+if ARGV[5] == '1' and tonumber(redis.call('GET', KEYS[4]) or '0') > tonumber(redis.call('GET', KEYS[3]) or '0') then
+    return {2, 0, user_limit}
+end
+
+if ARGV[3] == '0' then
+    return {0, 0, user_limit}
+end
+
+local num_users = redis.call('INCR', KEYS[2])
+if num_users == 1 then
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+elseif num_users >= user_limit then
+    return {2, num_users, user_limit}
+end
+return {0, num_users, user_limit}
+"""
+
+
+def current_timeslot() -> int:
+    return int(datetime.utcnow().timestamp() * 10)
+
+
+class RateLimiter:
+    """
+    Rate limiter deciding whether a new authorization flow may start. The complete admission decision,
+    i.e. the per ip cooldown, the lookup of the user limit and counting the users in the current
+    timeslot of 100ms, is made by a single lua script. This takes one round trip to the redis-server
+    and makes the decision atomic across all workers.
+
+    If no user limit is found in the redis store, the timeslot check is treated as 'disabled'.
+
+    All keys are prefixed by the key prefix. In cluster mode this should be a hash tag, as the keys used by
+    a script need to be on a single shard. Note that this prefix applies to the user limit key as well.
+
+    When a sharded slot counter is given, users are counted by that counter instead of the single timeslot
+    key, which then is no longer a hot key every node increments.
+
+    When a prefilter is given, requests it rejects locally are not passed on to the redis-server.
+
+    When a user limit cache is given, the script only reads the user limit key when the cache is empty.
+
+    When queueing is enabled, new users are not admitted as long as users are waiting in the waiting room,
+    such that the waiting room is not starved by users that keep retrying.
+
+    The round trips of the script to the redis-server are made within the context manager given to
+    `measure_round_trips`, requests decided by the prefilter alone are not.
+    """
+
+    def __init__(self, redis_client: RedisClient, user_limit_key: str, ip_expire_s: int, key_prefix: str = '',
+                 slot_counter: Optional[ShardedSlotCounter] = None, ip_cooldown: Optional[IpCooldown] = None,
+                 prefilter: Optional[PreFilter] = None, user_limit_cache: Optional[UserLimitCache] = None,
+                 queueing: bool = False) -> None:
+        self.user_limit_key = key_prefix + user_limit_key
+        self.ip_expire_s = ip_expire_s
+        self.key_prefix = key_prefix
+        self.slot_counter = slot_counter
+        self.prefilter = prefilter
+        self.user_limit_cache = user_limit_cache
+        self.queueing = queueing
+        self.ip_cooldown = ip_cooldown or KeyPerIpCooldown(ip_expire_s, key_prefix)
+        self._script = register_script(redis_client, self.ip_cooldown.SCRIPT + ADMISSION_SCRIPT)
+        self._round_trip: Callable[[], ContextManager] = nullcontext
+
+    def measure_round_trips(self, round_trip: Callable[[], ContextManager]) -> None:
+        """
+        :param round_trip: returns the context manager each round trip of the script is made in
+        """
+        self._round_trip = round_trip
+
+    def timeslot_key(self, timeslot: int) -> str:
+        return self.key_prefix + TIMESLOT_KEY_PREFIX + str(timeslot)
+
+    def check(self, ip_address: str) -> Verdict:
+        """
+        Decide on the admission of a request originating from the given ip address.
+
+        :param ip_address: the ip address the request originates from
+        :returns: the verdict, containing the admission and the state of the current timeslot
+        """
+        if self.prefilter:
+            local_admission = self.prefilter.check(ip_address)
+            if local_admission is not None:
+                return Verdict(local_admission, 0, self.prefilter.user_limit)
+
+        timeslot = current_timeslot()
+        ip_keys, ip_args = self.ip_cooldown.keys_and_args(ip_address)
+
+        keys = [
+            self.user_limit_key, self.timeslot_key(timeslot),
+            self.key_prefix + QUEUE_HEAD_KEY, self.key_prefix + QUEUE_TAIL_KEY
+        ] + ip_keys
+        generation, cached_user_limit = self.user_limit_cache.get() if self.user_limit_cache else (0, None)
+        args = [
+            self.ip_expire_s, TIMESLOT_EXPIRE_S, 0 if self.slot_counter else 1,
+            '' if cached_user_limit is None else cached_user_limit, 1 if self.queueing else 0
+        ] + ip_args
+        with self._round_trip():
+            admission, num_users, user_limit = self._script(keys=keys, args=args)
+
+        # The ip cooldown is decided before the user limit is read.
+        if admission != Admission.IP_COOLDOWN:
+            if self.user_limit_cache and cached_user_limit is None:
+                self.user_limit_cache.update(generation, user_limit)
+
+            if self.prefilter:
+                self.prefilter.set_user_limit(None if user_limit < 0 else user_limit)
+
+        if user_limit < 0:
+            return Verdict(Admission(admission), num_users, None)
+
+        if self.slot_counter and admission == Admission.ADMITTED:
+            num_users = self.slot_counter.incr(timeslot)
+            if 1 < num_users and user_limit <= num_users:
+                admission = Admission.TOO_BUSY
+
+        return Verdict(Admission(admission), num_users, user_limit)
+
+    def enforce(self, ip_address: str) -> Verdict:
+        """
+        Decide on the admission of a request, see `check`, raising an error when it is not admitted.
+
+        :param ip_address: the ip address the request originates from
+        :raises TooManyRequestsFromOrigin: when the ip address already started a flow during the cooldown period.
+        :raises TooBusyError: when the number of users exceeds the allowed number.
+        """
+        verdict = self.check(ip_address)
+
+        if verdict.admission == Admission.IP_COOLDOWN:
+            raise TooManyRequestsFromOrigin(f"Too many requests from the same ip_address during the last {self.ip_expire_s} seconds.")
+
+        if verdict.admission == Admission.TOO_BUSY:
+            raise TooBusyError("Servers are too busy at this point, please try again later")
+
+        return verdict
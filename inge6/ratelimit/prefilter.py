@@ -0,0 +1,132 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import hashlib
+import math
+import threading
+import time
+
+from array import array
+from typing import Callable, Iterator, Optional
+
+from .verdict import Admission
+
+
+class CountMinSketch:
+    """
+    Approximate counter of items in a fixed amount of memory, width * depth counters. Estimates are never
+    lower than the actual count, they may be higher when an item collides with other items in all rows.
+
+    After adding n distinct items, an item never added has a non-zero estimate with a probability of about
+    (1 - e^(-n / width))^depth.
+    """
+
+    def __init__(self, width: int, depth: int) -> None:
+        self.width = width
+        self.depth = depth
+        self._rows = [array('I', [0]) * width for _ in range(depth)]
+
+    @staticmethod
+    def width_for(expected_items: int, false_positive_rate: float, depth: int) -> int:
+        """
+        :returns: the width at which an item never added has a non-zero estimate with at most the given
+            probability, once expected_items distinct items were added.
+        """
+        return max(1, math.ceil(-expected_items / math.log(1 - false_positive_rate ** (1 / depth))))
+
+    def _indices(self, item: bytes) -> Iterator[int]:
+        digest = hashlib.blake2b(item, digest_size=4 * self.depth).digest()
+        for row in range(self.depth):
+            yield int.from_bytes(digest[4 * row:4 * row + 4], 'little') % self.width
+
+    def add(self, item: bytes) -> None:
+        for row, index in zip(self._rows, self._indices(item)):
+            row[index] += 1
+
+    def estimate(self, item: bytes) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indices(item)))
+
+    def clear(self) -> None:
+        self._rows = [array('I', [0]) * self.width for _ in range(self.depth)]
+
+
+class PreFilter:
+    """
+    Per worker, approximate rate limiter that sheds obvious excess before the redis-server is consulted:
+
+    - ip addresses this worker has forwarded during the current cooldown window, tracked by a count-min sketch
+      that is cleared every ip_expire_s seconds. An ip address the shared rate limiter would admit is rejected
+      when it collides with forwarded addresses in all rows of the sketch. The sketch is sized so that this
+      happens with at most false_positive_rate, as long as this worker forwards at most expected_ips addresses
+      per window.
+    - requests exceeding this worker's share of the user limit, times a headroom factor, tracked by a token
+      bucket. The user limit is learned from the verdicts of the shared rate limiter, while it is unknown or
+      disabled the bucket does not reject anything.
+    """
+
+    def __init__(self, ip_expire_s: int, num_workers: int, headroom: float, expected_ips: int,
+                 false_positive_rate: float, sketch_depth: int, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ip_expire_s = ip_expire_s
+        self.num_workers = num_workers
+        self.headroom = headroom
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._sketch = CountMinSketch(
+            CountMinSketch.width_for(expected_ips, false_positive_rate, sketch_depth), sketch_depth
+        )
+        self._window_start = clock()
+
+        self.user_limit: Optional[int] = None
+        self._rate = 0.0
+        self._capacity = 0.0
+        self._tokens = 0.0
+        self._last_refill = clock()
+
+    def set_user_limit(self, user_limit: Optional[int]) -> None:
+        """
+        :param user_limit: the number of users per 100ms allowed by the shared rate limiter, None if disabled
+        """
+        with self._lock:
+            if user_limit == self.user_limit:
+                return
+
+            previous_user_limit, self.user_limit = self.user_limit, user_limit
+            if user_limit is None:
+                return
+
+            # The share of this worker of the users per second, and at most a timeslot worth of burst.
+            self._rate = user_limit * 10 * self.headroom / self.num_workers
+            self._capacity = max(1.0, self._rate / 10)
+            if previous_user_limit is None:
+                self._tokens = self._capacity
+                self._last_refill = self._clock()
+            else:
+                self._tokens = min(self._tokens, self._capacity)
+
+    def check(self, ip_address: str) -> Optional[Admission]:
+        """
+        :returns: the admission when the request is rejected locally, None when the shared rate limiter should be consulted
+        """
+        item = ip_address.encode()
+        with self._lock:
+            now = self._clock()
+            if now - self._window_start >= self.ip_expire_s:
+                self._sketch.clear()
+                self._window_start = now
+
+            if self._sketch.estimate(item) > 0:
+                return Admission.IP_COOLDOWN
+
+            if self.user_limit is not None:
+                self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self._rate)
+                self._last_refill = now
+                if self._tokens < 1:
+                    return Admission.TOO_BUSY
+                self._tokens -= 1
+
+            self._sketch.add(item)
+            return None
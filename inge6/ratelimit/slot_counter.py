@@ -0,0 +1,103 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import random
+import threading
+import time
+
+from typing import Callable
+
+from ..cache import RedisClient, hash_tag
+
+SHARD_KEY_PREFIX = "tvs:limiter:"
+
+
+class ShardedSlotCounter:
+    """
+    Counts the users admitted per timeslot over a number of sub-counters, rather than a single key every
+    node increments. Increments are accumulated locally and flushed to a randomly chosen sub-counter at
+    most once per flush interval, reading back all sub-counters of the timeslot in the same round trip.
+
+    The count returned is an estimate: the total of the last flush plus the local increments since. It
+    lags behind the exact count by at most the increments other workers made during one flush interval,
+    this is the tolerance of the limit enforced.
+    """
+
+    def __init__(self, redis_client: RedisClient, num_shards: int, flush_interval_s: float,
+                 slot_expire_s: int, clock: Callable[[], float] = time.monotonic) -> None:
+        self.redis_client = redis_client
+        self.num_shards = num_shards
+        self.flush_interval_s = flush_interval_s
+        self.slot_expire_s = slot_expire_s
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._timeslot = -1
+        self._pending = 0
+        self._flushed_total = 0
+        self._last_flush = float('-inf')
+
+    def shard_key(self, timeslot: int, shard: int) -> str:
+        # In cluster mode every sub-counter gets its own hash tag, spreading them over the shards.
+        return hash_tag(SHARD_KEY_PREFIX + str(shard)) + ':' + str(timeslot)
+
+    def incr(self, timeslot: int) -> int:
+        """
+        Count a user in the given timeslot.
+
+        :param timeslot: the timeslot to count the user in
+        :returns: the estimated number of users in the timeslot, including this one
+        """
+        stale_timeslot, stale_pending = -1, 0
+        with self._lock:
+            if timeslot != self._timeslot:
+                # Users counted locally near the end of the previous timeslot still count in that timeslot
+                stale_timeslot, stale_pending = self._timeslot, self._pending
+                self._timeslot = timeslot
+                self._pending = 0
+                self._flushed_total = 0
+                self._last_flush = float('-inf')
+
+            self._pending += 1
+            estimate = self._flushed_total + self._pending
+            now = self._clock()
+            if now - self._last_flush < self.flush_interval_s:
+                pending = 0
+            else:
+                pending, self._pending = self._pending, 0
+                self._last_flush = now
+
+        if stale_pending:
+            self._add(stale_timeslot, stale_pending)
+
+        if not pending:
+            return estimate
+
+        total = self._flush(timeslot, pending)
+
+        with self._lock:
+            if timeslot == self._timeslot:
+                self._flushed_total = max(self._flushed_total, total)
+                return self._flushed_total + self._pending
+            return total
+
+    def _add(self, timeslot: int, pending: int) -> None:
+        shard_key = self.shard_key(timeslot, random.randrange(self.num_shards)) # nosec: not used for security purposes
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.incrby(shard_key, pending)
+            pipe.expire(shard_key, self.slot_expire_s)
+            pipe.execute()
+
+    def _flush(self, timeslot: int, pending: int) -> int:
+        shard_key = self.shard_key(timeslot, random.randrange(self.num_shards)) # nosec: not used for security purposes
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            pipe.incrby(shard_key, pending)
+            pipe.expire(shard_key, self.slot_expire_s)
+            for shard in range(self.num_shards):
+                pipe.get(self.shard_key(timeslot, shard))
+            results = pipe.execute()
+
+        return sum(int(count) for count in results[2:] if count is not None)
@@ -0,0 +1,92 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import logging
+import threading
+import time
+
+from typing import Any, Callable, Optional, Tuple
+
+from ..cache import RedisClient
+
+DISABLED = -1
+
+
+class UserLimitCache:
+    """
+    Per worker cache of the user limit, such that the user limit key is not read on every request. The cached
+    value is dropped after ttl_s seconds, or as soon as a message arrives on the invalidation channel or on
+    the keyspace channel of the user limit key. The latter requires keyspace notifications to be enabled on
+    the redis-server, e.g. `notify-keyspace-events K$g`.
+
+    The cache is filled from the user limit the rate limit script reads whenever the cache is empty, it
+    never takes a round trip of its own. An invalidation racing such a read wins: a value read before the
+    latest invalidation is not stored.
+    """
+
+    def __init__(self, redis_client: RedisClient, user_limit_key: str, ttl_s: float, channel: str,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.redis_client = redis_client
+        self.user_limit_key = user_limit_key
+        self.ttl_s = ttl_s
+        self.channel = channel
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._value: Optional[int] = None
+        self._expires_at = float('-inf')
+        self._listener: Any = None
+
+    def get(self) -> Tuple[int, Optional[int]]:
+        """
+        :returns: the generation of the cache, to pass to `update`, and the cached user limit. DISABLED when
+            no user limit is set, None when nothing is cached.
+        """
+        with self._lock:
+            if self._clock() >= self._expires_at:
+                return self._generation, None
+            return self._generation, self._value
+
+    def update(self, generation: int, user_limit: Optional[int]) -> None:
+        """
+        :param generation: the generation returned by `get` before the user limit was read
+        :param user_limit: the user limit read, DISABLED when no user limit is set
+        """
+        with self._lock:
+            if generation == self._generation:
+                self._value = user_limit
+                self._expires_at = self._clock() + self.ttl_s
+
+    def invalidate(self, *_: Any) -> None:
+        with self._lock:
+            self._generation += 1
+            self._expires_at = float('-inf')
+
+    def _on_listener_error(self, error: Exception, _pubsub: Any, _thread: Any) -> None:
+        # The pubsub reconnects and resubscribes on its next read, invalidations may have been missed meanwhile.
+        logging.getLogger().warning("User limit invalidation listener failed: %s", str(error))
+        self.invalidate()
+        time.sleep(self.ttl_s)
+
+    def start_listener(self) -> None:
+        """
+        Listen for invalidations in a background thread.
+        """
+        # A redis cluster only has database 0.
+        connection_pool = getattr(self.redis_client, 'connection_pool', None)
+        db = connection_pool.connection_kwargs.get('db', 0) if connection_pool else 0
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{
+            self.channel: self.invalidate,
+            f'__keyspace@{db}__:{self.user_limit_key}': self.invalidate,
+        })
+        self._listener = pubsub.run_in_thread(sleep_time=self.ttl_s, daemon=True, exception_handler=self._on_listener_error)
+
+    def stop_listener(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
@@ -0,0 +1,24 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+from enum import Enum
+from typing import NamedTuple, Optional
+
+
+class Admission(int, Enum):
+    ADMITTED = 0
+    IP_COOLDOWN = 1
+    TOO_BUSY = 2
+
+
+class Verdict(NamedTuple):
+    admission: Admission
+    num_users: int
+    user_limit: Optional[int]
+
+    @property
+    def admitted(self) -> bool:
+        return self.admission == Admission.ADMITTED
@@ -0,0 +1,155 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import secrets
+
+from typing import NamedTuple, Optional
+
+from .limiter import RateLimiter, QUEUE_HEAD_KEY, QUEUE_TAIL_KEY, TIMESLOT_EXPIRE_S, current_timeslot
+from ..cache import RedisClient, register_script
+from ..encrypt import Sealer
+from ..exceptions import InvalidSealedToken
+
+QUEUE_CLAIM_KEY_PREFIX = "tvs:limiter:queue:claim:"
+
+# Hands out the next position in the queue. A queue that expired starts over from an empty head, positions are
+# never handed out again below the head of a previous queue. The head is kept alive along with the tail.
+# KEYS: queue tail key, queue head key
+# ARGV: queue expiry in seconds
+# Returns: the position in the queue
+ENQUEUE_SCRIPT = """
+local position = redis.call('INCR', KEYS[1])
+if position == 1 then
+    redis.call('DEL', KEYS[2])
+else
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return position
+"""
+
+# Admits the users waiting up to the given position, as far as the current timeslot has room for them. The
+# users admitted are counted in the timeslot, as if they had been admitted by the rate limiter.
+# KEYS: queue head key, user limit key, timeslot key, claim key of the ticket
+# ARGV: position in the queue, timeslot expiry in seconds, queue expiry in seconds
+# Returns: {status (0 waiting, 1 admitted, 2 already claimed), queue head, user limit or -1 when disabled}
+POLL_SCRIPT = """
+local position = tonumber(ARGV[1])
+local head = tonumber(redis.call('GET', KEYS[1]) or '0')
+local user_limit = tonumber(redis.call('GET', KEYS[2]))
+if user_limit == nil or user_limit < 0 then
+    user_limit = -1
+end
+
+if position > head then
+    local room = position - head
+    if user_limit >= 0 then
+        local num_users = tonumber(redis.call('GET', KEYS[3]) or '0')
+        room = math.min(room, math.max(user_limit - 1, 1) - num_users)
+        if room <= 0 then
+            return {0, head, user_limit}
+        end
+        if redis.call('INCRBY', KEYS[3], room) == room then
+            redis.call('EXPIRE', KEYS[3], ARGV[2])
+        end
+    end
+    head = redis.call('INCRBY', KEYS[1], room)
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    if position > head then
+        return {0, head, user_limit}
+    end
+end
+
+if not redis.call('SET', KEYS[4], 1, 'NX', 'EX', ARGV[3]) then
+    return {2, head, user_limit}
+end
+return {1, head, user_limit}
+"""
+
+
+class QueueStatus(NamedTuple):
+    admitted: bool
+    request_params: dict
+    users_ahead: int
+    user_limit: Optional[int]
+
+    @property
+    def estimated_wait_s(self) -> Optional[float]:
+        """
+        The time it takes to admit the users ahead when every timeslot is filled up to the user limit. This
+        is the least time the user has to wait.
+        """
+        if self.user_limit is None:
+            return None
+        return self.users_ahead / (max(self.user_limit - 1, 1) * 10)
+
+
+class WaitingRoom:
+    """
+    Queue for users that are not admitted by the rate limiter as the service is too busy. Instead of being
+    turned away, such a user gets a ticket holding its position in the queue and the authorize request, sealed
+    such that nothing needs to be stored per user. The user polls the waiting room with its ticket, and is
+    admitted in the order of arrival as soon as the timeslots of the rate limiter have room for it.
+
+    Positions are handed out by incrementing the queue tail key. The queue head key holds the last position
+    admitted, it is advanced by the users polling. The tail key expires when no ticket has been handed out
+    during the lifetime of a ticket, the head key when no ticket has been handed out nor user admitted. The
+    queue then starts over from the first position. A ticket admits its user once.
+
+    The rate limiter should have queueing enabled, such that new users join the queue when users are waiting.
+    The waiting room counts the users it admits in the timeslot key, it does not support a sharded slot counter.
+    """
+
+    def __init__(self, redis_client: RedisClient, rate_limiter: RateLimiter, sealer: Sealer) -> None:
+        if rate_limiter.slot_counter is not None:
+            raise ValueError("The waiting room does not support a sharded slot counter")
+
+        self.redis_client = redis_client
+        self.rate_limiter = rate_limiter
+        self.sealer = sealer
+        self.head_key = rate_limiter.key_prefix + QUEUE_HEAD_KEY
+        self.tail_key = rate_limiter.key_prefix + QUEUE_TAIL_KEY
+        self._enqueue_script = register_script(redis_client, ENQUEUE_SCRIPT)
+        self._script = register_script(redis_client, POLL_SCRIPT)
+
+    def enqueue(self, request_params: dict) -> str:
+        """
+        Place a user at the end of the queue.
+
+        :param request_params: the parameters of the authorize request of the user
+        :returns: the ticket of the user
+        """
+        position = self._enqueue_script(keys=[self.tail_key, self.head_key], args=[self.sealer.expires_in_s])
+
+        return self.sealer.seal({'pos': position, 'id': secrets.token_hex(16), 'req': request_params})
+
+    def poll(self, ticket: str) -> QueueStatus:
+        """
+        Admit the user holding the ticket when it is its turn, and there is room in the current timeslot.
+
+        :param ticket: the ticket handed out by `enqueue`
+        :returns: the status of the user in the queue
+        :raises InvalidSealedToken: when the ticket is invalid or expired, or has admitted its user before.
+        """
+        value = self.sealer.unseal(ticket)
+        position = value['pos']
+
+        keys = [
+            self.head_key, self.rate_limiter.user_limit_key,
+            self.rate_limiter.timeslot_key(current_timeslot()),
+            self.rate_limiter.key_prefix + QUEUE_CLAIM_KEY_PREFIX + value['id']
+        ]
+        status, head, user_limit = self._script(keys=keys, args=[position, TIMESLOT_EXPIRE_S, self.sealer.expires_in_s])
+
+        if status == 2:
+            raise InvalidSealedToken("Ticket has been used before")
+
+        return QueueStatus(
+            admitted=status == 1,
+            request_params=value['req'],
+            users_ahead=max(position - head - 1, 0),
+            user_limit=None if user_limit < 0 else user_limit
+        )
@@ -16,8 +16,11 @@ from fastapi.encoders import jsonable_encoder
 
 from .config import settings
 from .cache import get_redis_client
+from .exceptions import ExecutorSaturated, TokenSAMLErrorResponse
+from .executor import BoundedExecutor
 from .models import AuthorizeRequest
 from .provider import get_provider
+from .ratelimit import Lane
 from .digid_mock import (
     digid_mock as dmock,
     digid_mock_catch as dmock_catch
@@ -25,16 +28,42 @@ from .digid_mock import (
 
 router = APIRouter()
 
+# The token endpoint resolves the artifact and decrypts the assertion. This blocking work is kept off the event loop.
+TOKEN_EXECUTOR = BoundedExecutor(
+    max_workers=int(settings.oidc.token_endpoint_workers),
+    max_pending=int(settings.oidc.token_endpoint_max_pending),
+    thread_name_prefix='accesstoken'
+)
+
+# Requests of flows that have been admitted already get priority over new flows, see `AdmissionLanes`.
+ADMISSION_LANES = {
+    '/authorize': Lane.NEW_FLOW,
+    '/waiting-room': Lane.NEW_FLOW,
+    '/acs': Lane.IN_FLOW,
+    '/accesstoken': Lane.IN_FLOW,
+    '/bsn_attribute': Lane.IN_FLOW,
+}
+
 @router.get('/authorize')
 def authorize(request: Request, authorize_req: AuthorizeRequest = Depends()):
     return get_provider().authorize_endpoint(authorize_req, request.headers, request.client.host)
 
+@router.get('/waiting-room')
+def waiting_room(request: Request, ticket: str):
+    return get_provider().waiting_room_endpoint(ticket, request.headers)
+
 @router.post('/accesstoken')
 async def token_endpoint(request: Request):
     ''' Expect a request with a body containing the grant_type.'''
     body = await request.body()
     headers = request.headers
-    return get_provider().token_endpoint(body, headers)
+    try:
+        return await TOKEN_EXECUTOR.run(get_provider().token_endpoint, body, headers)
+    except ExecutorSaturated as executor_saturated:
+        # Refused before the code is used, the client can retry the token request.
+        logging.getLogger().warning('Token endpoint shed a request: %s', str(executor_saturated))
+        error_resp = TokenSAMLErrorResponse(error='temporarily_unavailable', error_description=str(executor_saturated)).to_json()
+        return JSONResponse(jsonable_encoder(error_resp), status_code=503, headers={'Retry-After': '1'})
 
 @router.get('/metadata')
 def metadata():
@@ -92,7 +121,7 @@ def heartbeat() -> Dict[str, bool]:
 ## MOCK ENDPOINTS:
 if settings.mock_digid.lower() == 'true':
     # pylint: disable=wrong-import-position, c-extension-no-member, wrong-import-order
-    from lxml import etree
+    from .saml.xml_parser import parse_xml
     from urllib.parse import parse_qs # pylint: disable=wrong-import-order
 
     @router.get('/login-digid')
@@ -118,7 +147,7 @@ if settings.mock_digid.lower() == 'true':
                 raise HTTPException(status_code=400, detail='200 expected, got {} with redirect uri: {}'.format(status_code, redirect))
             raise HTTPException(status_code=400, detail='detail authorize response status code was {}, but 200 was expected'.format(status_code))
 
-        response_tree = etree.fromstring(response.__dict__['body'].decode()).getroottree().getroot()
+        response_tree = parse_xml(response.__dict__['body'])
         relay_state = response_tree.find('.//input[@name="RelayState"]').attrib['value']
 
         # pylint: disable=too-few-public-methods, too-many-ancestors, super-init-not-called
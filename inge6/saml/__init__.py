@@ -8,3 +8,7 @@
 
 from .saml_request import AuthNRequest, ArtifactResolveRequest
 from .artifact_response import ArtifactResponse
+from .back_channel import BackChannelResponse, CircuitBreaker, CircuitState, SAMLBackChannel
+from .artifact_resolution import SpeculativeArtifactResolver
+from .request_pool import PresignedRequestPool
+from .response_pool import ArtifactResponsePool
@@ -0,0 +1,153 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+from .exceptions import BackChannelUnavailable, UserNotAuthenticated, ValidationError
+from ..cache import redis_cache
+from ..exceptions import CryptoServiceError
+
+PENDING_FIELD = 'bsn_pending'
+CLAIM_FIELD = 'bsn_claim'
+RESULT_FIELD = 'bsn_result'
+
+# Errors raised by the resolution, re-raised when the result is unpacked.
+_NOT_AUTHENTICATED = 'not_authenticated'
+_UNAVAILABLE = 'unavailable'
+_INVALID = 'invalid_response'
+_FAILED = 'resolution_failed'
+
+
+class SpeculativeArtifactResolver:
+    """
+    Resolves the artifact of an authorization code in the background, as soon as the code is issued, rather
+    than when the code is exchanged for a token. The resolution overlaps with the redirect of the client.
+
+    The encrypted bsn, or the error the resolution raised, is stored under the code, such that any worker can
+    pick it up. An artifact can be resolved only once: a resolution, in the background or by the token
+    endpoint, first claims the artifact of the code. The claim is released when the resolution was unavailable, see
+    `release`. A resolution still queued when the token endpoint claims
+    the artifact is dropped, as is one that has been queued for longer than wait_s. At most max_pending
+    resolutions are queued or running, further codes are left to the token endpoint.
+    """
+
+    def __init__(self, resolve: Callable[[str, bool], bytes], max_workers: int, max_pending: int, wait_s: float) -> None:
+        """
+        :param resolve: resolves an artifact, whether it was issued by the DigiD mock, to the encrypted bsn
+        :param max_workers: the number of threads resolving artifacts
+        :param max_pending: the number of resolutions queued or running at most
+        :param wait_s: the time to await a result of this worker, this should exceed the time a resolution takes
+        """
+        self.resolve = resolve
+        self.wait_s = wait_s
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='artifact-resolution')
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._futures: Dict[str, Future] = {}
+
+    @staticmethod
+    def mark_pending(pipe: redis_cache.CachePipeline, code: str) -> None:
+        pipe.hset(code, PENDING_FIELD, True)
+
+    @staticmethod
+    def claim(code: str) -> bool:
+        """
+        :returns: whether the caller may resolve the artifact of the code, no other resolution will. An expired code
+            cannot be claimed.
+        """
+        return redis_cache.hsetnx(code, CLAIM_FIELD, True)
+
+    @staticmethod
+    def release(code: str) -> None:
+        """
+        Give up the claim on the artifact of the code, and drop the result of its resolution, after the resolution
+        was unavailable. A retry of the token request then resolves the artifact again, this fails when the artifact
+        was used by the failed resolution after all.
+        """
+        redis_cache.hdel(code, CLAIM_FIELD, RESULT_FIELD)
+
+    def submit(self, code: str, artifact: str, is_digid_mock: bool) -> Optional[Future]:
+        """
+        Start resolving the artifact, the code should have been marked pending.
+
+        :returns: the future of the resolution, None when too many resolutions are pending.
+        """
+        if not self._pending.acquire(blocking=False):
+            logging.getLogger().warning("Too many speculative artifact resolutions pending, leaving it to the token endpoint")
+            return None
+
+        try:
+            future = self._pool.submit(self._resolve, code, artifact, is_digid_mock, time.monotonic())
+        except RuntimeError:
+            self._pending.release()
+            raise
+
+        self._futures[code] = future
+        future.add_done_callback(lambda _: self._futures.pop(code, None))
+        return future
+
+    def _resolve(self, code: str, artifact: str, is_digid_mock: bool, submitted_at: float) -> None:
+        try:
+            if time.monotonic() - submitted_at > self.wait_s or not self.claim(code):
+                return
+            self._store_result(code, artifact, is_digid_mock)
+        finally:
+            self._pending.release()
+
+    def _store_result(self, code: str, artifact: str, is_digid_mock: bool) -> None:
+        result: Dict[str, Any]
+        try:
+            result = {'bsn': self.resolve(artifact, is_digid_mock)}
+        except UserNotAuthenticated as user_not_authenticated:
+            result = {'error': _NOT_AUTHENTICATED, 'oauth_error': user_not_authenticated.oauth_error, 'description': str(user_not_authenticated)}
+        except (BackChannelUnavailable, CryptoServiceError) as unavailable:
+            result = {'error': _UNAVAILABLE, 'description': str(unavailable)}
+        except ValidationError as validation_error:
+            result = {'error': _INVALID, 'description': str(validation_error)}
+        except Exception as error: # pylint: disable=broad-except
+            logging.getLogger().exception("Speculative artifact resolution failed")
+            result = {'error': _FAILED, 'description': str(error)}
+
+        redis_cache.hset(code, RESULT_FIELD, result)
+
+    def await_result(self, code: str) -> Optional[dict]:
+        """
+        Obtain the result of the resolution for the code, awaiting it for at most wait_s when it is resolved
+        by this worker. A resolution by another worker is not awaited.
+
+        :returns: the result, to be unpacked by `unpack`, None when there is no result (yet).
+        """
+        future = self._futures.get(code)
+        if future is not None:
+            try:
+                future.result(timeout=self.wait_s)
+            except FutureTimeoutError:
+                pass
+        return redis_cache.hget(code, RESULT_FIELD)
+
+    @staticmethod
+    def unpack(result: dict) -> bytes:
+        """
+        :returns: the encrypted bsn
+        :raises UserNotAuthenticated, BackChannelUnavailable, ValidationError: as raised by the resolution.
+        """
+        if 'bsn' in result:
+            return result['bsn']
+
+        if result['error'] == _NOT_AUTHENTICATED:
+            raise UserNotAuthenticated(result['description'], oauth_error=result['oauth_error'])
+        if result['error'] == _UNAVAILABLE:
+            raise BackChannelUnavailable(result['description'])
+        if result['error'] == _INVALID:
+            raise ValidationError(result['description'])
+        raise RuntimeError(result['description'])
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
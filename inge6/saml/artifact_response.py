@@ -5,7 +5,7 @@
 # SPDX-License-Identifier: EUPL-1.2
 #
 # pylint: disable=c-extension-no-member
-from typing import Text, List
+from typing import Text, List, Optional
 
 import base64
 import re
@@ -14,17 +14,16 @@ import logging
 from datetime import datetime, timedelta
 from functools import cached_property
 
-import dateutil.parser
-
 from Crypto.Cipher import AES
 from lxml import etree
 
 from onelogin.saml2.utils import OneLogin_Saml2_Utils
 
 from ..config import settings
-from .utils import from_settings, has_valid_signatures, remove_padding
-from .constants import NAMESPACES
+from ..crypto_service import get_crypto_client
+from .utils import from_settings, has_valid_signatures, remove_padding, parse_iso8601, ElementIndex
 from .exceptions import UserNotAuthenticated, ValidationError
+from .xml_parser import get_parser, parse_xml
 from .provider import Provider as SAMLProvider
 
 RESPONSE_EXPIRES_IN = int(settings.saml.response_expires_in)
@@ -33,8 +32,8 @@ PRIV_KEY_PATH = settings.saml.key_path
 CAMEL_TO_SNAKE_RE = re.compile(r'(?<!^)(?=[A-Z])')
 
 
-def verify_signatures(tree, cert_data):
-    root, valid = has_valid_signatures(tree, cert_data=cert_data)
+def verify_signatures(tree, cert_data, index: Optional[ElementIndex] = None):
+    root, valid = has_valid_signatures(tree, cert_data=cert_data, index=index)
     if not valid:
         raise ValidationError("Invalid signatures")
 
@@ -43,12 +42,18 @@ def verify_signatures(tree, cert_data):
 # pylint: disable=too-many-instance-attributes, too-many-public-methods
 class ArtifactResponse:
 
-    def __init__(self, artifact_tree, provider: SAMLProvider, is_verified: bool = True, is_test_instance: bool = False) -> None:
+    def __init__(self, artifact_tree, provider: SAMLProvider, is_verified: bool = True, is_test_instance: bool = False,
+                 index: Optional[ElementIndex] = None) -> None:
+        """
+        :param index: an index of a tree containing artifact_tree, built when None. All lookups of the validation
+            go through the index, rather than each walking the tree.
+        """
         self.provider = provider
         self.is_verifeid = is_verified
         self.is_test_instance = is_test_instance
 
         self._root = artifact_tree
+        self.index = index if index is not None else ElementIndex(artifact_tree)
         self._response = None
         self._response_status = None
         self._saml_status_code = None
@@ -69,17 +74,18 @@ class ArtifactResponse:
 
     @classmethod
     def from_string(cls, xml_response: str, provider: SAMLProvider, insecure=False, is_test_instance: bool=False):
-        artifact_response_tree = etree.fromstring(xml_response).getroottree().getroot()
+        artifact_response_tree = parse_xml(xml_response)
         return cls.parse(artifact_response_tree, provider, insecure, is_test_instance)
 
     @classmethod
     def parse(cls, artifact_response_tree, provider: SAMLProvider, insecure=False, is_test_instance: bool=False):
-        unverified_tree = artifact_response_tree.find('.//samlp:ArtifactResponse', NAMESPACES)
+        index = ElementIndex(artifact_response_tree)
+        unverified_tree = index.find('samlp:ArtifactResponse', artifact_response_tree)
         if insecure:
-            return cls(unverified_tree, provider, False, is_test_instance)
+            return cls(unverified_tree, provider, False, is_test_instance, index)
 
-        verified_tree = verify_signatures(artifact_response_tree, provider.idp_metadata.get_cert_pem_data())
-        return cls(verified_tree, provider, True, is_test_instance)
+        verified_tree = verify_signatures(artifact_response_tree, provider.idp_metadata.get_cert_pem_data(), index)
+        return cls(verified_tree, provider, True, is_test_instance, index)
 
     @property
     def root(self):
@@ -87,18 +93,18 @@ class ArtifactResponse:
 
     @cached_property
     def response(self):
-        return self.root.find('.//samlp:Response', NAMESPACES)
+        return self.index.find('samlp:Response', self.root)
 
     @cached_property
     def response_status(self):
-        return self.response.find('./samlp:Status', NAMESPACES)
+        return self.index.find('samlp:Status', self.response, direct=True)
 
     @cached_property
     def saml_status_code(self) -> str:
-        top_level_status_code = self.response_status.find('./samlp:StatusCode', NAMESPACES)
+        top_level_status_code = self.index.find_required('samlp:StatusCode', self.response_status, direct=True)
 
         if top_level_status_code.attrib['Value'].split(':')[-1].lower() != "success":
-            second_level = top_level_status_code.find('./samlp:StatusCode', NAMESPACES)
+            second_level = self.index.find_required('samlp:StatusCode', top_level_status_code, direct=True)
             return second_level.attrib['Value']
 
         return top_level_status_code.attrib['Value']
@@ -110,47 +116,47 @@ class ArtifactResponse:
 
     @cached_property
     def response_audience_restriction(self):
-        return self.response.find('.//saml:AudienceRestriction', NAMESPACES)
+        return self.index.find('saml:AudienceRestriction', self.response)
 
     @cached_property
     def response_assertion(self):
-        return self.response.find('./saml:Assertion', NAMESPACES)
+        return self.index.find('saml:Assertion', self.response, direct=True)
 
     @cached_property
     def advice_assertion(self):
-        return self.response_assertion.find('.//saml:Assertion', NAMESPACES)
+        return self.index.find('saml:Assertion', self.response_assertion)
 
     @cached_property
     def assertion_attribute_enc_key(self):
-        return self.response_assertion.find('.//saml2:AttributeStatement//xenc:EncryptedKey', NAMESPACES)
+        return self.index.find('xenc:EncryptedKey', self.response_assertion, inside='saml2:AttributeStatement')
 
     @cached_property
     def assertion_attribute_enc_data(self):
-        return self.response_assertion.find('.//saml2:AttributeStatement//xenc:EncryptedData', NAMESPACES)
+        return self.index.find('xenc:EncryptedData', self.response_assertion, inside='saml2:AttributeStatement')
 
     @cached_property
     def issuer(self):
-        return self.root.find('./saml:Issuer', NAMESPACES)
+        return self.index.find('saml:Issuer', self.root, direct=True)
 
     @cached_property
     def response_issuer(self):
-        return self.response.find('./saml:Issuer', NAMESPACES)
+        return self.index.find('saml:Issuer', self.response, direct=True)
 
     @cached_property
     def assertion_issuer(self):
-        return self.response_assertion.find('./saml:Issuer', NAMESPACES)
+        return self.index.find('saml:Issuer', self.response_assertion, direct=True)
 
     @cached_property
     def advice_assertion_issuer(self):
-        return self.advice_assertion.find('./saml:Issuer', NAMESPACES)
+        return self.index.find('saml:Issuer', self.advice_assertion, direct=True)
 
     @cached_property
     def assertion_subject_confdata(self):
-        return self.response_assertion.find('./saml:Subject//saml:SubjectConfirmationData', NAMESPACES)
+        return self.index.find('saml:SubjectConfirmationData', self.index.find('saml:Subject', self.response_assertion, direct=True))
 
     @cached_property
     def assertion_subject_audrestriction(self):
-        return self.response_assertion.find('./saml:Conditions//saml:Audience', NAMESPACES)
+        return self.index.find('saml:Audience', self.index.find('saml:Conditions', self.response_assertion, direct=True))
 
     def raise_for_status(self) -> str:
         if self.status != 'saml_success':
@@ -160,15 +166,12 @@ class ArtifactResponse:
 
     def validate_in_response_to(self) -> List[ValidationError]:
         expected_entity_id = from_settings(self.provider.settings_dict, 'sp.entityId')
-        response_conditions_aud = self.response_audience_restriction.find('.//saml:Audience', NAMESPACES)
+        response_conditions_aud = self.index.find_required('saml:Audience', self.response_audience_restriction)
 
         errors = []
         if expected_entity_id is None:
             errors.append(ValidationError('Could not read entity id from settings'))
 
-        if response_conditions_aud is None:
-            errors.append(ValidationError('Could not find response conditions audience in artifact response'))
-
         if response_conditions_aud.text != expected_entity_id:
             errors.append(ValidationError('Invalid audience in response Conditions. Expected {}, but was {}'.format(expected_entity_id, response_conditions_aud.text)))
 
@@ -218,22 +221,22 @@ class ArtifactResponse:
         errors = []
         current_instant = datetime.utcnow()
 
-        issue_instant_els = self.root.findall(".//*[@IssueInstant]")
+        issue_instant_els = self.index.with_attribute('IssueInstant', self.root)
         for elem in issue_instant_els:
-            issue_instant = dateutil.parser.parse(elem.attrib['IssueInstant'], ignoretz=True)
+            issue_instant = parse_iso8601(elem.attrib['IssueInstant'])
             expiration_time = issue_instant + timedelta(seconds= RESPONSE_EXPIRES_IN)
             if current_instant > expiration_time:
                 errors.append(ValidationError("Issued ArtifactResponse:{} has expired. Current time: {}, issue instant expiration time: {}".format(elem.tag, current_instant, expiration_time)))
 
-        issue_instant_els = self.root.findall(".//*[@NotBefore]")
+        issue_instant_els = self.index.with_attribute('NotBefore', self.root)
         for elem in issue_instant_els:
-            not_before_time = dateutil.parser.parse(elem.attrib['NotBefore'], ignoretz=True)
+            not_before_time = parse_iso8601(elem.attrib['NotBefore'])
             if current_instant < not_before_time:
                 errors.append(ValidationError("Message should not be processed before {}, but is processed at time: {}".format(not_before_time, current_instant)))
 
-        issue_instant_els = self.root.findall(".//*[@NotOnOrAfter]")
+        issue_instant_els = self.index.with_attribute('NotOnOrAfter', self.root)
         for elem in issue_instant_els:
-            not_on_or_after = dateutil.parser.parse(elem.attrib['NotOnOrAfter'], ignoretz=True)
+            not_on_or_after = parse_iso8601(elem.attrib['NotOnOrAfter'])
             if current_instant >= not_on_or_after:
                 errors.append(ValidationError("Message should not be processed before {}, but is processed at time: {}".format(not_on_or_after, current_instant)))
 
@@ -249,7 +252,7 @@ class ArtifactResponse:
 
         if not self.is_test_instance and self.is_verifeid:
             # Only perform this validation if it is verified, and not a test instance.
-            keyname = root.find('.//ds:KeyName', NAMESPACES).text
+            keyname = self.index.find('ds:KeyName', root).text
             expected_keyname = self.provider.sp_metadata.keyname
             if keyname != expected_keyname:
                 errors.append(ValidationError("KeyName does not comply with specified keyname. Expected {}, was {}".format(expected_keyname, keyname)))
@@ -259,10 +262,10 @@ class ArtifactResponse:
     def validate_attribute_statements(self):
         errors = []
 
-        advice_assertion_attrstatement = self.advice_assertion.find('.//saml2:AttributeStatement', NAMESPACES)
+        advice_assertion_attrstatement = self.index.find('saml2:AttributeStatement', self.advice_assertion)
         errors += self.validate_attribute_statement(advice_assertion_attrstatement)
 
-        response_assertion_attrstatement = self.response_assertion.find('.//saml:AttributeStatement', NAMESPACES)
+        response_assertion_attrstatement = self.index.find('saml:AttributeStatement', self.response_assertion)
         errors += self.validate_attribute_statement(response_assertion_attrstatement)
 
         return errors
@@ -272,8 +275,8 @@ class ArtifactResponse:
 
         if not self.is_test_instance:
             current_instant = datetime.utcnow()
-            issue_instant_text = self.response_assertion.find('.//saml:AuthnStatement', NAMESPACES).attrib['AuthnInstant']
-            issue_instant = dateutil.parser.parse(issue_instant_text, ignoretz=True)
+            issue_instant_text = self.index.find('saml:AuthnStatement', self.response_assertion).attrib['AuthnInstant']
+            issue_instant = parse_iso8601(issue_instant_text)
             expiration_time = issue_instant + timedelta(seconds= RESPONSE_EXPIRES_IN)
             if current_instant > expiration_time:
                 errors.append(ValidationError('Authn instant\'s datetime is expired. Current time {}, expiration time {}'.format(current_instant, expiration_time)))
@@ -305,11 +308,15 @@ class ArtifactResponse:
             raise ValidationError('Audience verification errors.')
 
     def _decrypt_enc_key(self) -> bytes:
+        crypto_client = get_crypto_client()
+        if crypto_client is not None:
+            return crypto_client.call('saml_decrypt_key', etree.tostring(self.assertion_attribute_enc_key))
+
         aes_key = OneLogin_Saml2_Utils.decrypt_element(self.assertion_attribute_enc_key, self.provider.priv_key, debug=True)
         return aes_key
 
     def _decrypt_enc_data(self, aes_key: bytes) -> bytes:
-        encrypted_ciphervalue = self.assertion_attribute_enc_data.find('.//xenc:CipherValue', {'xenc': 'http://www.w3.org/2001/04/xmlenc#'}).text
+        encrypted_ciphervalue = self.index.find_required('xenc:CipherValue', self.assertion_attribute_enc_data).text
         b64decoded_data = base64.b64decode(encrypted_ciphervalue.encode())
         init_vector = b64decoded_data[:16]
         enc_data = b64decoded_data[16:]
@@ -320,5 +327,5 @@ class ArtifactResponse:
     def get_bsn(self) -> Text:
         aes_key = self._decrypt_enc_key()
         bsn_element_raw = self._decrypt_enc_data(aes_key)
-        bsn_element = etree.fromstring(bsn_element_raw.decode())
+        bsn_element = etree.fromstring(bsn_element_raw, parser=get_parser())
         return bsn_element.text
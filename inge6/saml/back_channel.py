@@ -0,0 +1,311 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import logging
+import socket
+import ssl
+import threading
+import time
+
+from enum import Enum
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+import requests
+
+from lxml import etree
+
+from .exceptions import BackChannelUnavailable, UnsafeXMLError
+from .key_registry import FileVersion, file_version
+from .xml_parser import StreamingXMLParser
+
+CHUNK_SIZE = 16 * 1024
+
+
+class CircuitState(str, Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Opens after a number of consecutive failures, rejecting calls without making them. After the reset
+    timeout a single trial call is let through: the circuit closes when it succeeds, and opens again when
+    it fails.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout_s: float,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = float('-inf')
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._state
+
+    def _transition(self, state: CircuitState) -> None:
+        if state != self._state:
+            logging.getLogger().warning("Circuit breaker: %s -> %s", self._state.value, state.value)
+            self._state = state
+
+    def allow(self) -> bool:
+        """
+        :returns: whether a call may be made, its outcome has to be recorded when it is.
+        """
+        with self._lock:
+            if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.reset_timeout_s:
+                self._transition(CircuitState.HALF_OPEN)
+
+            if self._state == CircuitState.HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+
+            return self._state != CircuitState.OPEN
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            self._transition(CircuitState.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == CircuitState.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._transition(CircuitState.OPEN)
+
+
+class MutualTLSAdapter(requests.adapters.HTTPAdapter):
+    """
+    Transport adapter using a single ssl context, with the client certificate loaded once, for all connections.
+
+    The certificate and key are loaded again once either file changes on disk, see `reload_cert_chain`. New
+    connections present the reloaded certificate, kept-alive connections stay on the one they were set up with.
+    """
+
+    def __init__(self, cert_path: str, key_path: str, **kwargs: Any) -> None:
+        self.cert_path = cert_path
+        self.key_path = key_path
+        self.ssl_context = ssl.create_default_context()
+        self._cert_lock = threading.Lock()
+        self._cert_versions = self._file_versions()
+        self.ssl_context.load_cert_chain(cert_path, key_path)
+        super().__init__(**kwargs)
+
+    def _file_versions(self) -> Tuple[FileVersion, FileVersion]:
+        return (file_version(self.cert_path), file_version(self.key_path))
+
+    def reload_cert_chain(self) -> bool:
+        """
+        :returns: whether the certificate and key changed on disk and were loaded again.
+        """
+        versions = self._file_versions()
+        if versions == self._cert_versions:
+            return False
+
+        with self._cert_lock:
+            if versions == self._cert_versions:
+                return False
+            self.ssl_context.load_cert_chain(self.cert_path, self.key_path)
+            self._cert_versions = versions
+        return True
+
+    def send(self, request: Any, *args: Any, **kwargs: Any) -> Any:  # pylint: disable=arguments-differ
+        self.reload_cert_chain()
+        return super().send(request, *args, **kwargs)
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        kwargs['ssl_context'] = self.ssl_context
+        super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args: Any, **kwargs: Any) -> Any:
+        kwargs['ssl_context'] = self.ssl_context
+        return super().proxy_manager_for(*args, **kwargs)
+
+
+class BackChannelResponse(NamedTuple):
+    status_code: int
+    content: bytes
+    # The parsed body, when the call asked for it and did not receive a server error.
+    root: Optional[Any] = None
+
+    @property
+    def text(self) -> str:
+        return self.content.decode()
+
+
+class _Watchdog:
+    """
+    Shuts down the connection of a streamed response after timeout_s, making a pending read fail.
+    """
+
+    def __init__(self, response: requests.Response, timeout_s: float) -> None:
+        self.fired = False
+        self._socket: Optional[socket.socket] = getattr(getattr(response.raw, 'connection', None), 'sock', None)
+        self._timer = threading.Timer(max(timeout_s, 0), self._fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _fire(self) -> None:
+        self.fired = True
+        if self._socket is not None:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def cancel(self) -> None:
+        self._timer.cancel()
+
+
+class SAMLBackChannel:
+    """
+    Long-lived client for the SAML back-channel, i.e. artifact resolution. Connections are kept alive and
+    pooled, such that a request does not pay for a new TCP connection and mutual TLS handshake.
+
+    Safe to use from multiple threads, up to pool_maxsize connections per host are kept alive.
+
+    A slow or failing back-channel is kept from stalling the service:
+    - bulkhead: at most max_concurrent calls are made at the same time, a call waits at most
+      queue_timeout_s for its turn.
+    - deadline: a call is abandoned once it has taken deadline_s, including reading the response. Once the
+      headers are received, the connection is shut down when the deadline passes, however slowly the body
+      is sent. Until then a single read waits at most the read timeout or deadline_s.
+    - circuit breaker: see `CircuitBreaker`, a call failing to connect, exceeding its deadline, receiving
+      a server error or raising an unexpected error counts as a failure.
+    Calls rejected or failing raise BackChannelUnavailable.
+
+    A response exceeding max_response_bytes is abandoned as soon as it does, a response parsed while it is
+    received, see `post`, also when it exceeds the other limits of `StreamingXMLParser`. Both raise
+    UnsafeXMLError and count as a response of the back-channel, not as a failure.
+    """
+
+    def __init__(self, cert_path: str, key_path: str, pool_maxsize: int, connect_timeout_s: float,
+                 read_timeout_s: float, max_concurrent: int, queue_timeout_s: float, deadline_s: float,
+                 circuit_breaker: CircuitBreaker, max_response_bytes: int) -> None:
+        self.connect_timeout_s = connect_timeout_s
+        self.read_timeout_s = read_timeout_s
+        self.session = requests.Session()
+        adapter = MutualTLSAdapter(cert_path, key_path, pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize))
+
+        self.max_concurrent = max_concurrent
+        self.queue_timeout_s = queue_timeout_s
+        self.deadline_s = deadline_s
+        self.circuit_breaker = circuit_breaker
+        self.max_response_bytes = max_response_bytes
+        self._bulkhead = threading.BoundedSemaphore(max_concurrent)
+
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._counts = {'succeeded': 0, 'failed': 0, 'rejected_bulkhead': 0, 'rejected_open': 0, 'rejected_response': 0}
+
+    def _count(self, outcome: str) -> None:
+        with self._stats_lock:
+            self._counts[outcome] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self._counts, in_flight=self._in_flight, state=self.circuit_breaker.state.value)
+
+    def post(self, url: str, headers: Dict[str, str], data: Any, parse: bool = False) -> BackChannelResponse:
+        """
+        :param parse: parse the XML body while it is received, the root element is set on the response
+        :raises BackChannelUnavailable: when the call is rejected, fails or exceeds its deadline.
+        :raises UnsafeXMLError: when the response exceeds a limit.
+        :raises etree.XMLSyntaxError: when the body is parsed and not well-formed.
+        """
+        if not self._bulkhead.acquire(timeout=self.queue_timeout_s):
+            self._count('rejected_bulkhead')
+            raise BackChannelUnavailable("Too many concurrent calls to the back-channel")
+
+        try:
+            if not self.circuit_breaker.allow():
+                self._count('rejected_open')
+                raise BackChannelUnavailable("Circuit to the back-channel is open")
+
+            with self._stats_lock:
+                self._in_flight += 1
+            try:
+                response = self._post_within_deadline(url, headers, data, parse)
+            except (requests.RequestException, BackChannelUnavailable) as error:
+                self.circuit_breaker.record_failure()
+                self._count('failed')
+                raise BackChannelUnavailable(f"Back-channel call failed: {error}") from error
+            except (UnsafeXMLError, etree.XMLSyntaxError):
+                # The back-channel did respond, the response is rejected.
+                self.circuit_breaker.record_success()
+                self._count('rejected_response')
+                raise
+            except Exception:
+                # Recorded as well, an unexpected error must not leave the trial call of a half-open circuit in flight.
+                self.circuit_breaker.record_failure()
+                self._count('failed')
+                raise
+            finally:
+                with self._stats_lock:
+                    self._in_flight -= 1
+        finally:
+            self._bulkhead.release()
+
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+            self._count('failed')
+            raise BackChannelUnavailable(f"Back-channel responded with status {response.status_code}")
+
+        self.circuit_breaker.record_success()
+        self._count('succeeded')
+        return response
+
+    def _post_within_deadline(self, url: str, headers: Dict[str, str], data: Any, parse: bool) -> BackChannelResponse:
+        deadline = time.monotonic() + self.deadline_s
+        timeout = (self.connect_timeout_s, min(self.read_timeout_s, self.deadline_s))
+        with self.session.post(url, headers=headers, data=data, timeout=timeout, stream=True) as response:
+            # A read returns as soon as some bytes arrive, bounding the time of a single read does not bound the
+            # time taken by a slowly sent body.
+            watchdog = _Watchdog(response, deadline - time.monotonic())
+            try:
+                back_channel_response = self._read_response(response, parse)
+            except requests.RequestException as error:
+                if watchdog.fired:
+                    raise BackChannelUnavailable(f"Deadline of {self.deadline_s}s exceeded") from error
+                raise
+            finally:
+                watchdog.cancel()
+
+            if watchdog.fired or time.monotonic() > deadline:
+                raise BackChannelUnavailable(f"Deadline of {self.deadline_s}s exceeded")
+            return back_channel_response
+
+    def _read_response(self, response: requests.Response, parse: bool) -> BackChannelResponse:
+        # The body of a server error need not be XML.
+        parser = StreamingXMLParser(self.max_response_bytes) if parse and response.status_code < 500 else None
+        chunks = []
+        received = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            received += len(chunk)
+            if received > self.max_response_bytes:
+                raise UnsafeXMLError(f"Back-channel response exceeds {self.max_response_bytes} bytes")
+            if parser is not None:
+                parser.feed(chunk)
+            chunks.append(chunk)
+        root = parser.close() if parser is not None else None
+        return BackChannelResponse(response.status_code, b''.join(chunks), root)
+
+    def close(self) -> None:
+        self.session.close()
@@ -12,3 +12,12 @@ class UserNotAuthenticated(OAuthError):
 
 class ValidationError(RuntimeError):
     pass
+
+class UnsafeXMLError(ValidationError):
+    pass
+
+class BackChannelUnavailable(RuntimeError):
+    pass
+
+class ResponsePoolUnavailable(RuntimeError):
+    pass
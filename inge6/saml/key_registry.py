@@ -0,0 +1,74 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+# pylint: disable=c-extension-no-member
+import os
+import threading
+
+from collections import OrderedDict
+from typing import Dict, Tuple, Union
+
+import xmlsec
+
+MAX_MEMORY_KEYS = 16
+
+FileVersion = Tuple[int, int, int]
+
+def file_version(path: str) -> FileVersion:
+    """
+    The version of a file on disk, changing when the file is written or replaced, e.g. when a key is rotated.
+    """
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+class KeyRegistry:
+    """
+    Loads xmlsec keys once, rather than parsing the PEM data for every signature that is created or verified.
+    A signature context keeps a copy of the key it is given, so a loaded key can be shared between threads.
+
+    A key loaded from a file is reloaded once the file changes on disk, e.g. when the key is rotated. Keys
+    loaded from memory are kept per key data, the max_memory_keys most recently used ones.
+    """
+
+    def __init__(self, max_memory_keys: int = MAX_MEMORY_KEYS) -> None:
+        self.max_memory_keys = max_memory_keys
+        self._lock = threading.Lock()
+        self._file_keys: Dict[Tuple[str, int], Tuple[FileVersion, xmlsec.Key]] = {}
+        self._memory_keys: 'OrderedDict[Tuple[Union[str, bytes], int], xmlsec.Key]' = OrderedDict()
+
+    def from_file(self, path: str, key_format: int) -> xmlsec.Key:
+        version = file_version(path)
+
+        loaded = self._file_keys.get((path, key_format))
+        if loaded is not None and loaded[0] == version:
+            return loaded[1]
+
+        key = xmlsec.Key.from_file(path, key_format)
+        with self._lock:
+            self._file_keys[(path, key_format)] = (version, key)
+        return key
+
+    def from_memory(self, data: Union[str, bytes], key_format: int) -> xmlsec.Key:
+        with self._lock:
+            key = self._memory_keys.get((data, key_format))
+            if key is not None:
+                self._memory_keys.move_to_end((data, key_format))
+                return key
+
+        key = xmlsec.Key.from_memory(data.encode() if isinstance(data, str) else data, key_format)
+        with self._lock:
+            self._memory_keys[(data, key_format)] = key
+            while len(self._memory_keys) > self.max_memory_keys:
+                self._memory_keys.popitem(last=False)
+        return key
+
+    def clear(self) -> None:
+        with self._lock:
+            self._file_keys.clear()
+            self._memory_keys.clear()
+
+
+key_registry = KeyRegistry()
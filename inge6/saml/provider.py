@@ -6,6 +6,7 @@
 #
 import json
 
+from .back_channel import CircuitBreaker, SAMLBackChannel
 from .metadata import IdPMetadata, SPMetadata
 from ..config import settings
 
@@ -23,6 +24,22 @@ class Provider:
         self._idp_metadata = IdPMetadata()
         self._sp_metadata = SPMetadata()
 
+        self.back_channel = SAMLBackChannel(
+            cert_path=settings.saml.cert_path,
+            key_path=settings.saml.key_path,
+            pool_maxsize=int(settings.saml.back_channel_pool_maxsize),
+            connect_timeout_s=float(settings.saml.back_channel_connect_timeout_s),
+            read_timeout_s=float(settings.saml.back_channel_read_timeout_s),
+            max_concurrent=int(settings.saml.back_channel_max_concurrent),
+            queue_timeout_s=int(settings.saml.back_channel_queue_timeout_ms) / 1000,
+            deadline_s=float(settings.saml.back_channel_deadline_s),
+            circuit_breaker=CircuitBreaker(
+                failure_threshold=int(settings.saml.back_channel_failure_threshold),
+                reset_timeout_s=float(settings.saml.back_channel_reset_timeout_s)
+            ),
+            max_response_bytes=int(settings.saml.xml_max_bytes)
+        )
+
     @property
     def sp_metadata(self) -> SPMetadata:
         return self._sp_metadata
@@ -0,0 +1,113 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import logging
+import threading
+import time
+
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+
+class PresignedRequestPool:
+    """
+    Keeps a bounded pool of ready-signed requests per destination, built by a background thread, such that a
+    request can be handed out without signing it on the critical path. Each request is handed out at most once.
+
+    A destination is added to the pool the first time a request for it is taken. Requests older than max_age_s
+    are discarded, as their IssueInstant would be too far in the past.
+    """
+
+    def __init__(self, build: Callable[[str], str], size: int, max_age_s: float, refill_interval_s: float,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param build: builds and signs a request for a destination
+        :param size: the number of requests kept per destination
+        :param max_age_s: the age after which a request is discarded
+        :param refill_interval_s: the interval at which the pool is refilled, when not woken up by a miss
+        """
+        self.build = build
+        self.size = size
+        self.max_age_s = max_age_s
+        self.refill_interval_s = refill_interval_s
+        self._clock = clock
+
+        self._pools: Dict[str, Deque[Tuple[float, str]]] = {}
+        self._hits = 0
+        self._misses = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def take(self, destination: str) -> Optional[str]:
+        """
+        :returns: a signed request for the destination, None when the pool has none, the request should then be
+            built inline.
+        """
+        pool = self._pools.get(destination)
+        if pool is None:
+            pool = self._pools.setdefault(destination, deque())
+
+        oldest_allowed = self._clock() - self.max_age_s
+        while True:
+            try:
+                created_at, request = pool.popleft()
+            except IndexError:
+                self._misses += 1
+                self._wakeup.set()
+                return None
+            if created_at >= oldest_allowed:
+                self._hits += 1
+                if len(pool) < self.size // 2:
+                    self._wakeup.set()
+                return request
+
+    def fill(self) -> None:
+        """
+        Discard stale requests and top up the pool of every destination.
+        """
+        for destination, pool in list(self._pools.items()):
+            # Requests that would expire before the next refill are replaced now.
+            oldest_allowed = self._clock() - self.max_age_s + self.refill_interval_s
+            while pool:
+                try:
+                    if pool[0][0] >= oldest_allowed:
+                        break
+                    pool.popleft()
+                except IndexError:
+                    # Taken meanwhile
+                    break
+
+            while len(pool) < self.size and not self._stop.is_set():
+                pool.append((self._clock(), self.build(destination)))
+
+    def stats(self) -> dict:
+        return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'pooled': {destination: len(pool) for destination, pool in self._pools.items()}
+        }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.fill()
+            except Exception as error: # pylint: disable=broad-except
+                logging.getLogger().warning("Filling the pool of signed requests failed: %s", str(error))
+            self._wakeup.wait(self.refill_interval_s)
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
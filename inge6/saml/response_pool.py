@@ -0,0 +1,140 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import multiprocessing
+import threading
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from lxml import etree
+
+from .artifact_response import ArtifactResponse
+from .exceptions import ResponsePoolUnavailable, UserNotAuthenticated, ValidationError
+from .provider import Provider as SAMLProvider
+
+# The provider of a worker process, see `_init_worker`.
+_PROVIDER: Optional[SAMLProvider] = None
+
+# Errors raised in a worker process, re-raised by the pool.
+_NOT_AUTHENTICATED = 'not_authenticated'
+_INVALID = 'invalid_response'
+
+
+def _init_worker(provider_factory: Callable[[], SAMLProvider]) -> None:
+    global _PROVIDER # pylint: disable=global-statement
+    _PROVIDER = provider_factory()
+
+
+def _ping() -> None:
+    pass
+
+
+def _get_bsn(xml_response: str, insecure: bool, is_test_instance: bool) -> dict:
+    """
+    Verify, validate and decrypt an ArtifactResponse in a worker process.
+
+    :returns: {'bsn': ...} or the error the response was rejected with, as exceptions raised by the parse do not
+        all survive being sent back to the parent process.
+    """
+    if _PROVIDER is None:
+        raise RuntimeError("Worker process is not initialised, see _init_worker")
+
+    try:
+        artifact_response = ArtifactResponse.from_string(xml_response, _PROVIDER, insecure=insecure, is_test_instance=is_test_instance)
+        artifact_response.raise_for_status()
+        return {'bsn': artifact_response.get_bsn()}
+    except UserNotAuthenticated as user_not_authenticated:
+        return {'error': _NOT_AUTHENTICATED, 'oauth_error': user_not_authenticated.oauth_error, 'description': str(user_not_authenticated)}
+    except (ValidationError, etree.XMLSyntaxError) as validation_error:
+        return {'error': _INVALID, 'description': str(validation_error)}
+
+
+class ArtifactResponsePool:
+    """
+    Verifies the signatures of an ArtifactResponse, validates it and decrypts the bsn in a pool of worker
+    processes, such that a single worker of the server can use all cores for this CPU bound part of the token
+    endpoint.
+
+    Every worker process creates its own SAML provider with provider_factory, which should be picklable, e.g.
+    the provider class. Workers are spawned rather than forked, as the server runs background threads.
+
+    At most max_pending responses are queued or processed. A response whose result is not returned in time
+    is cancelled when it is still queued, a worker process processing it cannot be interrupted and the
+    response counts as pending until it is done.
+    """
+
+    def __init__(self, provider_factory: Callable[[], SAMLProvider], max_workers: int, max_pending: int,
+                 timeout_s: float) -> None:
+        """
+        :param timeout_s: the time to await the result of a worker
+        """
+        self.provider_factory = provider_factory
+        self.max_workers = max_workers
+        self.timeout_s = timeout_s
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.provider_factory,)
+        )
+
+    def start(self) -> None:
+        """
+        Start the worker processes, rather than on the first response.
+        """
+        for future in [self._pool.submit(_ping) for _ in range(self.max_workers)]:
+            future.result()
+
+    def _replace_broken(self, pool: ProcessPoolExecutor) -> None:
+        # A worker died, replace the pool for the next response.
+        with self._lock:
+            if self._pool is pool:
+                self._pool = self._new_pool()
+
+    def get_bsn(self, xml_response: str, insecure: bool = False, is_test_instance: bool = False) -> str:
+        """
+        :raises UserNotAuthenticated: when the authentication failed at the IdP.
+        :raises ValidationError: when the response is not valid.
+        :raises ResponsePoolUnavailable: when too many responses are pending, the result is not returned in time
+            or a worker process died.
+        """
+        if not self._pending.acquire(blocking=False):
+            raise ResponsePoolUnavailable("Too many ArtifactResponses pending")
+
+        pool = self._pool
+        try:
+            future = pool.submit(_get_bsn, xml_response, insecure, is_test_instance)
+        except BrokenProcessPool as broken_process_pool:
+            self._pending.release()
+            self._replace_broken(pool)
+            raise ResponsePoolUnavailable("A worker process died") from broken_process_pool
+        future.add_done_callback(lambda _: self._pending.release())
+
+        try:
+            result = future.result(timeout=self.timeout_s)
+        except FutureTimeoutError as timeout_error:
+            future.cancel()
+            raise ResponsePoolUnavailable(f"No result within {self.timeout_s}s") from timeout_error
+        except BrokenProcessPool as broken_process_pool:
+            self._replace_broken(pool)
+            raise ResponsePoolUnavailable("A worker process died") from broken_process_pool
+
+        if 'bsn' in result:
+            return result['bsn']
+
+        if result['error'] == _NOT_AUTHENTICATED:
+            raise UserNotAuthenticated(result['description'], oauth_error=result['oauth_error'])
+        raise ValidationError(result['description'])
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
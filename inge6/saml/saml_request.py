@@ -6,14 +6,18 @@
 #
 # pylint: disable=c-extension-no-member
 import base64
+import copy
+import functools
 import secrets
-from typing import Optional, Any
+from typing import Optional, Any, Tuple
 from datetime import datetime
 
 import xmlsec
 from lxml import etree
 
+from .key_registry import FileVersion, file_version, key_registry
 from ..config import settings
+from ..crypto_service import get_crypto_client
 
 def add_root_issue_instant(root) -> None:
     root.attrib['IssueInstant'] = datetime.utcnow().isoformat().split('.')[0] + 'Z'
@@ -27,11 +31,15 @@ def add_reference(root, id_hash: str) -> None:
         raise ValueError("Reference node not found, cannot set URI in reference node of signature element.")
     reference_node.attrib['URI'] = f"#{id_hash}"
 
+# Keyed on the version of the certificate file as well, a rotated certificate is loaded again.
+@functools.lru_cache(maxsize=8)
+def _load_cert_data(cert_path: str, _cert_version: FileVersion) -> bytes:
+    with open(cert_path, 'r') as cert_file:
+        return base64.b64encode(cert_file.read().encode())
+
 def add_certs(root, cert_path: str) -> None:
     cert_node = root.find('.//ds:X509Certificate', {'ds': 'http://www.w3.org/2000/09/xmldsig#'})
-
-    with open(cert_path, 'r') as cert_file:
-        cert_node.text = base64.b64encode(cert_file.read().encode())
+    cert_node.text = _load_cert_data(cert_path, file_version(cert_path))
 
 def add_issuer(root, issuer_id):
     root.find('./saml:Issuer', {'saml': 'urn:oasis:names:tc:SAML:2.0:assertion'}).text = issuer_id
@@ -40,10 +48,22 @@ def add_destination(root, destination):
     root.attrib['Destination'] = destination
 
 def sign(root, key_path):
+    crypto_client = get_crypto_client()
+    if crypto_client is None:
+        sign_with_key(root, key_path)
+        return
+
+    # The crypto service owns the key, and returns the signed signature node.
+    signature_node = xmlsec.tree.find_node(root, xmlsec.constants.NodeSignature)
+    signed_node = etree.fromstring(crypto_client.call('saml_sign', etree.tostring(root)))
+    # The text following the signature node is part of the digest.
+    signed_node.tail = signature_node.tail
+    signature_node.getparent().replace(signature_node, signed_node)
+
+def sign_with_key(root, key_path):
     signature_node = xmlsec.tree.find_node(root, xmlsec.constants.NodeSignature)
     ctx = xmlsec.SignatureContext()
-    key = xmlsec.Key.from_file(key_path, xmlsec.constants.KeyDataFormatPem)
-    ctx.key = key
+    ctx.key = key_registry.from_file(key_path, xmlsec.constants.KeyDataFormatPem)
     ctx.register_id(root)
     ctx.sign(signature_node)
 
@@ -51,6 +71,27 @@ def add_artifact(root, artifact_code) -> None:
     artifact = root.find('.//samlp:Artifact', {'samlp': "urn:oasis:names:tc:SAML:2.0:protocol"})
     artifact.text = artifact_code
 
+@functools.lru_cache(maxsize=32)
+def _compiled_template(template_path: str, cert_path: str, issuer_id: str, request_path: Optional[str],
+                       _versions: Tuple[FileVersion, FileVersion]):
+    """
+    Parse a request template once, filling in the fields that are the same for every request: the certificate
+    and the issuer. The template returned is shared, a request should be built on a copy, see `new_request_root`.
+
+    :param request_path: the path to the request element within the template, the root when None.
+    :param _versions: the versions of the template and certificate files, the template is compiled again when
+        either one changes on disk.
+    """
+    root = etree.parse(template_path).getroot()
+    request_elem = root if request_path is None else root.find(request_path, {'samlp': "urn:oasis:names:tc:SAML:2.0:protocol"})
+    add_issuer(request_elem, issuer_id)
+    add_certs(request_elem, cert_path)
+    return root
+
+def new_request_root(template_path: str, cert_path: str, issuer_id: str, request_path: Optional[str] = None):
+    versions = (file_version(template_path), file_version(cert_path))
+    return copy.deepcopy(_compiled_template(template_path, cert_path, issuer_id, request_path, versions))
+
 class SAMLRequest:
     KEY_PATH = settings.saml.key_path
     CERT_PATH = settings.saml.cert_path
@@ -73,28 +114,25 @@ class AuthNRequest(SAMLRequest):
     TEMPLATE_PATH = settings.saml.authn_request_template
 
     def __init__(self, sso_url, issuer_id) -> None:
-        super().__init__(etree.parse(self.TEMPLATE_PATH).getroot())
+        super().__init__(new_request_root(self.TEMPLATE_PATH, self.CERT_PATH, issuer_id))
         add_root_id(self.root, self._id_hash)
         add_destination(self.root, sso_url)
-        add_issuer(self.root, issuer_id)
         add_root_issue_instant(self.root)
         add_reference(self.root, self._id_hash)
-        add_certs(self.root, self.CERT_PATH)
         sign(self.root, self.KEY_PATH)
 
 class ArtifactResolveRequest(SAMLRequest):
     TEMPLATE_PATH = settings.saml.artifactresolve_request_template
+    REQUEST_PATH = './/samlp:ArtifactResolve'
 
     def __init__(self, artifact_code, sso_url, issuer_id) -> None:
-        super().__init__(etree.parse(self.TEMPLATE_PATH).getroot())
-        self.saml_resolve_req = self.root.find('.//samlp:ArtifactResolve', {'samlp': "urn:oasis:names:tc:SAML:2.0:protocol"})
+        super().__init__(new_request_root(self.TEMPLATE_PATH, self.CERT_PATH, issuer_id, self.REQUEST_PATH))
+        self.saml_resolve_req = self.root.find(self.REQUEST_PATH, {'samlp': "urn:oasis:names:tc:SAML:2.0:protocol"})
 
         add_root_id(self.saml_resolve_req, self._id_hash)
         add_root_issue_instant(self.saml_resolve_req)
         add_destination(self.saml_resolve_req, sso_url)
-        add_issuer(self.saml_resolve_req, issuer_id)
         add_reference(self.saml_resolve_req, self._id_hash)
-        add_certs(self.saml_resolve_req, self.CERT_PATH)
         add_artifact(self.saml_resolve_req, artifact_code)
         sign(self.saml_resolve_req, self.KEY_PATH)
 
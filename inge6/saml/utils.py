@@ -5,10 +5,24 @@
 # SPDX-License-Identifier: EUPL-1.2
 #
 # pylint: disable=c-extension-no-member
-from typing import Dict, Tuple, Any, Optional, Union
+import functools
+import re
+
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple, Any, Optional, Union
 import xmlsec
 
+from lxml import etree
+
 from .constants import NAMESPACES
+from .exceptions import ValidationError
+from .key_registry import key_registry
+
+ISO8601_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,9}))?(?:Z|[+-]\d{2}:?\d{2})?')
+
+# Attributes of which the elements carrying them are indexed, see `ElementIndex.with_attribute`.
+INDEXED_ATTRIBUTES = ('IssueInstant', 'NotBefore', 'NotOnOrAfter')
 
 def from_settings(settings_dict, selector: str, default: Optional[str] = None) -> Optional[str]:
     key_hierarchy = selector.split('.')
@@ -40,36 +54,147 @@ def has_valid_signature(root, signature_node, cert_data: str = None, cert_path:
     ctx = xmlsec.SignatureContext()
 
     if cert_data is None:
-        key = xmlsec.Key.from_file(cert_path, xmlsec.constants.KeyDataFormatCertPem)
+        key = key_registry.from_file(cert_path, xmlsec.constants.KeyDataFormatCertPem)
     else:
-        key = xmlsec.Key.from_memory(cert_data, xmlsec.constants.KeyDataFormatCertPem)
+        key = key_registry.from_memory(cert_data, xmlsec.constants.KeyDataFormatCertPem)
     # Set the key on the context.
     ctx.key = key
     ctx.register_id(root)
     ctx.verify(signature_node)
 
-def get_referred_node(root, signature_node):
-    referer_node = signature_node.find('.//dsig:Reference', NAMESPACES)
+def get_referred_node(root, signature_node, index: Optional['ElementIndex'] = None):
+    if index is None:
+        index = ElementIndex(root)
+
+    referer_node = index.find_required('dsig:Reference', signature_node)
     referrer_id = referer_node.attrib['URI'][1:]
     if 'ID' in root.attrib and root.attrib['ID'] == referrer_id:
         return root
-    return root.find(f'.//*[@ID="{referrer_id}"]', NAMESPACES)
+    return index.find_by_id(referrer_id, root)
 
-def has_valid_signatures(root, cert_data: str = None, cert_path: str = 'saml/certs/sp.crt') -> Tuple[Any, bool]:
-    signature_nodes = root.findall('.//dsig:Signature', NAMESPACES)
+def has_valid_signatures(root, cert_data: str = None, cert_path: str = 'saml/certs/sp.crt', index: Optional['ElementIndex'] = None) -> Tuple[Any, bool]:
+    """
+    :param index: an index of a tree containing root, built when None.
+    """
+    if index is None:
+        index = ElementIndex(root)
+    signature_nodes = index.findall('dsig:Signature', root)
 
     try:
         for node in signature_nodes:
 
-            if node.find('.//dsig:DigestValue', NAMESPACES).text is None:
+            if index.find_required('dsig:DigestValue', node).text is None:
                 continue
 
-            referred_node = get_referred_node(root, node)
+            referred_node = get_referred_node(root, node, index)
             has_valid_signature(referred_node, node, cert_data=cert_data, cert_path=cert_path)
     except xmlsec.VerificationError:
         return None, False
 
-    return get_referred_node(root, signature_nodes[0]), True
+    return get_referred_node(root, signature_nodes[0], index), True
+
+def parse_iso8601(value: str) -> datetime:
+    """
+    Parse an xs:dateTime as used in SAML messages, e.g. 2021-06-05T16:31:33Z, ignoring the timezone like
+    `dateutil.parser.parse(value, ignoretz=True)` does. Fractions beyond microseconds are truncated.
+
+    :raises ValueError: when the value is not such a timestamp.
+    """
+    match = ISO8601_RE.fullmatch(value)
+    if match is None:
+        raise ValueError("Invalid ISO-8601 timestamp: {}".format(value))
+
+    year, month, day, hour, minute, second, fraction = match.groups()
+    microsecond = int(fraction[:6].ljust(6, '0')) if fraction else 0
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond)
+
+@functools.lru_cache(maxsize=None)
+def _clark_tag(tag: str) -> str:
+    prefix, name = tag.split(':')
+    return '{%s}%s' % (NAMESPACES[prefix], name)
+
+class ElementIndex:
+    """
+    Index of the elements of a tree by tag, by ID and by the INDEXED_ATTRIBUTES they carry, built in a single
+    pass over the tree. Lookups are restricted to the descendants of an element, like `find` and `findall` with
+    a './/' path, without walking its subtree, and return elements in document order.
+    """
+
+    def __init__(self, root) -> None:
+        self._by_tag: Dict[str, List[Any]] = defaultdict(list)
+        self._by_id: Dict[str, List[Any]] = defaultdict(list)
+        self._by_attribute: Dict[str, List[Any]] = {name: [] for name in INDEXED_ATTRIBUTES}
+
+        for elem in root.iter(tag=etree.Element):
+            self._by_tag[elem.tag].append(elem)
+            attrib = elem.attrib
+            if 'ID' in attrib:
+                self._by_id[attrib['ID']].append(elem)
+            for name, elems in self._by_attribute.items():
+                if name in attrib:
+                    elems.append(elem)
+
+    @staticmethod
+    def _is_within(elem, within, direct: bool = False, inside: Optional[str] = None) -> bool:
+        parent = elem.getparent()
+        if direct:
+            return parent is within
+
+        passed_inside = inside is None
+        while parent is not None:
+            if parent is within:
+                return passed_inside
+            if not passed_inside and parent.tag == inside:
+                passed_inside = True
+            parent = parent.getparent()
+        return False
+
+    def findall(self, tag: str, within, direct: bool = False, inside: Optional[str] = None) -> List[Any]:
+        """
+        :param tag: the prefixed tag, e.g. saml:Assertion, see `NAMESPACES`
+        :param within: the element to search the descendants of, nothing is found when None
+        :param direct: only search the children of within, './tag' rather than './/tag'
+        :param inside: the prefixed tag of an element the element should be inside of, below within, e.g.
+            './/saml:AttributeStatement//xenc:EncryptedKey' is findall('xenc:EncryptedKey', within, inside='saml:AttributeStatement')
+        """
+        if within is None:
+            return []
+
+        inside_tag = _clark_tag(inside) if inside is not None else None
+        return [elem for elem in self._by_tag.get(_clark_tag(tag), ()) if self._is_within(elem, within, direct, inside_tag)]
+
+    def find(self, tag: str, within, direct: bool = False, inside: Optional[str] = None) -> Optional[Any]:
+        if within is None:
+            return None
+
+        inside_tag = _clark_tag(inside) if inside is not None else None
+        for elem in self._by_tag.get(_clark_tag(tag), ()):
+            if self._is_within(elem, within, direct, inside_tag):
+                return elem
+        return None
+
+    def find_required(self, tag: str, within, direct: bool = False, inside: Optional[str] = None) -> Any:
+        """
+        See `find`, for an element the tree should contain.
+
+        :raises ValidationError: when the element is not found.
+        """
+        elem = self.find(tag, within, direct, inside)
+        if elem is None:
+            raise ValidationError(f"Could not find {tag} in the SAML message")
+        return elem
+
+    def find_by_id(self, elem_id: str, within) -> Optional[Any]:
+        for elem in self._by_id.get(elem_id, ()):
+            if self._is_within(elem, within):
+                return elem
+        return None
+
+    def with_attribute(self, name: str, within) -> List[Any]:
+        """
+        :param name: one of INDEXED_ATTRIBUTES
+        """
+        return [elem for elem in self._by_attribute[name] if self._is_within(elem, within)]
 
 
 def remove_padding(enc_data: bytes) -> bytes:
@@ -0,0 +1,100 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+# pylint: disable=c-extension-no-member
+import functools
+import threading
+
+from typing import Union
+
+from lxml import etree
+
+from .exceptions import UnsafeXMLError
+from ..config import settings
+
+MAX_BYTES = int(settings.saml.xml_max_bytes)
+MAX_DEPTH = int(settings.saml.xml_max_depth)
+
+# Never fetch anything from the network, expand entities or load a DTD, and keep libxml2's limits on huge
+# documents in place.
+PARSER_OPTIONS = {
+    'resolve_entities': False,
+    'no_network': True,
+    'load_dtd': False,
+    'huge_tree': False,
+}
+
+_LOCAL = threading.local()
+
+
+def get_parser() -> etree.XMLParser:
+    """
+    :returns: a parser configured with PARSER_OPTIONS, shared by all documents parsed by the calling thread, as
+        a parser cannot be used by multiple threads at the same time.
+    """
+    parser = getattr(_LOCAL, 'parser', None)
+    if parser is None:
+        parser = _LOCAL.parser = etree.XMLParser(**PARSER_OPTIONS)
+    return parser
+
+
+@functools.lru_cache(maxsize=8)
+def _too_deep(max_depth: int) -> etree.XPath:
+    # An element at depth max_depth + 1 exists; evaluated by libxml2 in a single pass over the tree
+    return etree.XPath('boolean({})'.format('/*' * (max_depth + 1)))
+
+
+def _check_document(root, max_depth: int):
+    if root.getroottree().docinfo.doctype:
+        raise UnsafeXMLError("XML document declares a DTD")
+    if _too_deep(max_depth)(root):
+        raise UnsafeXMLError("XML document nests elements deeper than {}".format(max_depth))
+    return root
+
+
+class StreamingXMLParser:
+    """
+    Parses a document fed in chunks, as they are received, with the PARSER_OPTIONS. The document is rejected as
+    soon as it exceeds max_bytes, rather than once it was read entirely. Once complete, it is rejected when it
+    declares a DTD or nests elements deeper than max_depth; max_bytes bounds the work done before that check. For
+    a document fed as str, max_bytes limits the number of characters.
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES, max_depth: int = MAX_DEPTH) -> None:
+        self.max_bytes = max_bytes
+        self.max_depth = max_depth
+        # Not the shared parser: a document abandoned halfway would leave it in feed mode
+        self._parser = etree.XMLParser(**PARSER_OPTIONS)
+        self._bytes = 0
+
+    def feed(self, chunk: Union[str, bytes]) -> None:
+        """
+        :raises UnsafeXMLError: when the document exceeds max_bytes.
+        :raises etree.XMLSyntaxError: when the document is not well-formed.
+        """
+        self._bytes += len(chunk)
+        if self._bytes > self.max_bytes:
+            raise UnsafeXMLError("XML document exceeds {} bytes".format(self.max_bytes))
+        self._parser.feed(chunk)
+
+    def close(self):
+        """
+        :returns: the root element of the document.
+        :raises UnsafeXMLError: when the document declares a DTD or nests elements too deep.
+        """
+        return _check_document(self._parser.close(), self.max_depth)
+
+
+def parse_xml(data: Union[str, bytes], max_bytes: int = MAX_BYTES, max_depth: int = MAX_DEPTH):
+    """
+    Parse a document held in memory, with the calling thread's shared parser and the limits of
+    `StreamingXMLParser`.
+
+    :returns: the root element of the document.
+    """
+    if len(data) > max_bytes:
+        raise UnsafeXMLError("XML document exceeds {} bytes".format(max_bytes))
+    return _check_document(etree.fromstring(data, parser=get_parser()), max_depth)
@@ -4,7 +4,9 @@
 #
 # SPDX-License-Identifier: EUPL-1.2
 #
-from typing import Text
+import math
+
+from typing import Optional, Text
 from jinja2 import Template
 from .config import settings
 
@@ -33,3 +35,15 @@ def create_page_too_busy(page_template: str, base_url: str) -> Text:
     }
 
     return _fill_template(page_template, context)
+
+
+def create_page_waiting_room(page_template: str, poll_uri: str, poll_interval_s: int, users_ahead: int,
+                             estimated_wait_s: Optional[float]) -> Text:
+    context = {
+        'poll_uri': poll_uri,
+        'poll_interval_s': poll_interval_s,
+        'users_ahead': users_ahead,
+        'estimated_wait_min': None if estimated_wait_s is None else math.ceil(estimated_wait_s / 60)
+    }
+
+    return _fill_template(page_template, context)
@@ -1,8 +1,11 @@
 from abc import ABC
+from typing import Union
+
 from redis import Redis
+from redis.cluster import RedisCluster
 
 class StorageBase(ABC):
     ...
 
 class RedisWrapper(StorageBase):
-    def __init__(self, collection: str, db_uri: str = ..., redis: Redis = ..., ttl: int = None) -> None: ...
\ No newline at end of file
+    def __init__(self, collection: str, db_uri: str = ..., redis: Union[Redis, RedisCluster] = ..., ttl: int = None) -> None: ...
\ No newline at end of file
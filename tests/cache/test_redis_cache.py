@@ -0,0 +1,90 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+from contextlib import nullcontext
+
+from inge6.cache import redis_cache, _parse_hosts
+
+# pylint: disable=unused-argument
+def test_pipeline_returns_reads_in_order(redis_client):
+    redis_cache.hset('code', 'arti', 'some_artifact')
+    redis_cache.set('other', {'some': 'value'})
+
+    with redis_cache.pipeline() as pipe:
+        pipe.hget('code', 'arti')
+        pipe.hset('code', 'cc_cm', 'challenge')
+        pipe.get('other')
+        pipe.get('does_not_exist')
+        results = pipe.execute()
+
+    assert results == ['some_artifact', {'some': 'value'}, None]
+    assert redis_cache.hget('code', 'cc_cm') == 'challenge'
+
+
+def test_pipeline_executes_writes_on_exit(redis_client):
+    with redis_cache.pipeline() as pipe:
+        pipe.hset('code', 'arti', 'some_artifact')
+        pipe.set('key', 'value')
+
+    assert redis_cache.hget('code', 'arti') == 'some_artifact'
+    assert redis_cache.get('key') == 'value'
+    assert 0 < redis_client.ttl(redis_cache.KEY_PREFIX + 'code') <= redis_cache.EXPIRES_IN_S
+
+
+
+def test_hsetnx_only_sets_within_existing_namespace(redis_client):
+    assert not redis_cache.hsetnx('code', 'claim', 'worker')
+    assert not redis_client.exists(redis_cache.KEY_PREFIX + 'code')
+
+    redis_cache.hset('code', 'arti', 'some_artifact')
+    assert redis_cache.hsetnx('code', 'claim', 'worker')
+    assert not redis_cache.hsetnx('code', 'claim', 'other_worker')
+    assert redis_cache.hget('code', 'claim') == 'worker'
+
+def test_pipeline_is_discarded_on_error(redis_client):
+    try:
+        with redis_cache.pipeline() as pipe:
+            pipe.set('key', 'value')
+            raise RuntimeError()
+    except RuntimeError:
+        pass
+
+    assert redis_cache.get('key') is None
+
+
+def test_round_trips_are_measured(redis_client, monkeypatch):
+    round_trips = []
+    monkeypatch.setattr(redis_cache, '_ROUND_TRIP', redis_cache._ROUND_TRIP) # pylint: disable=protected-access
+    redis_cache.measure_round_trips(lambda: round_trips.append(1) or nullcontext())
+
+    redis_cache.set('key', 'value')
+    with redis_cache.pipeline() as pipe:
+        pipe.get('key')
+        pipe.hget('code', 'arti')
+    redis_cache.hget('code', 'arti')
+
+    assert len(round_trips) == 3
+
+
+def test_gen_token_is_local(monkeypatch):
+    def no_redis():
+        raise AssertionError("token generation should not contact the redis-server")
+
+    monkeypatch.setattr(redis_cache, 'get_redis_client', no_redis)
+    tokens = {redis_cache.gen_token() for _ in range(100)}
+
+    assert len(tokens) == 100
+    assert all(len(token) == 2 * redis_cache.TOKEN_NBYTES for token in tokens)
+
+
+def test_cluster_hash_tags(monkeypatch):
+    monkeypatch.setattr('inge6.cache.REDIS_MODE', 'cluster')
+
+    assert redis_cache._get_namespace('some_code') == redis_cache.KEY_PREFIX + '{some_code}' # pylint: disable=protected-access
+
+
+def test_parse_hosts():
+    assert _parse_hosts('sentinel-1:26379, sentinel-2:26380') == [('sentinel-1', 26379), ('sentinel-2', 26380)]
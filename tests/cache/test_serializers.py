@@ -0,0 +1,47 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import pytest
+
+from inge6.cache.serializers import get_serializer, COMPACT_V1
+
+AUTH_REQ_VALUE = {
+    'auth_req': {
+        'client_id': 'test_client',
+        'redirect_uri': 'https://example.com/callback',
+        'response_type': 'code',
+        'nonce': 'some_nonce',
+        'scope': ['openid'],
+        'state': 'some_state',
+    },
+    'code_challenge': '_1f8tFjAtu6D1Df-GOyDPoMjCJdEvaSWsnqR6SLpzsw',
+    'code_challenge_method': 'S256'
+}
+
+@pytest.mark.parametrize("value", [AUTH_REQ_VALUE, 'some_artifact', b'encrypted_bsn', 'true'])
+def test_compact_roundtrip(value):
+    serializer = get_serializer('compact')
+    serialized_value = serializer.dumps(value)
+
+    assert serialized_value[0] == COMPACT_V1
+    assert serializer.loads(serialized_value) == value
+
+
+def test_read_across_serializers():
+    compact = get_serializer('compact')
+    pickle = get_serializer('pickle')
+
+    assert compact.loads(pickle.dumps(AUTH_REQ_VALUE)) == AUTH_REQ_VALUE
+    assert pickle.loads(compact.dumps(AUTH_REQ_VALUE)) == AUTH_REQ_VALUE
+    assert len(compact.dumps(AUTH_REQ_VALUE)) < len(pickle.dumps(AUTH_REQ_VALUE))
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        get_serializer('compact').loads(b'\x7fsome value')
+
+    with pytest.raises(ValueError):
+        get_serializer('json')
@@ -0,0 +1,70 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from inge6.cache.single_flight import FlightResult, SingleFlight
+
+
+class CountingCall:
+    def __init__(self, result, delay_s=0.0):
+        self.result = result
+        self.delay_s = delay_s
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay_s)
+        return self.result
+
+
+# pylint: disable=unused-argument
+def test_concurrent_calls_coalesce(redis_client):
+    single_flight = SingleFlight(lock_ttl_s=5, result_ttl_s=60, wait_s=2)
+    call = CountingCall(FlightResult(200, b'{"access_token": "abc"}'), delay_s=0.2)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: single_flight.do('code', 'fingerprint', call), range(4)))
+
+    assert call.calls == 1
+    assert results == [FlightResult(200, b'{"access_token": "abc"}')] * 4
+
+    # a retry gets the same answer
+    assert single_flight.do('code', 'fingerprint', call) == FlightResult(200, b'{"access_token": "abc"}')
+    assert call.calls == 1
+
+
+def test_results_per_fingerprint(redis_client):
+    single_flight = SingleFlight(lock_ttl_s=5, result_ttl_s=60, wait_s=2)
+    call = CountingCall(FlightResult(200, b'{"access_token": "abc"}'))
+    other_call = CountingCall(FlightResult(400, b'{"error": "invalid_grant"}'))
+
+    single_flight.do('code', 'fingerprint', call)
+    assert single_flight.do('code', 'other', other_call) == FlightResult(400, b'{"error": "invalid_grant"}')
+    assert single_flight.do('code', 'fingerprint', call) == FlightResult(200, b'{"access_token": "abc"}')
+    assert (call.calls, other_call.calls) == (1, 1)
+
+
+def test_server_errors_are_not_stored(redis_client):
+    single_flight = SingleFlight(lock_ttl_s=5, result_ttl_s=60, wait_s=2)
+    call = CountingCall(FlightResult(503, b'{"error": "temporarily_unavailable"}'))
+
+    single_flight.do('code', 'fingerprint', call)
+    single_flight.do('code', 'fingerprint', call)
+    assert call.calls == 2
+
+
+def test_waiting_times_out(redis_client):
+    single_flight = SingleFlight(lock_ttl_s=5, result_ttl_s=60, wait_s=0.1)
+    call = CountingCall(FlightResult(200, b'{}'), delay_s=0.5)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        first = executor.submit(single_flight.do, 'code', 'fingerprint', call)
+        time.sleep(0.05)
+        assert single_flight.do('code', 'fingerprint', call) is None
+        assert first.result() == FlightResult(200, b'{}')
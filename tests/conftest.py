@@ -0,0 +1,54 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+from datetime import datetime
+
+import pytest
+import fakeredis
+
+import inge6.cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FrozenDatetime(datetime):
+    now_timestamp = datetime(2021, 7, 1, 12, 0, 0).timestamp()
+
+    @classmethod
+    def utcnow(cls):
+        return datetime.fromtimestamp(cls.now_timestamp)
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(inge6.cache, '_REDIS_CLIENT', client)
+    return client
+
+
+@pytest.fixture
+def clock():
+    """
+    A clock to pass to the time dependent parts, advanced by setting its now attribute.
+    """
+    return FakeClock()
+
+
+@pytest.fixture
+def frozen_datetime(monkeypatch):
+    """
+    Freezes the time the rate limiter derives the current timeslot from, advanced by setting its now_timestamp
+    attribute.
+    """
+    monkeypatch.setattr(FrozenDatetime, 'now_timestamp', FrozenDatetime.now_timestamp)
+    monkeypatch.setattr('inge6.ratelimit.limiter.datetime', FrozenDatetime)
+    return FrozenDatetime
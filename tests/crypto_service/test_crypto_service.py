@@ -0,0 +1,129 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import base64
+import json
+import os
+import socket
+import threading
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from nacl.encoding import Base64Encoder
+from nacl.public import PrivateKey
+
+import inge6.crypto_service
+from inge6.crypto_service import CryptoClient, RemoteEncrypt
+from inge6.crypto_service.operations import CryptoOperations
+from inge6.crypto_service.server import CryptoServer
+from inge6.encrypt import Encrypt
+from inge6.exceptions import CryptoServiceError
+from inge6.saml import AuthNRequest, ArtifactResolveRequest
+from inge6.saml.utils import has_valid_signatures
+
+SYMM_KEY = '4d5af2ae2c9ba5f1a6a2f7f3f6b9e4a2c7b1d3e5f7091b2d4f6a8c0e2a4c6e8f'
+
+ENCRYPTED_KEY_TEMPLATE = (
+    '<xenc:EncryptedKey xmlns:xenc="http://www.w3.org/2001/04/xmlenc#">'
+    '<xenc:EncryptionMethod Algorithm="http://www.w3.org/2001/04/xmlenc#rsa-oaep-mgf1p"/>'
+    '<xenc:CipherData><xenc:CipherValue>{}</xenc:CipherValue></xenc:CipherData>'
+    '</xenc:EncryptedKey>'
+)
+
+
+def new_encrypt():
+    return Encrypt(
+        raw_sign_key=PrivateKey.generate().encode(encoder=Base64Encoder),
+        raw_enc_key=PrivateKey.generate().public_key.encode(encoder=Base64Encoder),
+        raw_local_enc_key=SYMM_KEY
+    )
+
+
+@pytest.fixture
+def crypto_server(tmp_path):
+    server = CryptoServer(str(tmp_path / 'crypto.sock'), CryptoOperations('saml/certs/sp.key', new_encrypt()))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture
+def crypto_client(crypto_server, monkeypatch):
+    client = CryptoClient(crypto_server.server_address, timeout_s=5, max_batch=16)
+    monkeypatch.setattr(inge6.crypto_service, '_CRYPTO_CLIENT', client)
+    return client
+
+
+@pytest.mark.parametrize('build_request', [
+    lambda: AuthNRequest(sso_url='test_url', issuer_id='test_id'),
+    lambda: ArtifactResolveRequest('some_artifact_code', sso_url='test_url', issuer_id='test_id'),
+])
+def test_saml_sign(crypto_client, crypto_server, build_request):
+    with open('saml/certs/sp.crt', 'r') as cert_file:
+        cert_data = cert_file.read()
+
+    saml_request = build_request()
+    _, valid = has_valid_signatures(saml_request.root, cert_data=cert_data)
+
+    assert valid
+    assert crypto_server.stats()['requests'] == 1
+
+
+def test_saml_decrypt_key(crypto_client):
+    with open('saml/certs/sp.crt', 'rb') as cert_file:
+        public_key = x509.load_pem_x509_certificate(cert_file.read()).public_key()
+
+    aes_key = os.urandom(16)
+    cipher_value = public_key.encrypt(aes_key, padding.OAEP(mgf=padding.MGF1(hashes.SHA1()), algorithm=hashes.SHA1(), label=None))
+    encrypted_key = ENCRYPTED_KEY_TEMPLATE.format(base64.b64encode(cipher_value).decode()).encode()
+
+    assert crypto_client.call('saml_decrypt_key', encrypted_key) == aes_key
+
+
+def test_bsn_encrypt_concurrently(crypto_client, crypto_server):
+    remote_encrypt = RemoteEncrypt(crypto_client)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        payloads = list(executor.map(lambda i: remote_encrypt.symm_encrypt(str(900000000 + i)), range(32)))
+
+    plaintexts = [new_encrypt().symm_decrypt(json.loads(base64.b64decode(payload))) for payload in payloads]
+    assert plaintexts == [str(900000000 + i).encode() for i in range(32)]
+    assert crypto_server.stats()['requests'] == 32
+
+
+def test_errors(crypto_client, crypto_server):
+    with pytest.raises(CryptoServiceError, match='sign_anything failed'):
+        crypto_client.call('sign_anything', b'')
+
+    with pytest.raises(CryptoServiceError, match='saml_decrypt_key failed'):
+        crypto_client.call('saml_decrypt_key', b'<not-an-encrypted-key/>')
+
+    crypto_server.shutdown()
+    crypto_server.server_close()
+    with pytest.raises(CryptoServiceError):
+        CryptoClient(crypto_server.server_address, timeout_s=1, max_batch=16).call('bsn_symm_encrypt', '900212640')
+
+
+def test_disconnect_fails_calls_sent_over_connection(tmp_path):
+    client = CryptoClient(str(tmp_path / 'crypto.sock'), timeout_s=1, max_batch=16)
+    sent, queued = Future(), Future()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        # pylint: disable=protected-access
+        client._sock = sock
+        client._futures.update({1: sent, 2: queued})
+        client._sent[1] = sock
+        client._disconnect(sock, 'Crypto service connection lost')
+
+    assert sent.result(timeout=0) == (False, 'Crypto service connection lost')
+    assert not queued.done()
@@ -0,0 +1,46 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+from oic.oic.message import AuthorizationRequest as OICAuthRequest
+
+from inge6.cache.serializers import get_serializer
+from inge6.oidc.authorize import auth_req_fields, AUTH_REQ_FIELDS
+
+def _auth_req():
+    return OICAuthRequest(
+        client_id='test_client',
+        redirect_uri='https://example.com/callback',
+        response_type='code',
+        scope='openid',
+        state='some_state',
+        nonce='some_nonce',
+        code_challenge='_1f8tFjAtu6D1Df-GOyDPoMjCJdEvaSWsnqR6SLpzsw',
+        code_challenge_method='S256',
+        claims={'id_token': {'sub': None}}
+    )
+
+
+def test_only_needed_fields():
+    fields = auth_req_fields(_auth_req())
+
+    assert set(fields) == set(AUTH_REQ_FIELDS)
+    assert 'code_challenge' not in fields
+
+
+def test_compact_roundtrip():
+    compact = get_serializer('compact')
+    auth_req = OICAuthRequest().from_dict(compact.loads(compact.dumps(auth_req_fields(_auth_req()))))
+
+    for field in AUTH_REQ_FIELDS:
+        assert auth_req.to_dict()[field] == _auth_req().to_dict()[field]
+
+
+def test_pickle_keeps_objects():
+    pickle = get_serializer('pickle')
+
+    assert pickle.serializes_objects
+    assert not get_serializer('compact').serializes_objects
+    assert isinstance(pickle.loads(pickle.dumps(_auth_req())), OICAuthRequest)
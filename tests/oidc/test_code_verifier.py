@@ -4,7 +4,16 @@
 #
 # SPDX-License-Identifier: EUPL-1.2
 #
-from inge6.oidc.authorize import verify_code_verifier
+import pytest
+
+from fastapi import HTTPException
+
+from inge6.oidc.authorize import verify_code_verifier, verify_token_request
+
+CC_CM = {
+    "code_challenge": "_1f8tFjAtu6D1Df-GOyDPoMjCJdEvaSWsnqR6SLpzsw",
+    "code_challenge_method": "S256"
+}
 
 def test_code_verifier():
     cc_cm = {
@@ -37,3 +46,18 @@ def test_plaintext_code_challenge():
     code_verifier = "SoOEDN-mZKNhw7Mc52VXxyiqTvFB3mod36MwPru253c"
 
     assert not verify_code_verifier(cc_cm, code_verifier)
+
+
+@pytest.mark.parametrize('request_body, cc_cm', [
+    (b'code=some_code', CC_CM),
+    (b'code=some_code&code_verifier=SoOEDN-mZKNhw7Mc52VXxyiqTvFB3mod36MwPru253c', None),
+    (b'code=some_code&code_verifier=wrong_code_verifier', CC_CM),
+])
+def test_invalid_token_request(request_body, cc_cm):
+    with pytest.raises(HTTPException) as raised:
+        verify_token_request(request_body, cc_cm)
+    assert raised.value.status_code == 400
+
+
+def test_valid_token_request():
+    verify_token_request(b'code=some_code&code_verifier=SoOEDN-mZKNhw7Mc52VXxyiqTvFB3mod36MwPru253c', CC_CM)
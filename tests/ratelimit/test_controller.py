@@ -0,0 +1,94 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import pytest
+
+from inge6.ratelimit import BackendStats, ControllerConfig, UserLimitController, next_user_limit
+
+USER_LIMIT_KEY = 'tvs_connect_user_limit'
+
+CONFIG = ControllerConfig(
+    min_user_limit=10,
+    max_user_limit=100,
+    increase=5,
+    decrease_factor=0.5,
+    latency_targets_s={'artifact': 1.0, 'redis': 0.05},
+    max_slow_ratio=0.1,
+    max_error_ratio=0.02
+)
+
+
+@pytest.mark.parametrize('user_limit, stats, rejections, expected', [
+    # backends keep up, users rejected: additive increase
+    (50, {'artifact': BackendStats(100, 5, 1)}, 3, 55),
+    # backends keep up, the limit is not reached
+    (50, {'artifact': BackendStats(100, 5, 1)}, 0, 50),
+    # too many slow calls: multiplicative decrease
+    (50, {'artifact': BackendStats(100, 20, 0), 'redis': BackendStats(100, 0, 0)}, 3, 25),
+    # too many errors
+    (50, {'redis': BackendStats(100, 0, 5)}, 0, 25),
+    # too few calls to judge the latency
+    (50, {'artifact': BackendStats(5, 5, 5)}, 1, 55),
+    # bounds
+    (98, {}, 1, 100),
+    (12, {'artifact': BackendStats(100, 100, 0)}, 0, 10),
+])
+def test_next_user_limit(user_limit, stats, rejections, expected):
+    assert next_user_limit(user_limit, stats, rejections, CONFIG) == expected
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture
+def controller(redis_client, clock):
+    return UserLimitController(redis_client, USER_LIMIT_KEY, 'tvs:limiter:user_limit', CONFIG, interval_s=10, settle_s=0, clock=clock)
+
+
+def test_controller_adjusts_user_limit(controller, redis_client, clock):
+    redis_client.set(USER_LIMIT_KEY, 50)
+    pubsub = redis_client.pubsub()
+    pubsub.subscribe('tvs:limiter:user_limit')
+    assert pubsub.get_message(timeout=1)['type'] == 'subscribe'
+
+    # the calls are decided on at the end of the interval they were made in
+    for _ in range(20):
+        controller.record('artifact', 2.0)
+    clock.now += 10
+    controller.tick()
+    assert int(redis_client.get(USER_LIMIT_KEY)) == 25
+    assert pubsub.get_message(timeout=1)['data'] == b'25'
+
+    # another worker does not decide on the same interval
+    other = UserLimitController(redis_client, USER_LIMIT_KEY, 'tvs:limiter:user_limit', CONFIG, interval_s=10, clock=clock)
+    assert other.decide(int(clock.now // 10) - 1) is None
+
+    controller.record_rejection()
+    clock.now += 9.9
+    controller.tick()
+    assert int(redis_client.get(USER_LIMIT_KEY)) == 30
+
+
+def test_controller_disabled_without_user_limit(controller, redis_client, clock):
+    controller.record_rejection()
+    controller.tick()
+    clock.now += 10
+    controller.tick()
+    assert redis_client.get(USER_LIMIT_KEY) is None
+
+
+def test_measure(controller):
+    with pytest.raises(ConnectionError):
+        with controller.measure('redis', (ConnectionError,)):
+            raise ConnectionError()
+
+    with pytest.raises(ValueError):
+        with controller.measure('redis', (ConnectionError,)):
+            raise ValueError()
+
+    with controller.measure('redis'):
+        pass
+
+    assert controller._counts['redis:calls'] == 3 # pylint: disable=protected-access
+    assert controller._counts['redis:errors'] == 1 # pylint: disable=protected-access
@@ -0,0 +1,47 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import pytest
+
+from inge6.cache import hash_tag_prefix
+from inge6.config import settings
+from inge6.exceptions import TooBusyError
+from inge6.ratelimit.factory import create_rate_limiter
+
+# pylint: disable=unused-argument
+@pytest.mark.parametrize("ratelimit_settings", [
+    {},
+    {'ip_cooldown': 'bitmap', 'ip_cooldown_hash_key': '00' * 32, 'slot_counter': 'sharded'},
+    {'prefilter': 'True'},
+])
+def test_configured_user_limit_is_enforced(ratelimit_settings, redis_client, frozen_datetime, monkeypatch):
+    for name, value in ratelimit_settings.items():
+        monkeypatch.setitem(settings['ratelimit'], name, value)
+    redis_client.set(settings.ratelimit.user_limit_key, 1)
+
+    rate_limiter = create_rate_limiter()
+
+    assert rate_limiter.enforce('10.0.0.1').user_limit == 1
+    with pytest.raises(TooBusyError):
+        rate_limiter.enforce('10.0.0.2')
+
+
+def test_standalone_keys_are_not_prefixed(redis_client, frozen_datetime):
+    redis_client.set(settings.ratelimit.user_limit_key, 10)
+
+    create_rate_limiter().enforce('10.0.0.1')
+
+    keys = {key.decode() for key in redis_client.keys()}
+    assert settings.ratelimit.user_limit_key in keys
+    assert f'tvs:limiter:{int(frozen_datetime.now_timestamp * 10)}' in keys
+    assert any(key.startswith('tvs:ipv4:') for key in keys)
+
+
+def test_hash_tag_prefix(monkeypatch):
+    assert hash_tag_prefix('tvs:limiter') == ''
+
+    monkeypatch.setattr('inge6.cache.REDIS_MODE', 'cluster')
+    assert hash_tag_prefix('tvs:limiter') == '{tvs:limiter}'
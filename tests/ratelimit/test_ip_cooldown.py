@@ -0,0 +1,55 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import pytest
+
+from inge6.ratelimit import Admission, RateLimiter, BitmapIpCooldown
+
+
+@pytest.fixture
+def bitmap_ip_cooldown():
+    return BitmapIpCooldown(ip_expire_s=10, bits=16, hash_key=b'some_hash_key')
+
+# pylint: disable=redefined-outer-name
+def test_bitmap_ip_cooldown(redis_client, bitmap_ip_cooldown, monkeypatch):
+    now = [1625140800]
+    monkeypatch.setattr('inge6.ratelimit.ip_cooldown.time.time', lambda: now[0])
+    rate_limiter = RateLimiter(redis_client, 'tvs_connect_user_limit', ip_expire_s=10, ip_cooldown=bitmap_ip_cooldown)
+
+    assert rate_limiter.check('10.0.0.1').admitted
+    assert rate_limiter.check('10.0.0.2').admitted
+    assert rate_limiter.check('10.0.0.1').admission == Admission.IP_COOLDOWN
+
+    now[0] += 9
+    assert rate_limiter.check('10.0.0.1').admission == Admission.IP_COOLDOWN
+
+    now[0] += 1
+    assert rate_limiter.check('10.0.0.1').admitted
+
+    assert 0 < redis_client.ttl(bitmap_ip_cooldown.bucket_key(now[0])) <= 11
+    assert not list(redis_client.scan_iter('tvs:ipv4:*'))
+
+
+def test_bitmap_bounded_memory(redis_client, bitmap_ip_cooldown):
+    rate_limiter = RateLimiter(redis_client, 'tvs_connect_user_limit', ip_expire_s=10, ip_cooldown=bitmap_ip_cooldown)
+    for i in range(1000):
+        rate_limiter.check(f'10.0.{i // 256}.{i % 256}')
+
+    assert all(redis_client.strlen(key) <= 2 ** 16 // 8 for key in redis_client.scan_iter('tvs:ipcd:*'))
+
+
+def test_bit_offset(bitmap_ip_cooldown):
+    offsets = {bitmap_ip_cooldown.bit_offset(f'10.0.0.{i}') for i in range(256)}
+
+    assert all(0 <= offset < 2 ** 16 for offset in offsets)
+    assert len(offsets) > 250
+    assert BitmapIpCooldown(10, 16, b'other_hash_key').bit_offset('10.0.0.1') != bitmap_ip_cooldown.bit_offset('10.0.0.1')
+
+
+@pytest.mark.parametrize('hash_key', [b'', None])
+def test_bitmap_requires_hash_key(hash_key):
+    with pytest.raises(ValueError, match='hash key'):
+        BitmapIpCooldown(ip_expire_s=10, bits=16, hash_key=hash_key)
@@ -0,0 +1,69 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import asyncio
+
+import pytest
+
+from inge6.ratelimit import AdmissionLanes, Lane
+
+
+def test_new_flows_are_shed_first():
+    async def run():
+        lanes = AdmissionLanes(capacity=3, reserved=1, wait_timeout_s=0.01, max_waiting=10)
+        assert await lanes.acquire(Lane.NEW_FLOW)
+        assert await lanes.acquire(Lane.NEW_FLOW)
+        assert not await lanes.acquire(Lane.NEW_FLOW)
+
+        assert await lanes.acquire(Lane.IN_FLOW)
+        assert not await lanes.acquire(Lane.IN_FLOW)
+
+        await lanes.release()
+        assert not await lanes.acquire(Lane.NEW_FLOW)
+        assert await lanes.acquire(Lane.IN_FLOW)
+
+    asyncio.run(run())
+
+
+def test_in_flow_waits_for_room():
+    async def run():
+        lanes = AdmissionLanes(capacity=1, reserved=0, wait_timeout_s=1, max_waiting=10)
+        assert await lanes.acquire(Lane.IN_FLOW)
+
+        waiting = asyncio.ensure_future(lanes.acquire(Lane.IN_FLOW))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+
+        await lanes.release()
+        assert await waiting
+        assert lanes.in_use == 1
+
+    asyncio.run(run())
+
+
+def test_waiting_is_bounded_and_in_order():
+    async def run():
+        lanes = AdmissionLanes(capacity=1, reserved=0, wait_timeout_s=1, max_waiting=1)
+        assert await lanes.acquire(Lane.IN_FLOW)
+
+        waiting = asyncio.ensure_future(lanes.acquire(Lane.IN_FLOW))
+        await asyncio.sleep(0.01)
+        assert not await lanes.acquire(Lane.IN_FLOW)
+
+        # The room that comes free is handed to the waiting request, not to new ones
+        await lanes.release()
+        assert lanes.in_use == 0
+        assert not await lanes.acquire(Lane.IN_FLOW)
+        assert not await lanes.acquire(Lane.NEW_FLOW)
+        assert await waiting
+        assert (lanes.in_use, lanes.waiting) == (1, 0)
+
+    asyncio.run(run())
+
+
+def test_reserved_less_than_capacity():
+    with pytest.raises(ValueError):
+        AdmissionLanes(capacity=2, reserved=2, wait_timeout_s=1, max_waiting=10)
@@ -0,0 +1,84 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+from contextlib import nullcontext
+
+from inge6.ratelimit import Admission, CountMinSketch, PreFilter, RateLimiter
+
+
+def _prefilter(clock, num_workers=1, headroom=1.0):
+    return PreFilter(ip_expire_s=10, num_workers=num_workers, headroom=headroom, expected_ips=1000,
+                     false_positive_rate=0.001, sketch_depth=4, clock=clock)
+
+
+def test_count_min_sketch():
+    sketch = CountMinSketch(width=1024, depth=4)
+    for i in range(100):
+        sketch.add(f'10.0.0.{i}'.encode())
+    sketch.add(b'10.0.0.1')
+
+    assert sketch.estimate(b'10.0.0.1') >= 2
+    assert all(sketch.estimate(f'10.0.0.{i}'.encode()) >= 1 for i in range(100))
+
+    sketch.clear()
+    assert sketch.estimate(b'10.0.0.1') == 0
+
+
+def test_sketch_false_positive_rate():
+    sketch = CountMinSketch(CountMinSketch.width_for(1000, 0.01, depth=4), depth=4)
+    for i in range(1000):
+        sketch.add(f'10.0.{i // 256}.{i % 256}'.encode())
+
+    false_positives = sum(sketch.estimate(f'10.1.{i // 256}.{i % 256}'.encode()) > 0 for i in range(10000))
+    assert false_positives <= 2 * 0.01 * 10000
+
+
+def test_repeated_ip_within_window(clock):
+    prefilter = _prefilter(clock)
+
+    assert prefilter.check('10.0.0.1') is None
+    assert prefilter.check('10.0.0.1') == Admission.IP_COOLDOWN
+
+    clock.now += 10
+    assert prefilter.check('10.0.0.1') is None
+
+
+def test_token_bucket(clock):
+    prefilter = _prefilter(clock, num_workers=2)
+
+    # Without a known user limit, nothing is shed because of the rate.
+    assert all(prefilter.check(f'10.0.0.{i}') is None for i in range(100))
+
+    # 20 users per 100ms shared by 2 workers, 10 per 100ms for this worker.
+    prefilter.set_user_limit(20)
+    admissions = [prefilter.check(f'10.0.1.{i}') for i in range(20)]
+    assert admissions.count(None) == 10
+    assert admissions[-1] == Admission.TOO_BUSY
+
+    clock.now += 0.05
+    admissions = [prefilter.check(f'10.0.2.{i}') for i in range(20)]
+    assert admissions.count(None) == 5
+
+
+def test_rate_limiter_skips_redis(redis_client, clock):
+    rate_limiter = RateLimiter(redis_client, 'tvs_connect_user_limit', ip_expire_s=10, prefilter=_prefilter(clock))
+
+    assert rate_limiter.check('10.0.0.1').admitted
+    redis_client.flushall()
+
+    # Rejected by the prefilter, without the redis-server setting the cooldown key again.
+    assert rate_limiter.check('10.0.0.1').admission == Admission.IP_COOLDOWN
+    assert not redis_client.keys()
+
+
+def test_only_script_round_trips_measured(redis_client, clock):
+    round_trips = []
+    rate_limiter = RateLimiter(redis_client, 'tvs_connect_user_limit', ip_expire_s=10, prefilter=_prefilter(clock))
+    rate_limiter.measure_round_trips(lambda: round_trips.append(1) or nullcontext())
+
+    assert rate_limiter.check('10.0.0.1').admitted
+    assert rate_limiter.check('10.0.0.1').admission == Admission.IP_COOLDOWN
+    assert len(round_trips) == 1
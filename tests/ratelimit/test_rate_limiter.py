@@ -0,0 +1,45 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import pytest
+
+from inge6.ratelimit import Admission, RateLimiter
+from inge6.exceptions import TooBusyError, TooManyRequestsFromOrigin
+
+USER_LIMIT_KEY = 'tvs_connect_user_limit'
+
+@pytest.fixture
+def rate_limiter(redis_client):
+    return RateLimiter(redis_client, user_limit_key=USER_LIMIT_KEY, ip_expire_s=10)
+
+# pylint: disable=redefined-outer-name
+def test_no_user_limit_is_disabled(rate_limiter):
+    for i in range(10):
+        verdict = rate_limiter.check(f'10.0.0.{i}')
+        assert verdict.admitted
+        assert verdict.user_limit is None
+
+
+def test_ip_cooldown(rate_limiter, redis_client):
+    assert rate_limiter.check('10.0.0.1').admitted
+    assert rate_limiter.check('10.0.0.1').admission == Admission.IP_COOLDOWN
+    assert 0 < redis_client.ttl(next(redis_client.scan_iter('tvs:ipv4:*'))) <= 10
+
+    with pytest.raises(TooManyRequestsFromOrigin):
+        rate_limiter.enforce('10.0.0.1')
+
+
+# pylint: disable=unused-argument
+def test_user_limit(rate_limiter, redis_client, frozen_datetime):
+    redis_client.set(USER_LIMIT_KEY, 3)
+
+    verdicts = [rate_limiter.check(f'10.0.0.{i}') for i in range(4)]
+    assert [verdict.admission for verdict in verdicts] == [Admission.ADMITTED, Admission.ADMITTED, Admission.TOO_BUSY, Admission.TOO_BUSY]
+    assert verdicts[-1].num_users == 4
+    assert verdicts[-1].user_limit == 3
+
+    with pytest.raises(TooBusyError):
+        rate_limiter.enforce('10.0.0.5')
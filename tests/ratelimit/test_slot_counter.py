@@ -0,0 +1,68 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import math
+
+import pytest
+
+from inge6.ratelimit import Admission, RateLimiter, ShardedSlotCounter
+
+TIMESLOT = 16250000000
+
+
+def _admitted(num_users, user_limit):
+    return num_users == 1 or num_users < user_limit
+
+
+def test_counts_exactly_without_flush_interval(redis_client):
+    counter = ShardedSlotCounter(redis_client, num_shards=4, flush_interval_s=0, slot_expire_s=2)
+
+    assert [counter.incr(TIMESLOT) for _ in range(10)] == list(range(1, 11))
+    assert sum(int(redis_client.get(counter.shard_key(TIMESLOT, shard)) or 0) for shard in range(4)) == 10
+    assert counter.incr(TIMESLOT + 1) == 1
+
+
+def test_pending_increments_flushed_on_rollover(redis_client, clock):
+    counter = ShardedSlotCounter(redis_client, num_shards=4, flush_interval_s=1, slot_expire_s=2, clock=clock)
+
+    assert [counter.incr(TIMESLOT) for _ in range(5)] == list(range(1, 6))
+    assert counter.incr(TIMESLOT + 1) == 1
+
+    assert sum(int(redis_client.get(counter.shard_key(TIMESLOT, shard)) or 0) for shard in range(4)) == 5
+
+
+@pytest.mark.parametrize("num_workers, user_limit", [(2, 20), (4, 50), (8, 100)])
+def test_limit_enforced_within_tolerance(redis_client, clock, num_workers, user_limit):
+    flush_interval_s = 0.01
+    request_interval_s = 0.001
+    workers = [
+        ShardedSlotCounter(redis_client, num_shards=8, flush_interval_s=flush_interval_s, slot_expire_s=2, clock=clock)
+        for _ in range(num_workers)
+    ]
+
+    admitted = 0
+    for request in range(4 * user_limit):
+        clock.now += request_interval_s
+        admitted += _admitted(workers[request % num_workers].incr(TIMESLOT), user_limit)
+
+    # Each worker misses at most the unflushed increments of the other workers.
+    requests_per_worker_per_interval = math.ceil(flush_interval_s / request_interval_s / num_workers) + 1
+    tolerance = (num_workers - 1) * requests_per_worker_per_interval
+    assert user_limit - 1 <= admitted <= user_limit - 1 + tolerance
+
+
+# pylint: disable=unused-argument
+def test_rate_limiter_with_slot_counter(redis_client, frozen_datetime):
+    redis_client.set('tvs_connect_user_limit', 3)
+    slot_counter = ShardedSlotCounter(redis_client, num_shards=4, flush_interval_s=0, slot_expire_s=2)
+    rate_limiter = RateLimiter(redis_client, 'tvs_connect_user_limit', ip_expire_s=10, slot_counter=slot_counter)
+
+    verdicts = [rate_limiter.check(f'10.0.0.{i}') for i in range(4)]
+
+    assert [verdict.admission for verdict in verdicts[:2]] == [Admission.ADMITTED, Admission.ADMITTED]
+    assert verdicts[-1].admission == Admission.TOO_BUSY
+    # Only the sub-counters, tvs:limiter:<shard>:<timeslot>, are incremented.
+    assert all(key.count(b':') == 3 for key in redis_client.scan_iter('tvs:limiter:*'))
@@ -0,0 +1,71 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import time
+
+import pytest
+
+from inge6.ratelimit import Admission, RateLimiter, UserLimitCache
+
+USER_LIMIT_KEY = 'tvs_connect_user_limit'
+
+
+@pytest.fixture
+def user_limit_cache(redis_client, clock):
+    return UserLimitCache(redis_client, USER_LIMIT_KEY, ttl_s=1, channel='tvs:limiter:user_limit', clock=clock)
+
+# pylint: disable=redefined-outer-name
+# pylint: disable=unused-argument
+def test_cached_user_limit_is_used(redis_client, user_limit_cache, clock, frozen_datetime):
+    rate_limiter = RateLimiter(redis_client, USER_LIMIT_KEY, ip_expire_s=10, user_limit_cache=user_limit_cache)
+
+    redis_client.set(USER_LIMIT_KEY, 2)
+    assert rate_limiter.check('10.0.0.1').admitted
+    assert user_limit_cache.get()[1] == 2
+
+    # The key is not read while the cached value is fresh.
+    redis_client.set(USER_LIMIT_KEY, 100)
+    assert rate_limiter.check('10.0.0.2').admission == Admission.TOO_BUSY
+
+    clock.now += 1
+    assert rate_limiter.check('10.0.0.3').admitted
+    assert user_limit_cache.get()[1] == 100
+
+
+def test_disabled_user_limit_is_cached(redis_client, user_limit_cache):
+    rate_limiter = RateLimiter(redis_client, USER_LIMIT_KEY, ip_expire_s=10, user_limit_cache=user_limit_cache)
+
+    verdict = rate_limiter.check('10.0.0.1')
+    assert verdict.admitted
+    assert verdict.user_limit is None
+    assert user_limit_cache.get()[1] == -1
+
+
+def test_invalidation_wins_race(user_limit_cache):
+    generation, _ = user_limit_cache.get()
+    user_limit_cache.invalidate()
+    user_limit_cache.update(generation, 10)
+
+    assert user_limit_cache.get()[1] is None
+
+
+@pytest.mark.parametrize("publish", [
+    lambda redis_client: redis_client.publish('tvs:limiter:user_limit', 'changed'),
+    lambda redis_client: redis_client.set(USER_LIMIT_KEY, 20),
+])
+def test_push_invalidation(redis_client, user_limit_cache, publish):
+    redis_client.config_set('notify-keyspace-events', 'K$g')
+    user_limit_cache.update(user_limit_cache.get()[0], 10)
+    user_limit_cache.start_listener()
+    try:
+        publish(redis_client)
+        deadline = time.monotonic() + 2
+        while user_limit_cache.get()[1] is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        user_limit_cache.stop_listener()
+
+    assert user_limit_cache.get()[1] is None
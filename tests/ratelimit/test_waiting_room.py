@@ -0,0 +1,80 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import pytest
+import nacl.utils
+
+from inge6.encrypt import Sealer
+from inge6.exceptions import InvalidSealedToken
+from inge6.ratelimit import Admission, RateLimiter, WaitingRoom
+
+USER_LIMIT_KEY = 'tvs_connect_user_limit'
+
+@pytest.fixture
+def rate_limiter(redis_client):
+    return RateLimiter(redis_client, user_limit_key=USER_LIMIT_KEY, ip_expire_s=10, queueing=True)
+
+@pytest.fixture
+def waiting_room(redis_client, rate_limiter):
+    return WaitingRoom(redis_client, rate_limiter, Sealer(nacl.utils.random(32).hex(), expires_in_s=60, prefix='q1.'))
+
+# pylint: disable=redefined-outer-name,unused-argument
+def test_fifo_admission(waiting_room, rate_limiter, redis_client, frozen_datetime):
+    redis_client.set(USER_LIMIT_KEY, 3)
+    assert [rate_limiter.check(f'10.0.0.{i}').admission for i in range(3)] == [Admission.ADMITTED, Admission.ADMITTED, Admission.TOO_BUSY]
+
+    tickets = [waiting_room.enqueue({'state': str(i)}) for i in range(3)]
+
+    # no room in the current timeslot
+    status = waiting_room.poll(tickets[2])
+    assert not status.admitted
+    assert status.users_ahead == 2
+    assert status.estimated_wait_s == pytest.approx(0.1)
+
+    frozen_datetime.now_timestamp += 0.1
+    # the users ahead are admitted along with the last one, as far as the timeslot has room
+    status = waiting_room.poll(tickets[2])
+    assert not status.admitted
+    assert status.users_ahead == 0
+
+    # new users join the queue as long as users are waiting
+    assert rate_limiter.check('10.0.1.1').admission == Admission.TOO_BUSY
+
+    status = waiting_room.poll(tickets[0])
+    assert status.admitted
+    assert status.request_params == {'state': '0'}
+    assert waiting_room.poll(tickets[1]).admitted
+    assert not waiting_room.poll(tickets[2]).admitted
+
+    frozen_datetime.now_timestamp += 0.1
+    assert waiting_room.poll(tickets[2]).admitted
+    assert rate_limiter.check('10.0.1.2').admitted
+
+
+def test_expired_queue_starts_over(waiting_room, redis_client, frozen_datetime):
+    redis_client.set(USER_LIMIT_KEY, 3)
+    tickets = [waiting_room.enqueue({'state': str(i)}) for i in range(2)]
+    assert all(waiting_room.poll(ticket).admitted for ticket in tickets)
+
+    # The tail expires before the head, which was refreshed by the admissions
+    redis_client.delete(waiting_room.tail_key)
+    tickets = [waiting_room.enqueue({'state': str(i)}) for i in range(4)]
+
+    frozen_datetime.now_timestamp += 0.1
+    timeslot_key = waiting_room.rate_limiter.timeslot_key(int(frozen_datetime.now_timestamp * 10))
+    assert [waiting_room.poll(ticket).admitted for ticket in tickets] == [True, True, False, False]
+    assert int(redis_client.get(timeslot_key)) == 2
+
+
+def test_ticket_admits_once(waiting_room):
+    ticket = waiting_room.enqueue({'state': 'abc'})
+    assert waiting_room.poll(ticket).admitted
+
+    with pytest.raises(InvalidSealedToken):
+        waiting_room.poll(ticket)
+
+    with pytest.raises(InvalidSealedToken):
+        waiting_room.poll(ticket[:-2])
@@ -0,0 +1,141 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import threading
+import time
+
+import pytest
+
+from inge6.cache import redis_cache
+from inge6.exceptions import CryptoServiceError
+from inge6.saml import SpeculativeArtifactResolver
+from inge6.saml.artifact_resolution import PENDING_FIELD
+from inge6.saml.exceptions import BackChannelUnavailable, UserNotAuthenticated
+
+
+def _mark_pending(resolver, code='code'):
+    with redis_cache.pipeline() as pipe:
+        resolver.mark_pending(pipe, code)
+
+
+# pylint: disable=unused-argument
+def test_result_is_awaited(redis_client):
+    released = threading.Event()
+
+    def resolve(artifact, is_digid_mock):
+        released.wait(1)
+        return b'encrypted:' + artifact.encode()
+
+    resolver = SpeculativeArtifactResolver(resolve, max_workers=1, max_pending=1, wait_s=2)
+    _mark_pending(resolver)
+    future = resolver.submit('code', 'artifact', False)
+
+    assert redis_cache.hget('code', PENDING_FIELD)
+    threading.Timer(0.1, released.set).start()
+    assert resolver.unpack(resolver.await_result('code')) == b'encrypted:artifact'
+    assert future.done()
+    # the artifact was claimed by the resolution
+    assert not resolver.claim('code')
+    resolver.shutdown()
+
+
+@pytest.mark.parametrize('error, expected', [
+    (UserNotAuthenticated("User authentication flow failed", oauth_error='saml_authn_failed'), UserNotAuthenticated),
+    (BackChannelUnavailable("Circuit to the back-channel is open"), BackChannelUnavailable),
+    (CryptoServiceError("No response from the crypto service in time"), BackChannelUnavailable),
+    (KeyError('bsn'), RuntimeError),
+])
+def test_errors_are_raised_by_unpack(redis_client, error, expected):
+    def resolve(artifact, is_digid_mock):
+        raise error
+
+    resolver = SpeculativeArtifactResolver(resolve, max_workers=1, max_pending=1, wait_s=1)
+    _mark_pending(resolver)
+    resolver.submit('code', 'artifact', False).result()
+
+    with pytest.raises(expected) as raised:
+        resolver.unpack(resolver.await_result('code'))
+
+    if expected is UserNotAuthenticated:
+        assert raised.value.oauth_error == 'saml_authn_failed'
+    resolver.shutdown()
+
+
+def test_resolved_once(redis_client):
+    resolved = []
+    released = threading.Event()
+
+    def resolve(artifact, is_digid_mock):
+        released.wait(1)
+        resolved.append(artifact)
+        return b''
+
+    resolver = SpeculativeArtifactResolver(resolve, max_workers=1, max_pending=2, wait_s=0.1)
+    for code in ('code', 'other_code'):
+        _mark_pending(resolver, code)
+        resolver.submit(code, code + '_artifact', False)
+
+    # running past the wait: not resolved again, the other worker is not awaited
+    assert resolver.await_result('code') is None
+    assert not resolver.claim('code')
+    # the token endpoint claims the queued artifact first, the queued resolution is dropped
+    assert resolver.claim('other_code')
+
+    released.set()
+    resolver.shutdown()
+    assert resolved == ['code_artifact']
+
+
+def test_pending_is_bounded(redis_client):
+    released = threading.Event()
+    resolver = SpeculativeArtifactResolver(lambda artifact, is_digid_mock: released.wait(1) and b'', max_workers=1,
+                                           max_pending=1, wait_s=1)
+    _mark_pending(resolver)
+
+    assert resolver.submit('code', 'artifact', False) is not None
+    assert resolver.submit('other_code', 'other_artifact', False) is None
+
+    released.set()
+    resolver.shutdown()
+
+
+def test_stale_submissions_are_dropped(redis_client):
+    resolved = []
+
+    def resolve(artifact, is_digid_mock):
+        time.sleep(0.2)
+        resolved.append(artifact)
+        return b''
+
+    resolver = SpeculativeArtifactResolver(resolve, max_workers=1, max_pending=2, wait_s=0.1)
+    for code in ('code', 'other_code'):
+        _mark_pending(resolver, code)
+        resolver.submit(code, code + '_artifact', False)
+    resolver.shutdown()
+
+    # queued behind the first resolution for longer than the wait
+    assert resolved == ['code_artifact']
+    assert resolver.await_result('other_code') is None
+    assert resolver.claim('other_code')
+
+
+def test_released_after_unavailable(redis_client):
+    def resolve(artifact, is_digid_mock):
+        raise BackChannelUnavailable("Circuit to the back-channel is open")
+
+    resolver = SpeculativeArtifactResolver(resolve, max_workers=1, max_pending=1, wait_s=1)
+    _mark_pending(resolver)
+    resolver.submit('code', 'artifact', False).result()
+
+    with pytest.raises(BackChannelUnavailable):
+        resolver.unpack(resolver.await_result('code'))
+    assert not resolver.claim('code')
+
+    # a retry of the token request resolves the artifact again
+    resolver.release('code')
+    assert resolver.await_result('code') is None
+    assert resolver.claim('code')
+    resolver.shutdown()
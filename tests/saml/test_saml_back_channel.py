@@ -0,0 +1,200 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import os
+import shutil
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from inge6.config import settings
+from inge6.saml import CircuitBreaker, CircuitState, SAMLBackChannel
+from inge6.saml.back_channel import MutualTLSAdapter
+from inge6.saml.exceptions import BackChannelUnavailable, UnsafeXMLError
+
+
+class ArtifactResolutionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+    delay_s = 0.0
+    drip_s = 0.0
+    status = 200
+
+    def setup(self):
+        super().setup()
+        ArtifactResolutionHandler.connections += 1
+
+    def do_POST(self): # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.delay_s)
+        self.send_response(self.status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not self.drip_s:
+            self.wfile.write(body)
+            return
+        for i in range(len(body)):
+            time.sleep(self.drip_s)
+            self.wfile.write(body[i:i + 1])
+            self.wfile.flush()
+
+    def log_message(self, *_): # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture
+def server():
+    ArtifactResolutionHandler.connections = 0
+    ArtifactResolutionHandler.delay_s = 0.0
+    ArtifactResolutionHandler.drip_s = 0.0
+    ArtifactResolutionHandler.status = 200
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), ArtifactResolutionHandler)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    yield http_server
+    http_server.shutdown()
+    http_server.server_close()
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture
+def back_channel(clock):
+    client = SAMLBackChannel(
+        settings.saml.cert_path, settings.saml.key_path, pool_maxsize=2, connect_timeout_s=1, read_timeout_s=1,
+        max_concurrent=2, queue_timeout_s=0.05, deadline_s=0.2,
+        circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout_s=30, clock=clock),
+        max_response_bytes=4096
+    )
+    yield client
+    client.close()
+
+
+def post(back_channel, server, data='<artifact/>', parse=False):
+    url = f'http://127.0.0.1:{server.server_port}/resolve_artifact'
+    return back_channel.post(url, headers={'content-type': 'text/xml'}, data=data, parse=parse)
+
+
+def test_connections_are_reused(back_channel, server):
+    for i in range(5):
+        assert post(back_channel, server, f'<artifact>{i}</artifact>').text == f'<artifact>{i}</artifact>'
+
+    assert ArtifactResolutionHandler.connections == 1
+    assert back_channel.stats()['succeeded'] == 5
+
+
+def test_deadline_and_circuit_breaker(back_channel, server, clock):
+    ArtifactResolutionHandler.delay_s = 0.5
+
+    for _ in range(2):
+        start = time.monotonic()
+        with pytest.raises(BackChannelUnavailable):
+            post(back_channel, server)
+        assert time.monotonic() - start < 0.45
+
+    assert back_channel.circuit_breaker.state == CircuitState.OPEN
+
+    # fails fast while the circuit is open
+    start = time.monotonic()
+    with pytest.raises(BackChannelUnavailable):
+        post(back_channel, server)
+    assert time.monotonic() - start < 0.05
+    assert back_channel.stats()['rejected_open'] == 1
+
+    # a successful trial call closes the circuit
+    ArtifactResolutionHandler.delay_s = 0.0
+    clock.now += 30
+    assert post(back_channel, server).status_code == 200
+    assert back_channel.circuit_breaker.state == CircuitState.CLOSED
+
+
+def test_deadline_of_slowly_sent_body(back_channel, server):
+    # Every read receives a byte well within the read timeout
+    ArtifactResolutionHandler.drip_s = 0.02
+
+    start = time.monotonic()
+    with pytest.raises(BackChannelUnavailable, match='Deadline'):
+        post(back_channel, server, '<artifact>' + 'a' * 40 + '</artifact>')
+    assert time.monotonic() - start < 0.45
+
+
+def test_unexpected_error_releases_trial(back_channel, server, clock, monkeypatch):
+    ArtifactResolutionHandler.status = 503
+    for _ in range(2):
+        with pytest.raises(BackChannelUnavailable):
+            post(back_channel, server)
+    ArtifactResolutionHandler.status = 200
+    clock.now += 30
+
+    def fail(*_):
+        raise RuntimeError()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(back_channel, '_read_response', fail)
+        with pytest.raises(RuntimeError):
+            post(back_channel, server)
+
+    assert back_channel.circuit_breaker.state == CircuitState.OPEN
+    clock.now += 30
+    assert post(back_channel, server).status_code == 200
+
+
+def test_server_errors_open_the_circuit(back_channel, server):
+    ArtifactResolutionHandler.status = 503
+    for _ in range(2):
+        with pytest.raises(BackChannelUnavailable):
+            post(back_channel, server)
+
+    assert back_channel.stats()['state'] == 'open'
+
+
+def test_bulkhead(back_channel, server):
+    ArtifactResolutionHandler.delay_s = 0.1
+
+    def call(_):
+        try:
+            return post(back_channel, server).status_code
+        except BackChannelUnavailable:
+            return None
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(call, range(4)))
+
+    assert results.count(200) == 2
+    assert back_channel.stats()['rejected_bulkhead'] == 2
+    assert back_channel.circuit_breaker.state == CircuitState.CLOSED
+
+
+def test_parse_while_received(back_channel, server):
+    response = post(back_channel, server, '<artifact><code>1</code></artifact>', parse=True)
+    assert response.root.find('./code').text == '1'
+    assert post(back_channel, server).root is None
+
+
+def test_oversize_responses_are_rejected(back_channel, server):
+    for parse in (False, True):
+        with pytest.raises(UnsafeXMLError):
+            post(back_channel, server, '<artifact>' + 'a' * 5000 + '</artifact>', parse=parse)
+
+    assert back_channel.stats()['rejected_response'] == 2
+    assert back_channel.circuit_breaker.state == CircuitState.CLOSED
+
+
+def test_cert_chain_is_reloaded_on_change(tmp_path):
+    cert_path, key_path = str(tmp_path / 'sp.crt'), str(tmp_path / 'sp.key')
+    shutil.copy(settings.saml.cert_path, cert_path)
+    shutil.copy(settings.saml.key_path, key_path)
+    adapter = MutualTLSAdapter(cert_path, key_path)
+
+    assert not adapter.reload_cert_chain()
+
+    stat = os.stat(cert_path)
+    os.utime(cert_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert adapter.reload_cert_chain()
+    assert not adapter.reload_cert_chain()
@@ -0,0 +1,82 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+# pylint: disable=c-extension-no-member
+from datetime import datetime
+
+import dateutil.parser
+import pytest
+
+from lxml import etree
+
+from inge6.saml.constants import NAMESPACES
+from inge6.saml.exceptions import ValidationError
+from inge6.saml.utils import ElementIndex, parse_iso8601
+
+
+@pytest.fixture
+def response_root():
+    with open('tests/resources/artifact_response.xml', 'rb') as response_file:
+        return etree.fromstring(response_file.read())
+
+
+@pytest.mark.parametrize('timestamp', [
+    '2021-06-05T16:31:33Z',
+    '2021-06-05T16:31:33.123Z',
+    '2021-06-05T16:31:33.123456+0200',
+    '2021-06-05T16:31:33-05:00',
+    '2021-06-05T16:31:33',
+])
+def test_parse_iso8601(timestamp):
+    assert parse_iso8601(timestamp) == dateutil.parser.parse(timestamp, ignoretz=True)
+
+
+def test_parse_iso8601_truncates_fraction():
+    assert parse_iso8601('2021-06-05T16:31:33.1234567Z') == datetime(2021, 6, 5, 16, 31, 33, 123456)
+
+
+@pytest.mark.parametrize('timestamp', ['', '2021-06-05', '2021-06-05 16:31:33Z', '2021-13-05T16:31:33Z', '2021-06-05T16:31:33Zjunk'])
+def test_parse_iso8601_strict(timestamp):
+    with pytest.raises(ValueError):
+        parse_iso8601(timestamp)
+
+
+# pylint: disable=redefined-outer-name
+@pytest.mark.parametrize('path, tag, kwargs', [
+    ('.//samlp:Response', 'samlp:Response', {}),
+    ('.//saml:Assertion', 'saml:Assertion', {}),
+    ('./saml:Issuer', 'saml:Issuer', {'direct': True}),
+    ('.//saml2:AttributeStatement//xenc:EncryptedKey', 'xenc:EncryptedKey', {'inside': 'saml2:AttributeStatement'}),
+    ('.//dsig:Signature', 'dsig:Signature', {}),
+])
+def test_find_as_lxml(response_root, path, tag, kwargs):
+    index = ElementIndex(response_root)
+    artifact_response = response_root.find('.//samlp:ArtifactResponse', NAMESPACES)
+
+    for within in (response_root, artifact_response):
+        assert index.findall(tag, within, **kwargs) == within.findall(path, NAMESPACES)
+        assert index.find(tag, within, **kwargs) is within.find(path, NAMESPACES)
+
+
+def test_lookups_by_id_and_attribute(response_root):
+    index = ElementIndex(response_root)
+    artifact_response = response_root.find('.//samlp:ArtifactResponse', NAMESPACES)
+    assertion = artifact_response.find('.//saml:Assertion', NAMESPACES)
+
+    assert index.find_by_id(assertion.attrib['ID'], response_root) is assertion
+    assert index.find_by_id(assertion.attrib['ID'], assertion) is None
+    assert index.with_attribute('IssueInstant', artifact_response) == artifact_response.findall('.//*[@IssueInstant]')
+    assert index.find('saml:Assertion', None) is None
+
+
+def test_find_required(response_root):
+    index = ElementIndex(response_root)
+
+    assert index.find_required('samlp:Response', response_root) is index.find('samlp:Response', response_root)
+    with pytest.raises(ValidationError, match='samlp:Response'):
+        index.find_required('samlp:Response', response_root, direct=True)
+    with pytest.raises(ValidationError):
+        index.find_required('samlp:Response', None)
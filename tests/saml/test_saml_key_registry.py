@@ -0,0 +1,60 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+# pylint: disable=c-extension-no-member
+import os
+import shutil
+
+import xmlsec
+
+from inge6.saml import AuthNRequest
+from inge6.saml.key_registry import KeyRegistry
+from inge6.saml.utils import has_valid_signatures
+
+
+def test_file_key_is_loaded_once():
+    registry = KeyRegistry()
+    key = registry.from_file('saml/certs/sp.key', xmlsec.constants.KeyDataFormatPem)
+
+    assert registry.from_file('saml/certs/sp.key', xmlsec.constants.KeyDataFormatPem) is key
+    assert registry.from_file('saml/certs/sp.crt', xmlsec.constants.KeyDataFormatCertPem) is not key
+
+
+def test_file_key_is_reloaded_on_change(tmp_path):
+    key_path = str(tmp_path / 'sp.key')
+    shutil.copy('saml/certs/sp.key', key_path)
+
+    registry = KeyRegistry()
+    key = registry.from_file(key_path, xmlsec.constants.KeyDataFormatPem)
+
+    stat = os.stat(key_path)
+    os.utime(key_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = registry.from_file(key_path, xmlsec.constants.KeyDataFormatPem)
+
+    assert reloaded is not key
+    assert registry.from_file(key_path, xmlsec.constants.KeyDataFormatPem) is reloaded
+
+
+def test_memory_keys_are_bounded():
+    with open('saml/certs/sp.crt', 'r') as cert_file:
+        cert_data = cert_file.read()
+
+    registry = KeyRegistry(max_memory_keys=1)
+    key = registry.from_memory(cert_data, xmlsec.constants.KeyDataFormatCertPem)
+    assert registry.from_memory(cert_data, xmlsec.constants.KeyDataFormatCertPem) is key
+
+    registry.from_memory(cert_data.encode(), xmlsec.constants.KeyDataFormatCertPem)
+    assert registry.from_memory(cert_data, xmlsec.constants.KeyDataFormatCertPem) is not key
+
+
+def test_shared_keys_sign_and_verify():
+    with open('saml/certs/sp.crt', 'r') as cert_file:
+        cert_data = cert_file.read()
+
+    for _ in range(2):
+        saml_request = AuthNRequest(sso_url='test_url', issuer_id='test_id')
+        _, valid = has_valid_signatures(saml_request.root, cert_data=cert_data)
+        assert valid
@@ -6,11 +6,15 @@
 #
 # pylint: disable=c-extension-no-member
 
+import shutil
+
 import pytest
 import xmlsec
 
 from inge6.saml import AuthNRequest, ArtifactResolveRequest
 from inge6.saml.metadata import SPMetadata
+from inge6.saml.key_registry import file_version
+from inge6.saml.saml_request import _compiled_template, new_request_root
 
 
 def test_artifact_value():
@@ -36,3 +40,31 @@ def test_verify_requests(saml_request):
     ctx.register_id(getroot)
     ctx.verify(signature_node)
     assert True
+
+
+def test_requests_do_not_share_the_template():
+    first = AuthNRequest(sso_url='first_url', issuer_id='test_id')
+    second = AuthNRequest(sso_url='second_url', issuer_id='test_id')
+
+    assert first.root.attrib['Destination'] == 'first_url'
+    assert first.root.attrib['ID'] != second.root.attrib['ID']
+
+    # pylint: disable=protected-access
+    versions = (file_version(AuthNRequest.TEMPLATE_PATH), file_version(AuthNRequest.CERT_PATH))
+    template = _compiled_template(AuthNRequest.TEMPLATE_PATH, AuthNRequest.CERT_PATH, 'test_id', None, versions)
+    assert 'Destination' not in template.attrib
+    assert template.find('./saml:Issuer', {'saml': 'urn:oasis:names:tc:SAML:2.0:assertion'}).text == 'test_id'
+    assert xmlsec.tree.find_node(template, xmlsec.constants.NodeSignatureValue).text is None
+
+
+def test_rotated_certificate_is_used(tmp_path):
+    cert_path = str(tmp_path / 'sp.crt')
+    shutil.copy(AuthNRequest.CERT_PATH, cert_path)
+    cert_xpath = ('.//ds:X509Certificate', {'ds': 'http://www.w3.org/2000/09/xmldsig#'})
+    root = new_request_root(AuthNRequest.TEMPLATE_PATH, cert_path, 'test_id')
+
+    with open(cert_path, 'a') as cert_file:
+        cert_file.write('\n')
+    rotated_root = new_request_root(AuthNRequest.TEMPLATE_PATH, cert_path, 'test_id')
+
+    assert rotated_root.find(*cert_xpath).text != root.find(*cert_xpath).text
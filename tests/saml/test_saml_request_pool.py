@@ -0,0 +1,76 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import base64
+import time
+
+from lxml import etree
+
+from inge6.saml import AuthNRequest, PresignedRequestPool
+
+
+def build_request(destination):
+    return AuthNRequest(destination, 'test_id').get_base64_string().decode()
+
+
+def request_attrib(request):
+    return etree.fromstring(base64.b64decode(request)).attrib
+
+
+def test_requests_are_taken_once(clock):
+    pool = PresignedRequestPool(build_request, size=3, max_age_s=60, refill_interval_s=1, clock=clock)
+    assert pool.take('https://digid.example/sso') is None
+
+    pool.fill()
+    requests = [pool.take('https://digid.example/sso') for _ in range(3)]
+    assert pool.take('https://digid.example/sso') is None
+    assert pool.take('https://other.example/sso') is None
+
+    assert len({request_attrib(request)['ID'] for request in requests}) == 3
+    assert all(request_attrib(request)['Destination'] == 'https://digid.example/sso' for request in requests)
+    assert pool.stats() == {'hits': 3, 'misses': 3, 'pooled': {'https://digid.example/sso': 0, 'https://other.example/sso': 0}}
+
+
+def test_stale_requests_are_discarded(clock):
+    built = []
+
+    def build(destination):
+        built.append(clock.now)
+        return f'{destination}:{len(built)}'
+
+    pool = PresignedRequestPool(build, size=2, max_age_s=60, refill_interval_s=1, clock=clock)
+    pool.take('destination')
+    pool.fill()
+    assert len(built) == 2
+
+    # not yet replaced before the refill
+    clock.now = 58
+    pool.fill()
+    assert len(built) == 2
+
+    # replaced when they would go stale before the next refill
+    clock.now = 59.5
+    pool.fill()
+    assert len(built) == 4
+
+    # stale requests are not handed out
+    clock.now = 200
+    assert pool.take('destination') is None
+
+
+def test_background_refill():
+    pool = PresignedRequestPool(build_request, size=2, max_age_s=60, refill_interval_s=10)
+    pool.start()
+    try:
+        assert pool.take('https://digid.example/sso') is None
+
+        # a miss wakes up the producer
+        deadline = time.monotonic() + 5
+        while pool.stats()['pooled']['https://digid.example/sso'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert pool.take('https://digid.example/sso') is not None
+    finally:
+        pool.stop()
@@ -0,0 +1,103 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import functools
+import os
+import threading
+import time
+
+import pytest
+
+from inge6.saml import ArtifactResponsePool
+from inge6.saml.provider import Provider as SAMLProvider
+from inge6.saml.exceptions import ResponsePoolUnavailable, UserNotAuthenticated, ValidationError
+
+
+def provider_with_priv_key(priv_key):
+    provider = SAMLProvider()
+    provider.priv_key = priv_key
+    return provider
+
+
+def slow_provider():
+    time.sleep(2)
+    return SAMLProvider()
+
+
+def dying_provider():
+    os._exit(1) # pylint: disable=protected-access
+
+
+@pytest.fixture(scope='module')
+def read_response(update_time_values):
+    def read(path):
+        with open(path) as resp_ex_f:
+            return update_time_values(resp_ex_f.read())
+    return read
+
+
+# pylint: disable=redefined-outer-name
+@pytest.fixture(scope='module')
+def response_pool(priv_key_bsn_aes_key):
+    provider_factory = functools.partial(provider_with_priv_key, priv_key_bsn_aes_key)
+    pool = ArtifactResponsePool(provider_factory, max_workers=2, max_pending=4, timeout_s=30)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+def test_get_bsn(response_pool, read_response):
+    response = read_response('tests/resources/artifact_response_custom_bsn.xml')
+    assert response_pool.get_bsn(response, insecure=True) == '900212640'
+
+
+def test_authn_failed(response_pool, read_response):
+    response = read_response('tests/resources/artifact_resolve_response_authnfailed.xml')
+    with pytest.raises(UserNotAuthenticated) as raised:
+        response_pool.get_bsn(response, insecure=True)
+    assert raised.value.oauth_error == 'saml_authn_failed'
+
+
+def test_invalid_responses(response_pool, read_response):
+    # edited, so its signatures are no longer valid
+    response = read_response('tests/resources/artifact_response_custom_bsn.xml')
+    with pytest.raises(ValidationError):
+        response_pool.get_bsn(response)
+
+    with pytest.raises(ValidationError):
+        response_pool.get_bsn('<not-xml')
+
+
+def test_timeout_and_pending_bounded():
+    pool = ArtifactResponsePool(slow_provider, max_workers=1, max_pending=1, timeout_s=0.5)
+    errors = []
+
+    def get_bsn():
+        try:
+            pool.get_bsn('<response/>')
+        except ResponsePoolUnavailable as unavailable:
+            errors.append(str(unavailable))
+
+    thread = threading.Thread(target=get_bsn)
+    thread.start()
+    time.sleep(0.1)
+    with pytest.raises(ResponsePoolUnavailable, match='pending'):
+        pool.get_bsn('<response/>')
+
+    thread.join()
+    assert errors == ['No result within 0.5s']
+    pool.shutdown()
+
+
+def test_dead_worker_replaces_pool():
+    pool = ArtifactResponsePool(dying_provider, max_workers=1, max_pending=1, timeout_s=30)
+    broken_pool = pool._pool # pylint: disable=protected-access
+
+    with pytest.raises(ResponsePoolUnavailable, match='died'):
+        pool.get_bsn('<response/>')
+
+    assert pool._pool is not broken_pool # pylint: disable=protected-access
+    pool.shutdown()
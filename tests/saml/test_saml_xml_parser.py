@@ -0,0 +1,78 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+# pylint: disable=c-extension-no-member
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from lxml import etree
+
+from inge6.saml.exceptions import UnsafeXMLError
+from inge6.saml.xml_parser import StreamingXMLParser, get_parser, parse_xml
+
+BILLION_LAUGHS = b"""<?xml version="1.0"?>
+<!DOCTYPE lolz [
+ <!ENTITY lol "lol">
+ <!ENTITY lol2 "&lol;&lol;&lol;&lol;&lol;&lol;&lol;&lol;&lol;&lol;">
+ <!ENTITY lol3 "&lol2;&lol2;&lol2;&lol2;&lol2;&lol2;&lol2;&lol2;&lol2;&lol2;">
+]>
+<lolz>&lol3;</lolz>"""
+
+EXTERNAL_ENTITY = b"""<?xml version="1.0"?>
+<!DOCTYPE foo [<!ENTITY xxe SYSTEM "file:///etc/passwd">]>
+<foo>&xxe;</foo>"""
+
+
+def test_chunked_parse_equals_parse():
+    with open('tests/resources/artifact_response.xml', 'rb') as response_file:
+        xml_response = response_file.read()
+
+    parser = StreamingXMLParser()
+    for i in range(0, len(xml_response), 100):
+        parser.feed(xml_response[i:i + 100])
+
+    assert etree.tostring(parser.close()) == etree.tostring(etree.fromstring(xml_response))
+    assert etree.tostring(parse_xml(xml_response.decode())) == etree.tostring(etree.fromstring(xml_response))
+
+
+@pytest.mark.parametrize('document', [BILLION_LAUGHS, EXTERNAL_ENTITY])
+def test_dtds_are_rejected(document):
+    with pytest.raises(UnsafeXMLError, match='DTD'):
+        parse_xml(document)
+
+
+def test_size_is_limited_while_feeding():
+    parser = StreamingXMLParser(max_bytes=1000)
+    parser.feed(b'<root>' + b'<a/>' * 200)
+    with pytest.raises(UnsafeXMLError, match='1000 bytes'):
+        parser.feed(b'<a/>' * 200)
+
+
+def test_depth_is_limited():
+    parse_xml(b'<a>' * 10 + b'</a>' * 10, max_depth=10)
+    with pytest.raises(UnsafeXMLError, match='deeper than 10'):
+        parse_xml(b'<a>' * 11 + b'</a>' * 11, max_depth=10)
+
+    parser = StreamingXMLParser(max_depth=10)
+    parser.feed(b'<a>' * 11)
+    parser.feed(b'</a>' * 11)
+    with pytest.raises(UnsafeXMLError, match='deeper than 10'):
+        parser.close()
+
+
+def test_malformed():
+    with pytest.raises(etree.XMLSyntaxError):
+        parse_xml(b'<a><b></a>')
+
+
+def test_parser_per_thread():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        parsers = list(executor.map(lambda _: get_parser(), range(2)))
+
+    assert get_parser() is get_parser()
+    assert get_parser() not in parsers
+    assert etree.fromstring(EXTERNAL_ENTITY, parser=get_parser()).text is None
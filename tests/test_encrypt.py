@@ -0,0 +1,55 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import pytest
+
+from inge6.encrypt import Sealer
+from inge6.exceptions import InvalidSealedToken
+
+SYMM_KEY = '4d5af2ae2c9ba5f1a6a2f7f3f6b9e4a2c7b1d3e5f7091b2d4f6a8c0e2a4c6e8f'
+
+AUTH_REQ_VALUE = {
+    'auth_req': {
+        'client_id': 'test_client',
+        'redirect_uri': 'https://example.com/callback',
+        'response_type': ['code'],
+        'nonce': 'some_nonce',
+        'scope': ['openid'],
+        'state': 'some_state',
+    },
+    'code_challenge': '_1f8tFjAtu6D1Df-GOyDPoMjCJdEvaSWsnqR6SLpzsw',
+    'code_challenge_method': 'S256'
+}
+
+def test_seal_unseal():
+    sealer = Sealer(SYMM_KEY, expires_in_s=600, prefix='s1.')
+    token = sealer.seal(AUTH_REQ_VALUE)
+
+    assert sealer.is_sealed(token)
+    assert all(c.isalnum() or c in '-_.' for c in token)
+    assert sealer.unseal(token) == AUTH_REQ_VALUE
+
+
+def test_unseal_tampered():
+    sealer = Sealer(SYMM_KEY, expires_in_s=600, prefix='s1.')
+    token = sealer.seal(AUTH_REQ_VALUE)
+    tampered = token[:-2] + ('AA' if token[-2:] != 'AA' else 'BB')
+
+    with pytest.raises(InvalidSealedToken):
+        sealer.unseal(tampered)
+
+    with pytest.raises(InvalidSealedToken):
+        sealer.unseal('a3a6b5f48c3b4c9ba1b06f0d7d1c8b59')
+
+    with pytest.raises(InvalidSealedToken):
+        Sealer('00' * 32, expires_in_s=600, prefix='s1.').unseal(token)
+
+
+def test_unseal_expired():
+    sealer = Sealer(SYMM_KEY, expires_in_s=-1)
+
+    with pytest.raises(InvalidSealedToken):
+        sealer.unseal(sealer.seal(AUTH_REQ_VALUE))
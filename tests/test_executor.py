@@ -0,0 +1,77 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import asyncio
+import threading
+import time
+
+import pytest
+
+from inge6.exceptions import ExecutorSaturated
+from inge6.executor import BoundedExecutor
+
+
+def blocking_token_endpoint(body: bytes) -> bytes:
+    time.sleep(0.2)
+    return body
+
+
+async def concurrent_requests(executor: BoundedExecutor, num_requests: int) -> float:
+    ticks = 0
+
+    async def event_loop_ticks():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.ensure_future(event_loop_ticks())
+    start = time.monotonic()
+    results = await asyncio.gather(*(executor.run(blocking_token_endpoint, str(i).encode()) for i in range(num_requests)))
+    elapsed = time.monotonic() - start
+    ticker.cancel()
+
+    assert results == [str(i).encode() for i in range(num_requests)]
+    # the event loop kept running meanwhile
+    assert ticks >= 10
+    return elapsed
+
+
+def test_concurrent_requests_are_not_serialized():
+    executor = BoundedExecutor(max_workers=5, max_pending=0)
+    assert asyncio.run(concurrent_requests(executor, 5)) < 0.6
+    executor.shutdown()
+
+
+def test_concurrency_is_bounded():
+    executor = BoundedExecutor(max_workers=2, max_pending=2)
+    assert asyncio.run(concurrent_requests(executor, 4)) >= 0.4
+    executor.shutdown()
+
+
+async def saturate(executor: BoundedExecutor, release: threading.Event) -> None:
+    running = [asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(ExecutorSaturated):
+        await executor.run(release.wait, 5)
+
+    # a caller that stops waiting keeps its slot until the call finished
+    running[0].cancel()
+    await asyncio.sleep(0.05)
+    with pytest.raises(ExecutorSaturated):
+        await executor.run(release.wait, 5)
+
+    release.set()
+    await asyncio.gather(running[1])
+    await asyncio.sleep(0.05)
+    assert await executor.run(release.wait, 5)
+
+
+def test_saturated_executor_refuses_calls():
+    executor = BoundedExecutor(max_workers=1, max_pending=1)
+    asyncio.run(saturate(executor, threading.Event()))
+    executor.shutdown()
@@ -0,0 +1,75 @@
+# Copyright (c) 2020-2021 De Staat der Nederlanden, Ministerie van Volksgezondheid, Welzijn en Sport.
+#
+# Licensed under the EUROPEAN UNION PUBLIC LICENCE v. 1.2
+#
+# SPDX-License-Identifier: EUPL-1.2
+#
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+import inge6.router
+from inge6.executor import BoundedExecutor
+
+
+class BlockingProvider:
+    def __init__(self):
+        self.release = threading.Event()
+        self.threads = []
+
+    def token_endpoint(self, body, _):
+        self.threads.append(threading.current_thread().name)
+        self.release.wait(5)
+        return JSONResponse(content={'body': body.decode()})
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    blocking_provider = BlockingProvider()
+    monkeypatch.setattr(inge6.router, 'get_provider', lambda: blocking_provider)
+    return blocking_provider
+
+
+@pytest.fixture
+def client(monkeypatch):
+    executor = BoundedExecutor(max_workers=1, max_pending=0, thread_name_prefix='accesstoken')
+    monkeypatch.setattr(inge6.router, 'TOKEN_EXECUTOR', executor)
+    app = FastAPI()
+    app.include_router(inge6.router.router)
+    with TestClient(app) as test_client:
+        yield test_client
+    executor.shutdown()
+
+
+# pylint: disable=redefined-outer-name
+def test_token_endpoint_runs_on_executor(provider, client):
+    provider.release.set()
+    response = client.post('/accesstoken', content=b'code=some_code')
+
+    assert response.status_code == 200
+    assert response.json() == {'body': 'code=some_code'}
+    assert provider.threads[0].startswith('accesstoken')
+
+
+def test_saturated_token_endpoint(provider, client):
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        first = pool.submit(client.post, '/accesstoken', content=b'code=first')
+        deadline = time.monotonic() + 5
+        while not provider.threads and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        response = client.post('/accesstoken', content=b'code=second')
+        provider.release.set()
+        assert first.result().status_code == 200
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert 'temporarily_unavailable' in response.text
+    assert provider.threads == ['accesstoken_0']